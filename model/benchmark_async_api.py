@@ -0,0 +1,155 @@
+"""
+Async API Load Benchmark
+========================
+Fires concurrent /predict/live requests at the Flask and asyncio servers,
+both pointed at a local fake weather server with a fixed response delay.
+Every request uses its own weather grid cell, so each one pays the full
+upstream round trip.
+
+Run after training: python benchmark_async_api.py [--requests 400] [--concurrency 100]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+MODEL_CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FLASK_SERVER = (
+    "import sys, flood_prediction_api as api\n"
+    "api.load_model()\n"
+    "api.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded={threaded})\n"
+)
+
+
+def free_port():
+    """Ask the OS for an unused local port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_fake_weather(port, delay):
+    """OpenWeatherMap-compatible stub that answers after `delay` seconds"""
+    async def weather(request):
+        await asyncio.sleep(delay)
+        return web.json_response({
+            'main': {'temp': 28.0, 'humidity': 88, 'pressure': 1004},
+            'wind': {'speed': 4.1},
+            'rain': {'1h': 18.5},
+            'weather': [{'main': 'Rain'}]
+        })
+
+    app = web.Application()
+    app.router.add_get('/weather', weather)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+def start_server(target, port, weather_port):
+    """Launch one API server in a subprocess with the fake weather upstream"""
+    env = dict(os.environ, WEATHER_API_URL=f'http://127.0.0.1:{weather_port}/weather',
+               PYTHONPATH=MODEL_CODE_DIR)
+    if target == 'async':
+        command = [sys.executable, os.path.join(MODEL_CODE_DIR, 'flood_prediction_async_api.py'),
+                   '--host', '127.0.0.1', '--port', str(port)]
+    else:
+        threaded = 'True' if target == 'flask' else 'False'
+        command = [sys.executable, '-c', FLASK_SERVER.format(threaded=threaded), str(port)]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_healthy(session, base_url, timeout=120):
+    """Poll /health until the server has loaded its model"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f'{base_url}/health') as response:
+                if response.status == 200 and (await response.json())['model_loaded']:
+                    return True
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def run_load(session, base_url, n_requests, concurrency):
+    """Send n_requests with at most `concurrency` in flight; returns latencies and errors"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        # Spread requests over distinct 0.01 degree cells so none hit the cache
+        params = {'lat': 18.0 + (i // 100) * 0.02, 'lon': 72.0 + (i % 100) * 0.02}
+        async with slots:
+            start = time.perf_counter()
+            try:
+                async with session.get(f'{base_url}/predict/live', params=params) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def benchmark(args):
+    weather_port = free_port()
+    weather = await start_fake_weather(weather_port, args.weather_delay)
+    print(f"🌦️ Fake weather server on :{weather_port} ({args.weather_delay * 1000:.0f} ms per call)")
+
+    timeout = aiohttp.ClientTimeout(total=300)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        for target in args.targets:
+            port = free_port()
+            server = start_server(target, port, weather_port)
+            base_url = f'http://127.0.0.1:{port}'
+            try:
+                if not await wait_healthy(session, base_url):
+                    print(f"❌ {target}: server did not become healthy")
+                    continue
+                latencies, errors, elapsed = await run_load(
+                    session, base_url, args.requests, args.concurrency)
+                latencies_ms = np.array(latencies) * 1000
+                print(f"{target:>10}: {args.requests / elapsed:7.1f} req/s  "
+                      f"p50 {np.percentile(latencies_ms, 50):7.1f} ms  "
+                      f"p95 {np.percentile(latencies_ms, 95):7.1f} ms  errors {errors}")
+            finally:
+                server.terminate()
+                server.wait()
+
+    await weather.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the API server modes")
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--weather-delay', type=float, default=0.2)
+    parser.add_argument('--targets', nargs='+', default=['flask-sync', 'flask', 'async'],
+                        choices=['flask-sync', 'flask', 'async'])
+    args = parser.parse_args()
+
+    print("⏱️ Async API Load Benchmark")
+    print("=" * 50)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Inference Latency Benchmark
+===========================
+Compare the DataFrame prediction path with the pandas-free fast path
+Run after training: python benchmark_inference.py
+"""
+
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from flood_inference import FloodPredictor
+
+
+def sample_requests(n=200, seed=42):
+    """Generate /predict style weather/area payloads"""
+    rng = np.random.default_rng(seed)
+    requests_list = []
+    for _ in range(n):
+        weather_data = {
+            'precipitation': round(float(rng.gamma(1.5, 20.0)), 2),
+            'humidity': int(rng.integers(60, 100)),
+            'wind_speed': round(float(rng.uniform(0, 10)), 1),
+            'temperature': round(float(rng.uniform(24, 34)), 1)
+        }
+        area_data = {
+            'Ward Code': int(rng.integers(0, 24)),
+            'Elevation': round(float(rng.uniform(1, 60)), 1),
+            'Population': int(rng.integers(50000, 600000)),
+            'Built_up_percent': int(rng.integers(40, 100))
+        }
+        requests_list.append((weather_data, area_data))
+    return requests_list
+
+
+def percentiles(timings_us):
+    """p50/p95 of a list of microsecond timings"""
+    return np.percentile(timings_us, 50), np.percentile(timings_us, 95)
+
+
+def time_calls(func, requests_list, repeat=3):
+    """Per-call wall time in microseconds"""
+    timings = []
+    for _ in range(repeat):
+        for weather_data, area_data in requests_list:
+            start = time.perf_counter()
+            func(weather_data, area_data)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    """Run the benchmark against model_files/"""
+    print("⏱️ Inference Latency Benchmark")
+    print("=" * 50)
+
+    predictor = FloodPredictor()
+    predictor.load_model("model_files")
+    requests_list = sample_requests()
+
+    # Feature assembly only: DataFrame build + engineering + alignment + scaling
+    def dataframe_features(weather_data, area_data):
+        feature_df = predictor.create_prediction_features(weather_data, area_data)
+        return predictor.scaler.transform(predictor.select_model_features(feature_df))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        slow_features = time_calls(dataframe_features, requests_list)
+        slow_results = [predictor.predict_flood_risk(w, a) for w, a in requests_list[:50]]
+        slow_predict = time_calls(predictor.predict_flood_risk, requests_list[:50], repeat=1)
+
+    if not predictor.enable_fast_inference():
+        print("❌ Fast inference is not available for this model")
+        return
+
+    def fast_features(weather_data, area_data):
+        row = predictor.build_feature_vector(weather_data, area_data)
+        return (row - predictor.scaler.center_) / predictor.scaler.scale_
+
+    fast_features_timings = time_calls(fast_features, requests_list)
+    fast_results = [predictor.predict_flood_risk(w, a) for w, a in requests_list[:50]]
+    fast_predict = time_calls(predictor.predict_flood_risk, requests_list[:50], repeat=1)
+
+    # Outputs must match the DataFrame path exactly
+    mismatches = sum(
+        1 for slow, fast in zip(slow_results, fast_results)
+        if (slow['predicted_risk_level'] != fast['predicted_risk_level'] or
+            slow['probabilities'] != fast['probabilities'] or
+            slow['confidence'] != fast['confidence'])
+    )
+
+    print("\nFeature assembly (µs per request):")
+    print("  DataFrame path: p50 {:.1f}  p95 {:.1f}".format(*percentiles(slow_features)))
+    print("  Fast path:      p50 {:.1f}  p95 {:.1f}".format(*percentiles(fast_features_timings)))
+    print("\nEnd-to-end predict_flood_risk (µs per request):")
+    print("  DataFrame path: p50 {:.1f}  p95 {:.1f}".format(*percentiles(slow_predict)))
+    print("  Fast path:      p50 {:.1f}  p95 {:.1f}".format(*percentiles(fast_predict)))
+    print(f"\nOutput mismatches: {mismatches} of {len(fast_results)}")
+
+
+if __name__ == "__main__":
+    main()
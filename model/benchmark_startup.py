@@ -0,0 +1,102 @@
+"""
+API Cold Start Benchmark
+========================
+Measures what a fresh API replica pays before it can serve: module
+import time (from `python -X importtime`, with the heaviest top-level
+packages) and the time until load_model() has the model ready.
+Each measurement runs in a new interpreter so nothing is cached.
+
+Run after training: python benchmark_startup.py [--top 15] [--runs 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+MODEL_CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# What gets imported: the serving entry points and the training module for comparison
+MODULES = ['flood_prediction_api', 'flood_prediction_async_api',
+           'flood_inference', 'improved_flood_prediction_model']
+
+READY_SCRIPT = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import flood_prediction_api as api\n"
+    "imported = time.perf_counter()\n"
+    "assert api.load_model()\n"
+    "print(imported - start, time.perf_counter() - start)\n"
+)
+
+
+def run_python(args):
+    """Run a fresh interpreter in the model directory"""
+    env = dict(os.environ, PYTHONPATH=MODEL_CODE_DIR)
+    return subprocess.run([sys.executable] + args, cwd=MODEL_CODE_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_profile(module):
+    """
+    Parse `-X importtime` output for one module
+
+    Returns (total_seconds, {top-level package: seconds}), attributing
+    each module's own import time to its top-level package.
+    """
+    stderr = run_python(['-X', 'importtime', '-c', f'import {module}']).stderr
+    # Lines are post-order: everything a module pulls in is listed just
+    # before the module's own unindented line
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        top_level = not name.startswith('  ')
+        name = name.strip()
+        if top_level:
+            if name == module:
+                return int(cumulative) / 1e6, packages
+            packages = {}
+        else:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + int(own) / 1e6
+    return 0.0, {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the API")
+    parser.add_argument('--top', type=int, default=15, help="heaviest imports to list")
+    parser.add_argument('--runs', type=int, default=3, help="fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    print("⏱️ API Cold Start Benchmark")
+    print("=" * 50)
+
+    print("\nImport time (seconds, median of runs):")
+    heaviest = None
+    for module in MODULES:
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        print(f"  {module:<34} {np.median([total for total, _ in profiles]):6.2f}")
+        if module == MODULES[0]:
+            heaviest = profiles[-1][1]
+
+    print(f"\nHeaviest packages imported by {MODULES[0]} (seconds):")
+    for name, seconds in sorted(heaviest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<34} {seconds:6.3f}")
+
+    try:
+        timings = np.array([[float(value) for value in run_python(['-c', READY_SCRIPT]).stdout.split()[-2:]]
+                            for _ in range(args.runs)])
+    except subprocess.CalledProcessError:
+        print("\n❌ load_model() failed. Please train the model first.")
+        return
+
+    imported, ready = np.median(timings, axis=0)
+    print(f"\nflood_prediction_api: imported in {imported:.2f}s, ready to serve in {ready:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
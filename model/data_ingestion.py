@@ -0,0 +1,337 @@
+"""
+Cached Dataset Ingestion
+========================
+Parses the flood CSV once and caches the cleaned columns, so trainers
+stop re-running read_csv, the missing-value replace and per-column
+to_numeric on every start.
+
+- Parsing is chunked (CHUNK_ROWS rows at a time) with explicit dtypes:
+  TEXT_COLUMNS stay strings, every other column is coerced to float64
+  (text such as export error messages becomes NaN) and the "--" / blank
+  placeholders are read as NaN.
+- The cleaned columns are saved as one .npy file each: numeric columns as
+  float64, text columns as int32 codes into a vocabulary kept in
+  schema.json (-1 for missing). The cache directory is named after the
+  SHA-256 of the source file, so an edited CSV is parsed again.
+- The long Drainage_properties dict strings are not kept: each distinct
+  string is parsed once into DRAINAGE_ATTRIBUTES columns (waterway,
+  covered, ...) at cache build time.
+- The source hash is remembered per (path, size, mtime), so warm loads do
+  not re-read the CSV at all; they memory-map the column files.
+- Loads are projected (columns= / exclude=, like usecols) and
+  CATEGORY_COLUMNS (and Drainage_waterway) come back as pandas
+  categoricals built straight from the cached codes, sorted categories.
+
+Usage: load_dataset(csv_path, columns=None, exclude=None) instead of pd.read_csv(csv_path)
+       iter_dataset(csv_path, chunk_rows) for row chunks of the cached columns
+       python data_ingestion.py [csv_path]   (builds the cache, times cold vs warm)
+"""
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+DATASET_CSV = "final_flood_classification data.csv"
+CACHE_FORMAT_VERSION = 2
+CHUNK_ROWS = 250000
+
+# Placeholders the trainers used to replace with NaN after loading
+NA_VALUES = ["--", "", " ", "nan", "NaN"]
+
+# Columns kept as strings; all others are numeric
+TEXT_COLUMNS = ['DATE', 'Ward Code', 'Areas', 'Nearest Station', 'Land Use Classes',
+                'Flood-risk_level', 'Flood_occured', 'Monitoring_required', 'Soil Type',
+                'Drainage_properties']
+
+# Text columns loaded as pandas categoricals
+CATEGORY_COLUMNS = ['Ward Code', 'Areas', 'Nearest Station', 'Land Use Classes', 'Soil Type']
+
+# Drainage_properties keys cached as columns (Drainage_<key>): text values,
+# yes/no flags (absent = 0) or numbers
+DRAINAGE_COLUMN = 'Drainage_properties'
+DRAINAGE_ATTRIBUTES = {
+    'waterway': 'text',
+    'covered': 'flag',
+    'tunnel': 'flag',
+    'intermittent': 'flag',
+    'seasonal': 'flag',
+    'layer': 'number',
+    'width': 'number'
+}
+DRAINAGE_COLUMNS = [f"Drainage_{key}" for key in DRAINAGE_ATTRIBUTES]
+
+
+def default_cache_dir(csv_path):
+    """FLOOD_DATASET_CACHE, or .dataset_cache next to the CSV"""
+    return os.environ.get('FLOOD_DATASET_CACHE') or os.path.join(
+        os.path.dirname(os.path.abspath(csv_path)), '.dataset_cache')
+
+
+def source_sha256(csv_path, cache_dir):
+    """SHA-256 of the CSV, reused while its size and mtime are unchanged"""
+    path = os.path.abspath(csv_path)
+    stat = os.stat(path)
+    sources_path = os.path.join(cache_dir, 'sources.json')
+    try:
+        with open(sources_path) as f:
+            sources = json.load(f)
+    except (FileNotFoundError, ValueError):
+        sources = {}
+
+    known = sources.get(path)
+    if known and known['bytes'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    sources[path] = {'bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{sources_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(sources, f, indent=2)
+    os.replace(tmp_path, sources_path)
+    return digest.hexdigest()
+
+
+def parse_drainage_properties(text):
+    """Dict of one Drainage_properties string ({} when missing or unparsable)"""
+    try:
+        properties = ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError):
+        return {}
+    return properties if isinstance(properties, dict) else {}
+
+
+def _drainage_value(kind, value):
+    if kind == 'flag':
+        return 1.0 if str(value).lower() in ('yes', 'true', '1') else 0.0
+    if kind == 'number':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+    return np.nan if value is None else str(value)
+
+
+def _sorted_codes(codes, vocabulary):
+    """Codes and vocabulary re-indexed so the vocabulary is sorted (-1 kept)"""
+    order = sorted(range(len(vocabulary)), key=vocabulary.__getitem__)
+    rank = np.empty(len(vocabulary) + 1, dtype=np.int32)
+    rank[order] = np.arange(len(vocabulary), dtype=np.int32)
+    rank[-1] = -1
+    return rank[codes], [vocabulary[i] for i in order]
+
+
+def _drainage_columns(codes, vocabulary):
+    """DRAINAGE_ATTRIBUTES columns from Drainage_properties codes, parsing each string once"""
+    parsed = [parse_drainage_properties(text) for text in vocabulary]
+    columns, vocabularies = {}, {}
+    for key, kind in DRAINAGE_ATTRIBUTES.items():
+        name = f"Drainage_{key}"
+        values = [_drainage_value(kind, properties.get(key)) if properties else np.nan
+                  for properties in parsed]
+        if kind == 'text':
+            labels = sorted({value for value in values if isinstance(value, str)})
+            lookup = np.array([labels.index(value) if isinstance(value, str) else -1 for value in values] + [-1],
+                              dtype=np.int32)
+            columns[name], vocabularies[name] = lookup[codes], labels
+        else:
+            columns[name] = np.array(values + [np.nan], dtype=np.float64)[codes]
+    return columns, vocabularies
+
+
+def _parse_columns(csv_path):
+    """
+    Chunked parse: (column names, {name: float64 array or int32 codes},
+    {text column: sorted vocabulary}, row count)
+    """
+    import pandas as pd
+
+    arrays, vocabularies, names = {}, {}, None
+    rows = 0
+    reader = pd.read_csv(csv_path, dtype={col: str for col in TEXT_COLUMNS}, na_values=NA_VALUES,
+                         chunksize=CHUNK_ROWS)
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        if names is None:
+            names = list(chunk.columns)
+            for col in names:
+                arrays[col] = []
+                if col in TEXT_COLUMNS:
+                    vocabularies[col] = {}
+
+        for col in names:
+            if col in vocabularies:
+                # Chunk-local codes remapped onto the file-wide vocabulary
+                codes, uniques = pd.factorize(chunk[col])
+                vocabulary = vocabularies[col]
+                lookup = np.array([vocabulary.setdefault(value, len(vocabulary)) for value in uniques] + [-1],
+                                  dtype=np.int32)
+                arrays[col].append(lookup[codes])
+            else:
+                arrays[col].append(pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64))
+        rows += len(chunk)
+
+    names = names or []
+    columns = {col: np.concatenate(parts) if parts else np.empty(0) for col, parts in arrays.items()}
+    vocabularies = {col: list(vocab) for col, vocab in vocabularies.items()}
+    for col in vocabularies:
+        columns[col], vocabularies[col] = _sorted_codes(columns[col], vocabularies[col])
+
+    if DRAINAGE_COLUMN in names:
+        # The dict strings are replaced by their parsed attributes
+        drainage, drainage_vocabularies = _drainage_columns(columns.pop(DRAINAGE_COLUMN),
+                                                            vocabularies.pop(DRAINAGE_COLUMN))
+        names = [col for col in names if col != DRAINAGE_COLUMN] + list(drainage)
+        columns.update(drainage)
+        vocabularies.update(drainage_vocabularies)
+    return names, columns, vocabularies, rows
+
+
+def build_dataset_cache(csv_path, cache_dir=None):
+    """Parse the CSV into its cache directory (if not cached yet) and return that directory"""
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    sha256 = source_sha256(csv_path, cache_dir)
+    target = os.path.join(cache_dir, f"{sha256[:16]}-v{CACHE_FORMAT_VERSION}")
+    if os.path.exists(os.path.join(target, 'schema.json')):
+        return target
+
+    names, columns, vocabularies, rows = _parse_columns(csv_path)
+    tmp_dir = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    schema = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'source': {'file': os.path.basename(csv_path), 'sha256': sha256},
+        'rows': rows,
+        'columns': []
+    }
+    for i, col in enumerate(names):
+        file_name = f"col{i:03d}.npy"
+        np.save(os.path.join(tmp_dir, file_name), columns[col])
+        entry = {'name': col, 'file': file_name}
+        if col in vocabularies:
+            entry['vocabulary'] = vocabularies[col]
+        schema['columns'].append(entry)
+    with open(os.path.join(tmp_dir, 'schema.json'), 'w') as f:
+        json.dump(schema, f)
+
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)  # Another process cached it first
+    return target
+
+
+def _open_columns(csv_path, cache_dir, columns=None, exclude=None):
+    """
+    (row count, [(name, memmapped column, vocabulary or None)]) of the
+    cached CSV; columns=None means every cached column except the drainage
+    attributes, which are only loaded when named
+    """
+    target = build_dataset_cache(csv_path, cache_dir)
+    with open(os.path.join(target, 'schema.json')) as f:
+        schema = json.load(f)
+
+    entries = {entry['name']: entry for entry in schema['columns']}
+    if columns is None:
+        columns = [name for name in entries if name not in DRAINAGE_COLUMNS]
+    missing = [name for name in columns if name not in entries]
+    if missing:
+        raise KeyError(f"Columns not in {os.path.basename(csv_path)}: {missing}")
+
+    opened = []
+    for name in columns:
+        if exclude and name in exclude:
+            continue
+        values = np.load(os.path.join(target, entries[name]['file']), mmap_mode='r')
+        opened.append((name, values, entries[name].get('vocabulary')))
+    return schema['rows'], opened
+
+
+def _frame(columns, start, stop):
+    """DataFrame of rows [start, stop) from opened columns"""
+    import pandas as pd
+
+    data = {}
+    for name, values, vocabulary in columns:
+        values = values[start:stop]
+        if vocabulary is not None and (name in CATEGORY_COLUMNS or name in DRAINAGE_COLUMNS):
+            values = pd.Categorical.from_codes(values, categories=vocabulary)
+        elif vocabulary is not None:
+            labels = np.array(vocabulary + [np.nan], dtype=object)
+            values = pd.Series(labels[values])  # Code -1 picks the trailing NaN
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def load_dataset(csv_path=DATASET_CSV, columns=None, exclude=None, cache_dir=None):
+    """
+    The cleaned dataset as a DataFrame, parsed on the first call and
+    loaded from the column cache afterwards
+
+    Text columns come back as strings (categoricals for CATEGORY_COLUMNS,
+    NaN where missing), everything else as float64, with column names
+    stripped of whitespace. columns / exclude project the load; the
+    DRAINAGE_COLUMNS attributes are included only when listed in columns.
+    """
+    rows, opened = _open_columns(csv_path, cache_dir, columns, exclude)
+    return _frame(opened, 0, rows)
+
+
+def dataset_rows(csv_path=DATASET_CSV, cache_dir=None):
+    """Row count of the dataset (builds the cache if needed)"""
+    return _open_columns(csv_path, cache_dir, columns=[])[0]
+
+
+def iter_dataset(csv_path=DATASET_CSV, chunk_rows=CHUNK_ROWS, columns=None, exclude=None,
+                 cache_dir=None):
+    """
+    The dataset as consecutive DataFrames of at most chunk_rows rows,
+    each sliced from the memory-mapped columns (only one chunk is
+    materialised at a time)
+    """
+    rows, opened = _open_columns(csv_path, cache_dir, columns, exclude)
+    for start in range(0, rows, chunk_rows):
+        yield _frame(opened, start, min(start + chunk_rows, rows))
+
+
+def main():
+    """Build the cache for a CSV and compare a cold parse with a warm load"""
+    import pandas as pd
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_CSV
+
+    started = time.perf_counter()
+    df = pd.read_csv(csv_path)
+    df = df.replace(NA_VALUES, np.nan)
+    read_csv_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    target = build_dataset_cache(csv_path)
+    build_s = time.perf_counter() - started
+
+    read_csv_mb = df.memory_usage(deep=True).sum() / 2 ** 20
+
+    started = time.perf_counter()
+    df = load_dataset(csv_path)
+    load_s = time.perf_counter() - started
+
+    print(f"📦 Dataset cache: {target}")
+    print(f"  rows x columns:      {df.shape[0]} x {df.shape[1]}")
+    print(f"  read_csv + replace:  {read_csv_s * 1000:8.1f} ms  {read_csv_mb:7.1f} MB")
+    print(f"  build cache:         {build_s * 1000:8.1f} ms")
+    print(f"  warm load:           {load_s * 1000:8.1f} ms  {df.memory_usage(deep=True).sum() / 2 ** 20:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
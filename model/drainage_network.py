@@ -0,0 +1,276 @@
+"""
+Drainage Network Index
+======================
+Drain and canal polylines from the OpenStreetMap export, split into short
+straight segments in a local metric projection, with a KD-tree over the
+segment midpoints for exact nearest-drain distance queries.
+
+query() answers whole arrays of coordinates in chunks: one batched
+(multi-threaded) KD-tree query per chunk, then the point-to-segment
+distances of every point's candidates in one vectorized step. The few
+points whose candidates cannot rule out a closer segment are finished
+with a radius search.
+
+Regenerate the dataset's drain columns (True_nearest_distance_m,
+Drainage_line_id, Drainage_properties) from the export into a new CSV,
+the one to train on so training uses the drain distances serving computes
+(training_pipeline.py --drainage does this step first):
+    python drainage_network.py [csv_in] [csv_out] [--benchmark N]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+DRAINAGE_GEOJSON = "../Dataset/drainage/export.geojson"
+
+EARTH_RADIUS_M = 6371008.8
+
+# Reference latitude of the equirectangular projection (central Mumbai)
+REFERENCE_LATITUDE = 19.0
+
+# Long segments are split so the midpoint search radius stays small
+MAX_SEGMENT_LENGTH_M = 100.0
+
+# Segments checked exactly before falling back to a radius search
+NEAREST_CANDIDATES = 16
+
+# Points per vectorized query step (bounds the candidate arrays' memory)
+QUERY_CHUNK_SIZE = 65536
+
+# Keys of the dataset's Drainage_properties dicts, in the CSV's order
+DRAINAGE_PROPERTY_KEYS = ['id', '@id', 'covered', 'designation', 'intermittent', 'layer', 'lock',
+                          'name', 'seasonal', 'source', 'tunnel', 'waterway', 'width']
+
+
+def project(lat, lon, reference_latitude=REFERENCE_LATITUDE):
+    """Equirectangular projection of degrees to metres (x east, y north)"""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(reference_latitude))
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return np.stack([x, y], axis=-1)
+
+
+class DrainageNetwork:
+    """
+    Nearest-drain lookups over the drainage polylines
+
+    Distances are exact point-to-segment distances: the nearest few
+    segments give an upper bound d, and every segment that could be
+    closer has its midpoint within d + max_half_length, so only those
+    are checked.
+    """
+
+    def __init__(self, starts, ends, line_index, lines):
+        self.starts = starts
+        self.ends = ends
+        self.line_index = line_index
+        self.lines = lines
+
+        # Per-line attributes for batch results
+        self.line_waterway = np.array([line['waterway'] for line in lines], dtype=object)
+        self.line_covered = np.array([line['covered'] for line in lines], dtype=np.float64)
+
+        self._vectors = ends - starts
+        self._lengths_sq = np.einsum('ij,ij->i', self._vectors, self._vectors)
+        self._max_half_length = float(np.sqrt(self._lengths_sq.max()) / 2) if len(starts) else 0.0
+        self._tree = cKDTree((starts + ends) / 2)
+
+    @classmethod
+    def from_geojson(cls, path=DRAINAGE_GEOJSON, max_segment_length=MAX_SEGMENT_LENGTH_M):
+        """Load LineString features from a GeoJSON export"""
+        with open(path, encoding='utf-8') as f:
+            features = json.load(f)['features']
+
+        starts, ends, line_index, lines = [], [], [], []
+        for feature_index, feature in enumerate(features):
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') != 'LineString' or len(geometry['coordinates']) < 2:
+                continue
+            coordinates = np.asarray(geometry['coordinates'], dtype=float)
+            points = project(coordinates[:, 1], coordinates[:, 0])
+
+            # Split each edge into pieces no longer than max_segment_length
+            edge_starts, edge_ends = points[:-1], points[1:]
+            pieces = np.maximum(1, np.ceil(
+                np.linalg.norm(edge_ends - edge_starts, axis=1) / max_segment_length
+            ).astype(int))
+            fractions = np.concatenate([np.arange(n + 1) / n for n in pieces])
+            edges = np.repeat(np.arange(len(edge_starts)), pieces + 1)
+            vertices = edge_starts[edges] + fractions[:, None] * (edge_ends - edge_starts)[edges]
+            keep = np.ones(len(vertices), dtype=bool)
+            keep[np.cumsum(pieces + 1) - 1] = False  # Last vertex of each edge starts nothing
+
+            starts.append(vertices[keep])
+            ends.append(vertices[np.roll(keep, 1)])
+            line_index.append(np.full(int(pieces.sum()), len(lines)))
+            properties = feature.get('properties', {})
+            lines.append({
+                'id': properties.get('@id'),
+                'feature': feature_index,
+                'name': properties.get('name'),
+                'waterway': properties.get('waterway'),
+                'covered': 1.0 if properties.get('covered') == 'yes' else 0.0,
+                'properties': properties
+            })
+
+        return cls(np.concatenate(starts), np.concatenate(ends),
+                   np.concatenate(line_index), lines)
+
+    def _segment_distances(self, points, segments):
+        """
+        Exact distances from projected points to segments; points (..., 2)
+        broadcast against segment indices (...), e.g. (n, 1, 2) with (n, k)
+        """
+        offsets = points - self.starts[segments]
+        vectors = self._vectors[segments]
+        lengths_sq = self._lengths_sq[segments]
+        t = np.divide(np.einsum('...j,...j->...', offsets, vectors), lengths_sq,
+                      out=np.zeros(lengths_sq.shape), where=lengths_sq > 0)
+        closest = vectors * np.clip(t, 0.0, 1.0)[..., None]
+        return np.linalg.norm(offsets - closest, axis=-1)
+
+    def _nearest_segments(self, points, workers):
+        """(distance, segment) of the closest segment to each projected point"""
+        k = min(NEAREST_CANDIDATES, len(self.starts))
+        midpoint_distances, candidates = self._tree.query(points, k=k, workers=workers)
+        midpoint_distances = midpoint_distances.reshape(len(points), k)
+        candidates = candidates.reshape(len(points), k)
+
+        distances = self._segment_distances(points[:, None, :], candidates)
+        best = np.argmin(distances, axis=1)
+        rows = np.arange(len(points))
+        distances, segments = distances[rows, best], candidates[rows, best]
+
+        # Radius search where an unchecked segment could still be closer
+        if k < len(self.starts):
+            radii = distances + self._max_half_length
+            for i in np.flatnonzero(midpoint_distances[:, -1] <= radii):
+                nearby = np.asarray(self._tree.query_ball_point(points[i], radii[i]))
+                nearby_distances = self._segment_distances(points[i], nearby)
+                j = int(np.argmin(nearby_distances))
+                distances[i], segments[i] = nearby_distances[j], nearby[j]
+        return distances, segments
+
+    def query(self, lat, lon, chunk_size=QUERY_CHUNK_SIZE, workers=-1):
+        """(distances in metres, line indices) of the closest drain to every coordinate"""
+        points = project(lat, lon).reshape(-1, 2)
+        distances = np.empty(len(points))
+        lines = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), chunk_size):
+            stop = start + chunk_size
+            chunk_distances, segments = self._nearest_segments(points[start:stop], workers)
+            distances[start:stop] = chunk_distances
+            lines[start:stop] = self.line_index[segments]
+        return distances, lines
+
+    def line_attributes(self, lines):
+        """Waterway type and covered flag (1.0/0.0) per line index"""
+        return {'waterway': self.line_waterway[lines], 'covered': self.line_covered[lines]}
+
+    def nearest(self, lat, lon):
+        """(distance in metres, line properties) of the drain closest to a coordinate"""
+        distances, lines = self.query([lat], [lon], workers=1)
+        return float(distances[0]), self.lines[lines[0]]
+
+    def nearest_distance(self, lat, lon):
+        """Distance in metres from a coordinate to the closest drain"""
+        return self.nearest(lat, lon)[0]
+
+
+def drainage_properties(line):
+    """A line's properties in the dataset's Drainage_properties format"""
+    properties = line['properties']
+    values = {key: properties.get(key) for key in DRAINAGE_PROPERTY_KEYS}
+    values['id'] = properties.get('@id')
+    return repr(values)
+
+
+def nearest_drains(network, lat, lon):
+    """(distances, lines) of the nearest drain to every coordinate, querying each distinct one once"""
+    coordinates, rows = np.unique(np.column_stack([lat, lon]).astype(float), axis=0, return_inverse=True)
+    distances, lines = network.query(coordinates[:, 0], coordinates[:, 1])
+    rows = rows.ravel()
+    return distances[rows], lines[rows]
+
+
+def regenerate_drainage_columns(df, network):
+    """
+    Recompute True_nearest_distance_m, Drainage_line_id (feature index in
+    the export) and Drainage_properties from each row's coordinates, in
+    place; each distinct coordinate is queried once
+    """
+    distances, lines = nearest_drains(network, df['Latitude'].to_numpy(dtype=float),
+                                      df['Longitude'].to_numpy(dtype=float))
+    df['True_nearest_distance_m'] = np.round(distances, 2)
+    df['Drainage_line_id'] = np.array([line['feature'] for line in network.lines])[lines]
+    df['Drainage_properties'] = np.array([drainage_properties(line) for line in network.lines],
+                                         dtype=object)[lines]
+    return df
+
+
+def drainage_csv_path(csv_in):
+    """Default output of regenerate_drainage_csv: <csv_in>_drainage.csv"""
+    return f"{os.path.splitext(csv_in)[0]}_drainage.csv"
+
+
+def regenerate_drainage_csv(csv_in, csv_out=None, network=None, geojson=DRAINAGE_GEOJSON):
+    """
+    Write csv_in with its drain columns recomputed from the export to
+    csv_out (default drainage_csv_path); returns (csv_out, |Δ distance| vs
+    csv_in in metres per row, seconds spent regenerating)
+    """
+    import pandas as pd
+
+    network = network or DrainageNetwork.from_geojson(geojson)
+    df = pd.read_csv(csv_in)
+    previous = pd.to_numeric(df['True_nearest_distance_m'], errors='coerce').to_numpy()
+    started = time.perf_counter()
+    regenerate_drainage_columns(df, network)
+    elapsed = time.perf_counter() - started
+    csv_out = csv_out or drainage_csv_path(csv_in)
+    df.to_csv(csv_out, index=False)
+    return csv_out, np.abs(df['True_nearest_distance_m'].to_numpy() - previous), elapsed
+
+
+def main():
+    """Regenerate the dataset's drain columns and/or time batched queries"""
+
+    parser = argparse.ArgumentParser(description="Recompute drain distances from the drainage export")
+    parser.add_argument('csv_in', nargs='?', default="final_flood_classification data.csv")
+    parser.add_argument('csv_out', nargs='?', default=None,
+                        help="default: <csv_in>_drainage.csv")
+    parser.add_argument('--geojson', default=DRAINAGE_GEOJSON)
+    parser.add_argument('--benchmark', type=int, default=0, metavar='N',
+                        help="also time N random points over the network's extent")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    network = DrainageNetwork.from_geojson(args.geojson)
+    print(f"🗺️ {len(network.lines)} drains, {len(network.starts)} segments "
+          f"({time.perf_counter() - started:.2f}s)")
+
+    csv_out, change, elapsed = regenerate_drainage_csv(args.csv_in, args.csv_out, network)
+    print(f"✅ {len(change)} rows regenerated in {elapsed * 1000:.1f} ms -> {csv_out}")
+    print(f"   |Δ distance| vs the CSV: median {np.nanmedian(change):.0f} m, max {np.nanmax(change):.0f} m")
+
+    if args.benchmark:
+        lower, upper = network.starts.min(axis=0), network.starts.max(axis=0)
+        rng = np.random.default_rng(0)
+        lat = np.degrees(rng.uniform(lower[1], upper[1], args.benchmark) / EARTH_RADIUS_M)
+        lon = np.degrees(rng.uniform(lower[0], upper[0], args.benchmark)
+                         / (EARTH_RADIUS_M * np.cos(np.radians(REFERENCE_LATITUDE))))
+        started = time.perf_counter()
+        network.query(lat, lon)
+        elapsed = time.perf_counter() - started
+        print(f"⚡ {args.benchmark} random points in {elapsed:.2f}s "
+              f"({args.benchmark / elapsed:,.0f} points/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""
+Compiled Tree Ensemble
+======================
+Flattens the fitted soft-voting ensemble (Random Forest, Extra Trees,
+XGBoost, LightGBM) into contiguous node arrays and evaluates every tree
+at once with NumPy. Serving a compiled ensemble needs only numpy/joblib.
+
+Usage: python ensemble_compiler.py [model_dir]
+"""
+
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+# Member kinds: averaged leaf distributions or summed margins + softmax
+PROBA_MEMBER = 0
+SOFTMAX_MEMBER = 1
+
+COMPILED_ENSEMBLE_FILE = "compiled_ensemble.joblib"
+
+# LightGBM reads dense rows as sparse pairs, dropping |x| <= 1e-35f as zero
+LIGHTGBM_ZERO_THRESHOLD = float(np.float32(1e-35))
+
+
+class CompiledEnsemble:
+    """
+    Array-backed evaluator for a soft-voting ensemble of tree models
+
+    Every tree's nodes live in the same contiguous arrays, with sibling
+    nodes adjacent so the right child is always child + 1. Leaves point at
+    themselves with an infinite threshold, so all trees can be advanced in
+    lockstep for max_depth steps. Inputs are looked up in a widened row [x, float32(x), x with
+    near-zeros flushed] so each library's trees see exactly the values
+    their own predict would compare.
+    """
+
+    def __init__(self, feature, threshold, child, default_left, value,
+                 roots, tree_depth, tree_member, member_kind, member_bias,
+                 member_weight, member_names, classes, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_depth = tree_depth
+        self.tree_member = tree_member
+        self.member_kind = member_kind
+        self.member_bias = member_bias
+        self.member_weight = member_weight
+        self.member_names = member_names
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def predict_proba(self, X, batch_size=256):
+        """Soft-vote class probabilities, same as VotingClassifier.predict_proba"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        proba = np.empty((X.shape[0], len(self.classes_)))
+        for start in range(0, X.shape[0], batch_size):
+            stop = start + batch_size
+            proba[start:stop] = self._predict_proba_block(X[start:stop])
+        return proba
+
+    def predict(self, X):
+        """Predicted class labels (argmax of the soft vote)"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def _predict_proba_block(self, X):
+        n_samples = X.shape[0]
+
+        # Widened input, one row per feature view: [0, F) float64,
+        # [F, 2F) float32-rounded, [2F, 3F) LightGBM's near-zero flush
+        flushed = np.where(np.abs(X) <= LIGHTGBM_ZERO_THRESHOLD, 0.0, X)
+        widened = np.concatenate([X, X.astype(np.float32).astype(np.float64), flushed], axis=1)
+        flat = np.ascontiguousarray(widened.T).ravel()
+        sample = np.arange(n_samples)
+        has_missing = np.isnan(X).any()
+        nodes = self._node_table()
+
+        # Tree-major walk, deepest trees first: each step only advances the
+        # prefix of trees that still have internal nodes at that depth
+        node = np.repeat(self.roots.astype(np.intp)[:, None], n_samples, axis=1)
+        for depth in range(int(self.tree_depth[0]) if self.n_trees else 0):
+            active = np.searchsorted(-self.tree_depth, -depth, side='left')
+            current = np.take(nodes, node[:active])
+            position = current['feature'] * n_samples
+            position += sample
+            x = np.take(flat, position)
+            go_right = x > current['threshold']
+            if has_missing:
+                go_right |= np.isnan(x) & ~current['default_left']
+            node[:active] = current['child'] + go_right
+
+        # Per-member sums of leaf values: (n_members, n_samples, n_classes)
+        leaf_values = np.take(self.value, node, axis=0)
+        member_sums = np.tensordot(self._member_matrix().T, leaf_values, axes=1)
+
+        softmax_members = self.member_kind == SOFTMAX_MEMBER
+        if softmax_members.any():
+            margins = member_sums[softmax_members] + self.member_bias[softmax_members][:, None, :]
+            margins -= margins.max(axis=2, keepdims=True)
+            np.exp(margins, out=margins)
+            margins /= margins.sum(axis=2, keepdims=True)
+            member_sums[softmax_members] = margins
+
+        return np.average(member_sums, axis=0, weights=self.member_weight)
+
+    def _node_table(self):
+        """Packed per-node records, so one gather fetches a whole split"""
+        table = getattr(self, '_packed_nodes', None)
+        if table is None:
+            table = np.empty(self.n_nodes, dtype=[('threshold', np.float64), ('feature', np.intp),
+                                                  ('child', np.intp), ('default_left', bool)])
+            table['threshold'] = self.threshold
+            table['feature'] = self.feature
+            table['child'] = self.child
+            table['default_left'] = self.default_left
+            self._packed_nodes = table
+        return table
+
+    def _member_matrix(self):
+        """One-hot tree -> member assignment used to sum leaf values per member"""
+        matrix = getattr(self, '_tree_member_matrix', None)
+        if matrix is None:
+            matrix = np.zeros((self.n_trees, len(self.member_kind)))
+            matrix[np.arange(self.n_trees), self.tree_member] = 1.0
+            self._tree_member_matrix = matrix
+        return matrix
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The small member matrix is rebuilt lazily; the packed node table is
+        # kept when built, so a memory-mapped load shares it between processes
+        state.pop('_tree_member_matrix', None)
+        return state
+
+
+def _flat_tree(feature, threshold, left, right, default_left, value, is_leaf):
+    """
+    Renumber one tree breadth-first so siblings are adjacent
+
+    Leaves get an infinite threshold, point at themselves and default
+    left, so further steps never move them. Returns the tree's arrays and
+    its depth.
+    """
+    order, depth, level = [0], 0, [0]
+    while True:
+        level = [child for node in level if not is_leaf[node]
+                 for child in (left[node], right[node])]
+        if not level:
+            break
+        order.extend(level)
+        depth += 1
+
+    order = np.array(order)
+    new_index = np.empty(len(order), dtype=np.int64)
+    new_index[order] = np.arange(len(order))
+
+    leaf = np.asarray(is_leaf)[order]
+    left_child = new_index[np.where(leaf, 0, np.asarray(left)[order])]
+    child = np.where(leaf, np.arange(len(order)), left_child)
+    return {
+        'feature': np.where(leaf, 0, np.asarray(feature)[order]).astype(np.int32),
+        'threshold': np.where(leaf, np.inf, np.asarray(threshold, dtype=np.float64)[order]),
+        'child': child.astype(np.int32),
+        'default_left': np.where(leaf, True, np.asarray(default_left, dtype=bool)[order]),
+        'value': np.where(leaf[:, None], np.asarray(value)[order], 0.0),
+        'depth': depth
+    }
+
+
+def _compile_sklearn_forest(forest, n_features, n_classes):
+    """RandomForest/ExtraTrees: float32 inputs, x <= threshold goes left"""
+    trees = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+
+        # Normalised class distribution, divided by the forest size so the
+        # per-member sum is the forest's averaged predict_proba
+        value = tree.value[:, 0, :n_classes].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        value = value / totals / len(forest.estimators_)
+
+        default_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool))
+        trees.append(_flat_tree(tree.feature + n_features, tree.threshold,
+                                tree.children_left, tree.children_right,
+                                default_left, value, is_leaf))
+    return trees, PROBA_MEMBER, np.zeros(n_classes)
+
+
+def _compile_xgboost(model, n_features, n_classes):
+    """XGBoost softprob: float32 inputs, x < threshold goes left"""
+    booster = model.get_booster()
+    raw = json.loads(booster.save_raw('json'))
+    gbtree = raw['learner']['gradient_booster']['model']
+
+    objective = raw['learner']['objective']['name']
+    if objective != 'multi:softprob' and objective != 'multi:softmax':
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+
+    # Intercept: a scalar (older releases) or one value per class
+    base_score = raw['learner']['learner_model_param']['base_score']
+    bias = np.array([float(v) for v in base_score.strip('[]').split(',')])
+    bias = np.broadcast_to(bias, (n_classes,)).astype(np.float64)
+
+    trees = []
+    for tree_json, tree_class in zip(gbtree['trees'], gbtree['tree_info']):
+        left = np.array(tree_json['left_children'])
+        right = np.array(tree_json['right_children'])
+        is_leaf = left == -1
+
+        # x32 < t32  <=>  x32 <= the next float32 below t32
+        split = np.array(tree_json['split_conditions'], dtype=np.float32)
+        threshold = np.nextafter(split, np.float32(-np.inf)).astype(np.float64)
+
+        value = np.zeros((len(left), n_classes))
+        value[:, tree_class] = split.astype(np.float64)  # Leaf weights live in split_conditions
+
+        trees.append(_flat_tree(np.array(tree_json['split_indices']) + n_features, threshold,
+                                left, right, np.array(tree_json['default_left'], dtype=bool),
+                                value, is_leaf))
+    return trees, SOFTMAX_MEMBER, bias
+
+
+def _compile_lightgbm(model, n_features, n_classes):
+    """LightGBM multiclass: float64 inputs with near-zeros flushed, x <= threshold goes left"""
+    dump = model.booster_.dump_model()
+    per_iteration = dump['num_tree_per_iteration']
+
+    trees = []
+    for tree_index, tree_info in enumerate(dump['tree_info']):
+        tree_class = tree_index % per_iteration if per_iteration > 1 else 1
+
+        # Breadth-first flattening of the nested JSON structure
+        nodes = [tree_info['tree_structure']]
+        feature, threshold, left, right, default_left, leaf_value = [], [], [], [], [], []
+        position = 0
+        while position < len(nodes):
+            node = nodes[position]
+            if 'leaf_value' in node:
+                feature.append(0)
+                threshold.append(0.0)
+                left.append(-1)
+                right.append(-1)
+                default_left.append(False)
+                leaf_value.append(node['leaf_value'])
+            else:
+                if node['decision_type'] != '<=':
+                    raise ValueError("Categorical LightGBM splits are not supported")
+                if node.get('missing_type') == 'Zero':
+                    raise ValueError("LightGBM zero-as-missing splits are not supported")
+                feature.append(node['split_feature'])
+                threshold.append(node['threshold'])
+                left.append(len(nodes))
+                right.append(len(nodes) + 1)
+                default_left.append(node['default_left'])
+                leaf_value.append(0.0)
+                nodes.extend([node['left_child'], node['right_child']])
+            position += 1
+
+        left, right = np.array(left), np.array(right)
+        is_leaf = left == -1
+        value = np.zeros((len(nodes), n_classes))
+        value[:, tree_class] = leaf_value
+        trees.append(_flat_tree(np.array(feature) + 2 * n_features, np.array(threshold), left, right,
+                                default_left, value, is_leaf))
+    return trees, SOFTMAX_MEMBER, np.zeros(n_classes)
+
+
+def _compile_member(estimator, n_features, n_classes):
+    """Dispatch on the fitted estimator without importing its library"""
+    if hasattr(estimator, 'get_booster'):
+        return _compile_xgboost(estimator, n_features, n_classes)
+    if hasattr(estimator, 'booster_'):
+        return _compile_lightgbm(estimator, n_features, n_classes)
+    if hasattr(estimator, 'estimators_') and hasattr(estimator.estimators_[0], 'tree_'):
+        return _compile_sklearn_forest(estimator, n_features, n_classes)
+    raise ValueError(f"Cannot compile ensemble member of type {type(estimator).__name__}")
+
+
+def compile_ensemble(model):
+    """Flatten a fitted soft-voting VotingClassifier into a CompiledEnsemble"""
+    if getattr(model, 'voting', 'soft') != 'soft':
+        raise ValueError("Only soft-voting ensembles can be compiled")
+
+    classes = np.asarray(model.classes_)
+    n_classes = len(classes)
+    n_features = model.n_features_in_
+
+    member_names = [name for name, est in model.estimators if est != 'drop']
+    all_trees, tree_member, kinds, biases = [], [], [], []
+    for member_index, estimator in enumerate(model.estimators_):
+        if not np.array_equal(estimator.classes_, np.arange(n_classes)):
+            raise ValueError("Ensemble members must be fitted on encoded class labels")
+        trees, kind, bias = _compile_member(estimator, n_features, n_classes)
+        all_trees.extend(trees)
+        tree_member.extend([member_index] * len(trees))
+        kinds.append(kind)
+        biases.append(bias)
+
+    weights = model.weights
+    if weights is None:
+        weights = np.ones(len(kinds))
+    else:
+        weights = np.array([w for w in weights if w is not None], dtype=np.float64)
+
+    # Deepest trees first (stable, so member order is kept within a depth)
+    order = sorted(range(len(all_trees)), key=lambda i: -all_trees[i]['depth'])
+    all_trees = [all_trees[i] for i in order]
+    tree_member = np.array(tree_member, dtype=np.int32)[order]
+
+    sizes = np.array([len(tree['feature']) for tree in all_trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+
+    def stacked(key):
+        return np.concatenate([tree[key] for tree in all_trees])
+
+    return CompiledEnsemble(
+        feature=stacked('feature'),
+        threshold=stacked('threshold'),
+        child=stacked('child') + np.repeat(offsets, sizes),
+        default_left=stacked('default_left'),
+        value=np.ascontiguousarray(stacked('value')),
+        roots=offsets,
+        tree_depth=np.array([tree['depth'] for tree in all_trees], dtype=np.int32),
+        tree_member=tree_member,
+        member_kind=np.array(kinds, dtype=np.int8),
+        member_bias=np.array(biases, dtype=np.float64),
+        member_weight=weights,
+        member_names=member_names,
+        classes=classes,
+        n_features=n_features
+    )
+
+
+def save_compiled_ensemble(compiled, path):
+    """Persist a compiled ensemble (uncompressed, so it can be memory-mapped)"""
+    joblib.dump(compiled, path)
+
+
+def load_compiled_ensemble(path, mmap_mode=None):
+    """Load a compiled ensemble saved by save_compiled_ensemble"""
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def parity_inputs(compiled, n_random=2000, seed=42):
+    """Random rows plus rows sitting exactly on split thresholds"""
+    rng = np.random.default_rng(seed)
+    n_features = compiled.n_features_in_
+    X = rng.normal(0.0, 2.0, size=(n_random, n_features))
+
+    # Boundary rows: feature values equal to real thresholds stress <= vs <
+    internal = np.flatnonzero(np.isfinite(compiled.threshold))
+    picks = rng.choice(internal, size=min(n_random, len(internal)), replace=False)
+    boundary = rng.normal(0.0, 2.0, size=(len(picks), n_features))
+    boundary[np.arange(len(picks)), compiled.feature[picks] % n_features] = compiled.threshold[picks]
+    return np.vstack([X, boundary])
+
+
+def check_parity(model, compiled, X, atol=1e-6):
+    """Compare the compiled evaluator with the original predict_proba"""
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    max_abs_diff = float(np.max(np.abs(expected - actual)))
+    label_agreement = float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+    return {
+        'rows': len(X),
+        'max_abs_diff': max_abs_diff,
+        'label_agreement': label_agreement,
+        'passed': max_abs_diff <= atol
+    }
+
+
+def main():
+    """Compile model_files/ and check parity against the original ensemble"""
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "model_files"
+    print("🧱 Compiling ensemble...")
+
+    # Bundles (model_bundle.py) already embed a compiled copy; compile and check it anyway
+    from model_bundle import load_model_bundle, MODEL_BUNDLE_FILE
+    bundle_path = f"{model_dir}/{MODEL_BUNDLE_FILE}"
+    in_bundle = os.path.exists(bundle_path)
+    if in_bundle:
+        model = load_model_bundle(bundle_path).estimator()
+    else:
+        model = joblib.load(f"{model_dir}/advanced_flood_model.joblib")
+    start = time.perf_counter()
+    compiled = compile_ensemble(model)
+    print(f"Compiled {compiled.n_trees} trees / {compiled.n_nodes} nodes "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    X = parity_inputs(compiled)
+    parity = check_parity(model, compiled, X)
+    print(f"Parity on {parity['rows']} rows: max |Δp| = {parity['max_abs_diff']:.2e}, "
+          f"label agreement = {parity['label_agreement']:.4%}")
+
+    if not parity['passed']:
+        print("❌ Parity check failed, compiled ensemble not saved")
+        sys.exit(1)
+
+    for n_rows in (1, 1000):
+        start = time.perf_counter()
+        model.predict_proba(X[:n_rows])
+        original = time.perf_counter() - start
+        start = time.perf_counter()
+        compiled.predict_proba(X[:n_rows])
+        flat = time.perf_counter() - start
+        print(f"{n_rows} row(s): original {original * 1e3:.2f} ms, compiled {flat * 1e3:.2f} ms")
+
+    if in_bundle:
+        print(f"✅ {bundle_path} already contains the compiled ensemble")
+        return
+
+    save_compiled_ensemble(compiled, f"{model_dir}/{COMPILED_ENSEMBLE_FILE}")
+    print(f"✅ Compiled ensemble saved to {model_dir}/{COMPILED_ENSEMBLE_FILE}")
+
+
+if __name__ == "__main__":
+    # Run from the importable module so pickles reference ensemble_compiler.CompiledEnsemble
+    import ensemble_compiler
+    ensemble_compiler.main()
@@ -0,0 +1,377 @@
+"""
+Risk-aware Evacuation Routing
+=============================
+Shortest routes over the road network from an OpenStreetMap extract
+(.osm XML or Overpass JSON), with every road's cost raised by the flood
+risk of the cells it crosses.
+
+- Ways are split only where they meet other ways, so each graph edge is a
+  whole stretch of road between junctions and shape nodes never enter the
+  search (the node-contraction step of contraction hierarchies)
+- The graph is a CSR adjacency matrix; queries run SciPy's compiled
+  Dijkstra bounded by a search radius around the straight-line distance,
+  widened only when the target is not reached, so a query settles the
+  junctions in a corridor rather than the whole city
+- Risk refreshes recompute edge costs with array operations only (each
+  road segment's risk cell is looked up once per grid layout), and swap
+  them in as a whole, so queries never see a half-updated graph
+
+A segment of length L with risk score r (0 low to 1 high) costs
+L * (1 + risk_penalty * r); routes still exist through risky roads when
+there is no other way.
+
+Benchmark on an extract: python evacuation_routing.py export.osm [--queries 200]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from drainage_network import project
+
+logger = logging.getLogger(__name__)
+
+ROAD_NETWORK_FILE = "../Dataset/roads/export.osm"
+
+# highway=* values that carry vehicles (footpaths, steps and tracks are skipped)
+ROUTABLE_HIGHWAYS = {
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified',
+    'residential', 'living_street', 'service', 'road'
+}
+
+# Cost multiplier per unit of risk: a road in a High risk cell costs 1 + 4 times its length
+RISK_PENALTY = 4.0
+
+# First search radius: this multiple of the straight-line distance plus a margin
+ROUTE_SEARCH_FACTOR = 2.0
+ROUTE_SEARCH_MARGIN_M = 2000.0
+
+
+def _oneway(tags):
+    """1 for forward-only ways, -1 for reverse-only, 0 for two-way"""
+    value = tags.get('oneway')
+    if value in ('yes', 'true', '1'):
+        return 1
+    if value == '-1':
+        return -1
+    if value is None and (tags.get('highway') == 'motorway' or tags.get('junction') == 'roundabout'):
+        return 1
+    return 0
+
+
+def read_osm_ways(path, highways=ROUTABLE_HIGHWAYS):
+    """
+    (node ids, latitudes, longitudes, way node refs, way offsets, oneway flags)
+    of the routable ways in an .osm XML or Overpass JSON extract; way i
+    has node refs refs[offsets[i]:offsets[i + 1]]
+    """
+    node_ids, lats, lons = array('q'), array('d'), array('d')
+    refs, offsets, oneway = array('q'), array('q', [0]), array('b')
+
+    def add_way(nodes, tags):
+        if tags.get('highway') in highways and len(nodes) >= 2:
+            refs.extend(nodes)
+            offsets.append(len(refs))
+            oneway.append(_oneway(tags))
+
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            elements = json.load(f)['elements']
+        for element in elements:
+            if element['type'] == 'node':
+                node_ids.append(element['id'])
+                lats.append(element['lat'])
+                lons.append(element['lon'])
+            elif element['type'] == 'way':
+                add_way(element.get('nodes', []), element.get('tags', {}))
+    else:
+        for _, element in ET.iterparse(path, events=('end',)):
+            if element.tag == 'node':
+                node_ids.append(int(element.get('id')))
+                lats.append(float(element.get('lat')))
+                lons.append(float(element.get('lon')))
+                element.clear()
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                add_way([int(nd.get('ref')) for nd in element.iter('nd')], tags)
+                element.clear()
+
+    return (np.frombuffer(node_ids, dtype=np.int64), np.frombuffer(lats), np.frombuffer(lons),
+            np.frombuffer(refs, dtype=np.int64), np.frombuffer(offsets, dtype=np.int64),
+            np.frombuffer(oneway, dtype=np.int8))
+
+
+class RoadGraph:
+    """
+    Junction graph of the road network with risk-weighted edge costs
+
+    Segments are consecutive node pairs of a way; pieces are runs of
+    segments between junctions; directed edges run along a piece (or
+    against it, for the reverse direction of two-way roads); parallel
+    edges between the same junctions share one CSR entry holding the
+    cheapest of them.
+    """
+
+    def __init__(self, node_lat, node_lon, segment_nodes, segment_piece, piece_oneway,
+                 risk_penalty=RISK_PENALTY):
+        self.node_lat = node_lat
+        self.node_lon = node_lon
+        self.risk_penalty = risk_penalty
+
+        # Segments, in piece order
+        self.segment_nodes = segment_nodes
+        points = project(node_lat, node_lon)
+        self.segment_length = np.linalg.norm(points[segment_nodes[:, 1]] - points[segment_nodes[:, 0]], axis=1)
+        self.segment_mid_lat = node_lat[segment_nodes].mean(axis=1)
+        self.segment_mid_lon = node_lon[segment_nodes].mean(axis=1)
+
+        # Pieces: first segment of each, end nodes, length
+        self.piece_start = np.flatnonzero(np.r_[True, segment_piece[1:] != segment_piece[:-1]])
+        self.piece_end = np.r_[self.piece_start[1:], len(segment_nodes)]
+        piece_from = segment_nodes[self.piece_start, 0]
+        piece_to = segment_nodes[self.piece_end - 1, 1]
+        self.piece_length = np.add.reduceat(self.segment_length, self.piece_start)
+
+        # Junctions are the piece end nodes
+        self.vertex_node, vertex_of = np.unique(np.r_[piece_from, piece_to], return_inverse=True)
+        n_pieces = len(self.piece_start)
+        piece_from_vertex, piece_to_vertex = vertex_of[:n_pieces], vertex_of[n_pieces:]
+        self._vertex_tree = cKDTree(project(node_lat[self.vertex_node], node_lon[self.vertex_node]))
+
+        # Directed edges, sorted by (source, target)
+        forward = np.flatnonzero(piece_oneway >= 0)
+        backward = np.flatnonzero(piece_oneway <= 0)
+        source = np.r_[piece_from_vertex[forward], piece_to_vertex[backward]]
+        target = np.r_[piece_to_vertex[forward], piece_from_vertex[backward]]
+        piece = np.r_[forward, backward]
+        reverse = np.r_[np.zeros(len(forward), bool), np.ones(len(backward), bool)]
+        keep = source != target  # Loops never shorten a route
+        order = np.lexsort((target[keep], source[keep]))
+        self.edge_source = source[keep][order]
+        self.edge_target = target[keep][order]
+        self.edge_piece = piece[keep][order]
+        self.edge_reverse = reverse[keep][order]
+
+        # One CSR entry per (source, target) pair
+        new_pair = np.r_[True, (np.diff(self.edge_source) != 0) | (np.diff(self.edge_target) != 0)]
+        self.pair_start = np.flatnonzero(new_pair)
+        self.pair_end = np.r_[self.pair_start[1:], len(self.edge_source)]
+        n_vertices = len(self.vertex_node)
+        self.indices = self.edge_target[self.pair_start].astype(np.int32)
+        self.indptr = np.searchsorted(self.edge_source[self.pair_start], np.arange(n_vertices + 1)).astype(np.int32)
+        self.pair_key = self.edge_source[self.pair_start] * n_vertices + self.indices
+        self.edge_pair = np.repeat(np.arange(len(self.pair_start)), self.pair_end - self.pair_start)
+
+        self._segment_cells = None  # (grid layout, flat cell per segment or -1)
+        self._state = None
+        self.set_risk(None)
+
+    @classmethod
+    def from_osm(cls, path=ROAD_NETWORK_FILE, risk_penalty=RISK_PENALTY):
+        """Build the graph from an OpenStreetMap extract"""
+        node_ids, lats, lons, refs, offsets, oneway = read_osm_ways(path)
+        order = np.argsort(node_ids)
+        node_ids = node_ids[order]
+        position = np.clip(np.searchsorted(node_ids, refs), 0, len(node_ids) - 1)
+        present = node_ids[position] == refs  # Clipped extracts reference missing nodes
+        nodes = order[position]
+
+        # Segments between consecutive present nodes of the same way
+        way = np.repeat(np.arange(len(oneway)), np.diff(offsets))
+        pair = (way[:-1] == way[1:]) & present[:-1] & present[1:]
+        first = np.flatnonzero(pair)
+        segment_nodes = np.stack([nodes[first], nodes[first + 1]], axis=1)
+        segment_way = way[first]
+
+        # A run is a stretch of consecutive segments of one way; pieces also
+        # break wherever a node is a junction (not exactly two segment ends)
+        run_start = np.r_[True, (first[1:] != first[:-1] + 1)]
+        run_end = np.r_[run_start[1:], True]
+        degree = np.bincount(segment_nodes.ravel(), minlength=len(lats))
+        junction = degree != 2
+        junction[segment_nodes[run_start, 0]] = True
+        junction[segment_nodes[run_end, 1]] = True
+        segment_piece = np.cumsum(run_start | junction[segment_nodes[:, 0]]) - 1
+
+        piece_way = segment_way[np.flatnonzero(np.r_[True, segment_piece[1:] != segment_piece[:-1]])]
+        return cls(lats, lons, segment_nodes, segment_piece, oneway[piece_way].astype(np.int64), risk_penalty)
+
+    @classmethod
+    def from_env(cls):
+        """Build the graph from ROAD_NETWORK_FILE and ROUTE_RISK_PENALTY"""
+        return cls.from_osm(os.environ.get('ROAD_NETWORK_FILE', ROAD_NETWORK_FILE),
+                            float(os.environ.get('ROUTE_RISK_PENALTY', RISK_PENALTY)))
+
+    @property
+    def risk_version(self):
+        return self._state['risk_version']
+
+    def stats(self):
+        """Graph size and the risk version in use"""
+        return {
+            'junctions': len(self.vertex_node),
+            'edges': len(self.edge_source),
+            'segments': len(self.segment_nodes),
+            'road_km': round(float(self.piece_length.sum()) / 1000, 1),
+            'risk_penalty': self.risk_penalty,
+            'risk_version': self.risk_version
+        }
+
+    def _cells(self, metadata):
+        """Flat grid cell under each segment's midpoint (-1 outside), cached per grid layout"""
+        bounds = metadata['bounds']
+        layout = (bounds['north'], bounds['west'], metadata['lat_step'], metadata['lon_step'],
+                  tuple(metadata['shape'][-2:]))
+        if self._segment_cells is None or self._segment_cells[0] != layout:
+            north, west, lat_step, lon_step, (rows, cols) = layout
+            row = np.floor((north - self.segment_mid_lat) / lat_step).astype(np.int64)
+            col = np.floor((self.segment_mid_lon - west) / lon_step).astype(np.int64)
+            inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+            self._segment_cells = (layout, np.where(inside, row * cols + col, -1))
+        return self._segment_cells[1]
+
+    def set_risk(self, scores, metadata=None, version=None):
+        """
+        Recompute edge costs from a risk score grid (rows, cols), laid out
+        as described by risk grid metadata; None resets to plain distances
+        """
+        segment_risk = np.zeros(len(self.segment_length))
+        if scores is not None:
+            cells = self._cells(metadata)
+            inside = cells >= 0
+            segment_risk[inside] = np.nan_to_num(np.asarray(scores, dtype=np.float64).ravel()[cells[inside]])
+
+        exposure = self.segment_length * segment_risk
+        piece_cost = np.add.reduceat(self.segment_length + self.risk_penalty * exposure, self.piece_start)
+        edge_cost = piece_cost[self.edge_piece]
+        pair_cost = np.minimum.reduceat(edge_cost, self.pair_start)
+        # Cheapest parallel edge of each pair (the first one at the pair's minimum)
+        edge_index = np.arange(len(edge_cost))
+        pair_edge = np.minimum.reduceat(np.where(edge_cost == pair_cost[self.edge_pair], edge_index, len(edge_cost)),
+                                        self.pair_start)
+        pair_cost = np.maximum(pair_cost, 1e-3)  # Zeros are not edges
+
+        n_vertices = len(self.vertex_node)
+        self._state = {
+            'graph': csr_matrix((pair_cost, self.indices, self.indptr), shape=(n_vertices, n_vertices)),
+            'pair_edge': pair_edge,
+            'piece_exposure': np.add.reduceat(exposure, self.piece_start),
+            'piece_max_risk': np.maximum.reduceat(segment_risk, self.piece_start),
+            'risk_version': version
+        }
+
+    def update_risk_from(self, risk_tiles):
+        """Take the risk tile layer's current grid if it is newer than ours"""
+        current = risk_tiles.risk_scores() if risk_tiles is not None else None
+        if current is not None and current[0] != self.risk_version:
+            version, scores, metadata = current
+            started = time.perf_counter()
+            self.set_risk(scores, metadata, version)
+            logger.info(f"Route costs updated to risk grid {version} "
+                        f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    def nearest_junction(self, lat, lon):
+        """(distance in metres, junction) closest to a coordinate"""
+        distance, vertex = self._vertex_tree.query(project(lat, lon))
+        return float(distance), int(vertex)
+
+    def route(self, start, end):
+        """
+        Cheapest route between two (lat, lon) points, each snapped to its
+        nearest junction; None when the junctions are not connected
+        """
+        state = self._state  # One consistent set of costs for the whole query
+        graph = state['graph']
+        start_snap, source = self.nearest_junction(*start)
+        end_snap, target = self.nearest_junction(*end)
+
+        straight = float(np.linalg.norm(self._vertex_tree.data[target] - self._vertex_tree.data[source]))
+        limit = ROUTE_SEARCH_FACTOR * straight + ROUTE_SEARCH_MARGIN_M
+        while True:
+            costs, predecessors = dijkstra(graph, directed=True, indices=source,
+                                           return_predecessors=True, limit=limit)
+            if np.isfinite(costs[target]) or np.isinf(limit):
+                break
+            limit = limit * 4 if limit < 64 * (straight + ROUTE_SEARCH_MARGIN_M) else np.inf
+        if not np.isfinite(costs[target]):
+            return None
+
+        vertices = [target]
+        while vertices[-1] != source:
+            vertices.append(predecessors[vertices[-1]])
+        vertices = np.array(vertices[::-1], dtype=np.int64)
+
+        # Cheapest parallel edge of every hop, then the nodes along its piece:
+        # the segment ends in order, or the segment starts backwards when reversed
+        pairs = np.searchsorted(self.pair_key, vertices[:-1] * len(self.vertex_node) + vertices[1:])
+        edges = state['pair_edge'][pairs]
+        pieces, reverse = self.edge_piece[edges], self.edge_reverse[edges]
+        counts = self.piece_end[pieces] - self.piece_start[pieces]
+        step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        segments = np.where(np.repeat(reverse, counts), np.repeat(self.piece_end[pieces] - 1, counts) - step,
+                            np.repeat(self.piece_start[pieces], counts) + step)
+        nodes = np.r_[self.vertex_node[source],
+                      np.where(np.repeat(reverse, counts), self.segment_nodes[segments, 0],
+                               self.segment_nodes[segments, 1])]
+
+        distance = float(self.piece_length[pieces].sum())
+        return {
+            'distance_m': round(distance, 1),
+            'cost': round(float(costs[target]), 1),
+            'mean_risk': round(float(state['piece_exposure'][pieces].sum()) / distance, 4) if distance else 0.0,
+            'max_risk': round(float(state['piece_max_risk'][pieces].max()), 4) if len(pieces) else 0.0,
+            'start_snap_m': round(start_snap, 1),
+            'end_snap_m': round(end_snap, 1),
+            'coordinates': np.round(np.stack([self.node_lat[nodes], self.node_lon[nodes]], axis=1), 6).tolist(),
+            'risk_version': state['risk_version']
+        }
+
+
+def main():
+    """Load an extract and time random routes with plain and risk-weighted costs"""
+    parser = argparse.ArgumentParser(description="Benchmark risk-aware routing on an OSM extract")
+    parser.add_argument('osm_path', nargs='?', default=ROAD_NETWORK_FILE)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--risk-grid', default=None, help="risk grid prefix saved by risk_grid.py")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = RoadGraph.from_osm(args.osm_path)
+    print(f"🛣️ Road graph loaded in {time.perf_counter() - started:.2f}s: {graph.stats()}")
+
+    if args.risk_grid:
+        from risk_grid import load_risk_grid
+        from risk_tiles import risk_index, NO_DATA
+
+        raster, metadata = load_risk_grid(args.risk_grid)
+        index = risk_index(raster, metadata['classes'])
+        scores = np.where(index == NO_DATA, np.nan, index / (NO_DATA - 1))
+        started = time.perf_counter()
+        graph.set_risk(scores, metadata, 'benchmark')
+        print(f"⚡ Risk costs applied in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    rng = np.random.default_rng(42)
+    vertices = rng.integers(len(graph.vertex_node), size=(args.queries, 2))
+    coordinates = np.stack([graph.node_lat[graph.vertex_node[vertices]],
+                            graph.node_lon[graph.vertex_node[vertices]]], axis=-1)
+    timings, found = [], 0
+    for start, end in coordinates:
+        started = time.perf_counter()
+        found += graph.route(tuple(start), tuple(end)) is not None
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"✅ {found}/{args.queries} routes found; p50 {np.percentile(timings, 50):.1f}ms, "
+          f"p95 {np.percentile(timings, 95):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Static Area Feature Store
+=========================
+Per-area static attributes built once from the training CSV and saved as
+a float64 .npy matrix (one row per area, columns in DEFAULT_AREA_DATA
+order) plus a JSON area index. Servers memory-map the matrix at startup
+and hand rows to the predictor by offset, instead of re-parsing the CSV
+or merging area dicts per request.
+
+Build after training: python feature_store.py [model_dir]
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+AREAS_CSV = "final_flood_classification data.csv"
+AREA_FEATURES_FILE = "area_features.npy"
+AREA_INDEX_FILE = "area_index.json"
+
+# Categorical columns label-encoded by prepare_features_and_target
+CATEGORICAL_AREA_COLUMNS = ['Ward Code', 'Land Use Classes', 'Soil Type']
+
+
+def area_encodings(predictor):
+    """The predictor's training vocabulary of each categorical area column, or None"""
+    if not predictor.category_encodings:
+        return None
+    return {col: list(predictor.category_encodings.get(col, [])) for col in CATEGORICAL_AREA_COLUMNS}
+
+
+def load_area_profiles(predictor, csv_path=AREAS_CSV):
+    """
+    One static profile per (ward, area) in the dataset
+
+    Numeric area attributes are the per-area median over the daily rows;
+    categorical ones take the most common value, encoded with the
+    predictor's training vocabulary (-1 if unseen). Models saved without
+    category_encodings fall back to the sorted labels, as LabelEncoder
+    assigns them.
+    """
+    import pandas as pd
+    from flood_inference import MISSING_CATEGORY, category_labels, missing_category_code
+
+    df = predictor.load_and_preprocess_data(csv_path)
+    area_columns = list(predictor.DEFAULT_AREA_DATA)
+
+    encodings = {}
+    for col in CATEGORICAL_AREA_COLUMNS:
+        df[col] = category_labels(df[col])
+        vocabulary = (predictor.category_encodings or {}).get(col) or sorted(df[col].unique())
+        encodings[col] = {label: code for code, label in enumerate(vocabulary)}
+        encodings[col][MISSING_CATEGORY] = missing_category_code(vocabulary)
+
+    numeric_columns = [col for col in area_columns if col not in CATEGORICAL_AREA_COLUMNS]
+    for col in numeric_columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+        df[col] = df[col].fillna(df[col].median())
+
+    profiles = []
+    for (ward, area), rows in df.groupby(['Ward Code', 'Areas'], sort=True):
+        area_data = {col: float(rows[col].median()) for col in numeric_columns}
+        for col in CATEGORICAL_AREA_COLUMNS:
+            area_data[col] = encodings[col].get(rows[col].mode().iloc[0], -1)
+        profiles.append({
+            'area': area,
+            'ward': ward,
+            'latitude': round(area_data['Latitude'], 6),
+            'longitude': round(area_data['Longitude'], 6),
+            'area_data': area_data
+        })
+
+    return profiles
+
+
+def file_sha256(path):
+    """Hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AreaFeatureStore:
+    """
+    Row-addressable static area attributes
+
+    rows is an (n_areas, n_columns) float64 array, usually a read-only
+    memmap; areas[i] describes row i (name, ward, coordinates).
+    """
+
+    def __init__(self, rows, columns, areas, source=None):
+        self.rows = rows
+        self.columns = list(columns)
+        self.areas = areas
+        self.source = source or {}
+        self._by_name = {}
+        for row, area in enumerate(areas):
+            self._by_name.setdefault(area['area'].lower(), row)
+
+    @classmethod
+    def build(cls, predictor, csv_path=AREAS_CSV):
+        """Build the store in memory from the training CSV"""
+        profiles = load_area_profiles(predictor, csv_path)
+        columns = list(predictor.DEFAULT_AREA_DATA)
+        rows = np.array([[profile['area_data'][col] for col in columns] for profile in profiles],
+                        dtype=np.float64)
+        areas = [{key: profile[key] for key in ('area', 'ward', 'latitude', 'longitude')}
+                 for profile in profiles]
+        source = {'csv': os.path.basename(csv_path), 'sha256': file_sha256(csv_path),
+                  'category_encodings': area_encodings(predictor)}
+        return cls(rows, columns, areas, source)
+
+    def save(self, model_dir="model_files"):
+        """Write the matrix and index, replacing any previous files atomically"""
+        os.makedirs(model_dir, exist_ok=True)
+        features_path = os.path.join(model_dir, AREA_FEATURES_FILE)
+        index_path = os.path.join(model_dir, AREA_INDEX_FILE)
+
+        with open(features_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.rows, dtype=np.float64))
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'columns': self.columns, 'source': self.source, 'areas': self.areas}, f, indent=1)
+
+        os.replace(features_path + '.tmp', features_path)
+        os.replace(index_path + '.tmp', index_path)
+
+    @classmethod
+    def load(cls, model_dir="model_files", mmap_mode='r'):
+        """Map a saved store; rows are read lazily from the .npy file"""
+        with open(os.path.join(model_dir, AREA_INDEX_FILE), encoding='utf-8') as f:
+            index = json.load(f)
+        rows = np.load(os.path.join(model_dir, AREA_FEATURES_FILE), mmap_mode=mmap_mode)
+        if rows.shape != (len(index['areas']), len(index['columns'])):
+            raise ValueError(f"Area feature matrix {rows.shape} does not match its index")
+        return cls(rows, index['columns'], index['areas'], index.get('source'))
+
+    @classmethod
+    def load_or_build(cls, predictor, model_dir="model_files", csv_path=AREAS_CSV):
+        """
+        Map the saved store, building and saving it from the CSV if it is
+        missing or its columns or categorical encodings no longer match the
+        predictor's
+        """
+        try:
+            store = cls.load(model_dir)
+            encodings = area_encodings(predictor)
+            if store.columns != list(predictor.DEFAULT_AREA_DATA):
+                print("⚠️ Area feature store columns changed, rebuilding")
+            elif encodings is not None and store.source.get('category_encodings') != encodings:
+                print("⚠️ Area feature store encodings changed, rebuilding")
+            else:
+                return store
+        except FileNotFoundError:
+            print("⚠️ No area feature store found, building it from the dataset")
+
+        store = cls.build(predictor, csv_path)
+        store.save(model_dir)
+        return store
+
+    def __len__(self):
+        return len(self.areas)
+
+    @property
+    def latitudes(self):
+        return self.rows[:, self.columns.index('Latitude')]
+
+    @property
+    def longitudes(self):
+        return self.rows[:, self.columns.index('Longitude')]
+
+    def row(self, index):
+        """Static attribute row for an area, in store column order"""
+        return self.rows[index]
+
+    def find(self, area_name):
+        """Row offset of an area by name (case-insensitive), or None"""
+        return self._by_name.get(area_name.lower())
+
+    def area_data(self, index):
+        """A row as an area_data dict (for callers that need names)"""
+        return dict(zip(self.columns, self.rows[index].tolist()))
+
+
+def main():
+    """Build and save the store next to the trained model"""
+    from flood_inference import FloodPredictor
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "model_files"
+    predictor = FloodPredictor()
+    predictor.load_model(model_dir, use_compiled=True)  # Its categorical encodings
+    store = AreaFeatureStore.build(predictor, AREAS_CSV)
+    store.save(model_dir)
+    print(f"✅ Area feature store with {len(store)} areas saved to {model_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ import numpy as np
 import joblib
 from xgboost import XGBClassifier
 from sklearn.utils import class_weight
+from data_ingestion import load_dataset
 
 # Set the matplotlib backend to Agg to prevent TclError
 import matplotlib
@@ -17,22 +18,14 @@ matplotlib.use('Agg')
 # -------------------------------
 # STEP 1: Load and Clean Dataset
 # -------------------------------
-df = pd.read_csv("final_flood_classification data.csv")
+# Cached columns: names stripped, '--' placeholders already NaN
+# STEP 2 (Drop Unnecessary Columns) happens while loading
+df = load_dataset("final_flood_classification data.csv",
+                  exclude=["Areas", "Nearest Station", "Drainage_line_id"])
 
-# Correct the column name with a leading space
-if ' Population' in df.columns:
-    df.rename(columns={' Population': 'Population'}, inplace=True)
 if 'Discharge (m³/s)' in df.columns:
     df.rename(columns={'Discharge (m³/s)': 'Discharge_m3s'}, inplace=True)
 
-# Replace '--' with NaN across the dataset
-df = df.replace("--", np.nan)
-
-# -------------------------------
-# STEP 2: Drop Unnecessary Columns
-# -------------------------------
-df = df.drop(columns=["Areas", "Nearest Station", "Drainage_properties", "Drainage_line_id"], errors='ignore')
-
 # -------------------------------
 # STEP 3: Handle Categorical Variables Safely
 # -------------------------------
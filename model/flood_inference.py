@@ -0,0 +1,735 @@
+"""
+Flood Prediction Inference
+==========================
+Serving side of the flood predictor: model loading, live weather, feature
+assembly and prediction. Only inference dependencies are imported here;
+pandas is loaded on first use by the DataFrame paths, and the training
+libraries stay in improved_flood_prediction_model.
+"""
+
+import numpy as np
+import joblib
+from datetime import datetime
+import os
+import bisect
+import threading
+from weather_cache import OpenWeatherMapUpstream, WeatherUpstreamError
+from ensemble_compiler import load_compiled_ensemble, COMPILED_ENSEMBLE_FILE
+from model_bundle import load_model_bundle, MODEL_BUNDLE_FILE
+
+
+# Label of missing categorical values (pandas < 3 stringified them as 'nan')
+MISSING_CATEGORY = 'Unknown'
+
+
+def category_labels(values):
+    """Categorical values as strings, missing ones as MISSING_CATEGORY on every pandas version"""
+    return values.astype(object).where(values.notna(), MISSING_CATEGORY).astype(str)
+
+
+def missing_category_code(vocabulary):
+    """Code of missing values in a training vocabulary ('nan' in models trained on pandas < 3)"""
+    for label in (MISSING_CATEGORY, 'nan'):
+        if label in vocabulary:
+            return list(vocabulary).index(label)
+    return -1
+
+
+def set_model_threads(model, n_jobs):
+    """Set every n_jobs parameter of a scikit-learn style model (and its members)"""
+    params = {name: n_jobs for name in model.get_params(deep=True)
+              if name == 'n_jobs' or name.endswith('__n_jobs')}
+    if params:
+        model.set_params(**params)
+    return model
+
+
+class FloodPredictor:
+    """
+    Flood risk predictor for serving: loads a trained model and scores
+    weather/area data (training lives in AdvancedFloodPredictor)
+    """
+    
+    # Default static values for Mumbai areas (you can customize these)
+    DEFAULT_AREA_DATA = {
+        'Ward Code': 1,  # Ward A
+        'Latitude': 19.0760,
+        'Longitude': 72.8777,
+        'Elevation': 10,  # Average Mumbai elevation
+        'Land Use Classes': 1,  # Commercial/Mixed use
+        'Population': 185000,
+        'Road_Density_m': 15.0,
+        'Built_up_percent': 85,
+        'Distance_to_water': 500,
+        'Soil Type': 1,  # Urban
+        'True_nearest_distance': 2000
+    }
+    
+    # Weather used when the live weather request fails
+    FALLBACK_WEATHER = {
+        'temperature': 28.5,
+        'humidity': 85,
+        'pressure': 1013.25,
+        'wind_speed': 3.5,
+        'precipitation': 5.2,
+        'weather_condition': 'Rain'
+    }
+    
+    # Weather-driven inputs filled by create_prediction_features
+    WEATHER_FEATURES = ['Rainfall_mm', 'Rainfall_Intensity', 
+                        'Rainfall_Days_Count', 'Longest_rainfall_days']
+    
+    # Engineered features the fast inference path computes without pandas
+    FAST_DERIVED_FEATURES = ['Rainfall_Total_Impact', 'Urban_Density_Factor', 
+                             'Flood_Susceptibility', 'Avg_Daily_Rainfall']
+    
+    # Dataset column names -> the names used by the model
+    COLUMN_MAPPING = {
+        'Discharge (m³/s)': 'Discharge_m3s',
+        'Discharge_m3s': 'Discharge_m3s',
+        'Road Density_m': 'Road_Density_m',
+        'Built_up%': 'Built_up_percent',
+        'Soil Wetness Index': 'Soil_Wetness_Index',
+        'Runoff equivalent': 'Runoff_equivalent',
+        'Rainfall_Intensity_mm_hr': 'Rainfall_Intensity',
+        'Rainfall Days Count': 'Rainfall_Days_Count',
+        'Longest rainfall _days': 'Longest_rainfall_days',
+        'Distance_to_water_m': 'Distance_to_water',
+        'True_nearest_distance_m': 'True_nearest_distance'
+    }
+    
+    # Binned features (pd.cut, right-closed): source column, bin edges, labels
+    CATEGORY_BINS = {
+        'Rainfall_Category': ('Rainfall_mm', [0, 10, 50, 100, 200, float('inf')],
+                              ['Very_Low', 'Low', 'Moderate', 'High', 'Extreme']),
+        'Elevation_Category': ('Elevation', [0, 5, 15, 30, float('inf')],
+                               ['Very_Low', 'Low', 'Medium', 'High'])
+    }
+    
+    def __init__(self):
+        self.model = None
+        self.scaler = None
+        self.target_encoder = None
+        self.feature_selector = None
+        self.feature_names = None
+        self.weather_api_key = "your_api_key_here"  # Replace with actual API key
+        self.weather_upstream = None  # Created on first live weather request
+        self.weather_cache = None  # Optional WeatherCache shared by live requests
+        self.fast_inference = None  # Plan for the pandas-free inference path
+        self.model_manifest = None  # Bundle manifest of the loaded model
+        self.loaded_at = None
+        self.prediction_cache = None  # Optional PredictionCache for the fast path
+        self.category_encodings = None  # Training label vocabulary per categorical column
+        self.rainfall_series = None  # Optional RainfallSeries behind the rolling rainfall features
+        
+    def load_and_preprocess_data(self, csv_path):
+        """Load and preprocess the flood dataset with advanced feature engineering"""
+        print("🔄 Loading and preprocessing data...")
+        from data_ingestion import load_dataset
+        
+        # Load data (column cache: names stripped, placeholders already NaN)
+        df = self.standardize_columns(load_dataset(csv_path))
+        
+        print(f"Dataset shape: {df.shape}")
+        print(f"Columns: {list(df.columns)}")
+        
+        return df
+    
+    def standardize_columns(self, df):
+        """Rename dataset columns for consistency (in place)"""
+        for old_col, new_col in self.COLUMN_MAPPING.items():
+            if old_col in df.columns:
+                df.rename(columns={old_col: new_col}, inplace=True)
+        return df
+    
+    def advanced_feature_engineering(self, df):
+        """Create advanced features for better prediction"""
+        print("🔧 Advanced feature engineering...")
+        import pandas as pd
+        
+        # Create interaction features
+        if 'Rainfall_mm' in df.columns and 'Rainfall_Intensity' in df.columns:
+            df['Rainfall_Total_Impact'] = df['Rainfall_mm'] * df['Rainfall_Intensity']
+        
+        if 'Population' in df.columns and 'Built_up_percent' in df.columns:
+            df['Urban_Density_Factor'] = df['Population'] * (df['Built_up_percent'] / 100)
+        
+        if 'Elevation' in df.columns and 'Distance_to_water' in df.columns:
+            df['Flood_Susceptibility'] = (1 / (df['Elevation'] + 1)) * (1 / (df['Distance_to_water'] + 1))
+        
+        # Create categorical bins for continuous variables
+        for name, (source, bins, labels) in self.CATEGORY_BINS.items():
+            if source in df.columns:
+                df[name] = pd.cut(df[source], bins=bins, labels=labels)
+        
+        # Weather pattern features
+        if all(col in df.columns for col in ['Rainfall_mm', 'Rainfall_Days_Count']):
+            df['Avg_Daily_Rainfall'] = df['Rainfall_mm'] / (df['Rainfall_Days_Count'] + 1)
+        
+        # Rolling rainfall history of each row's region: its DATE's values, or
+        # today's (history plus Rainfall_mm) for prediction rows
+        if (self.rainfall_series is not None and 'Latitude' in df.columns and 'Longitude' in df.columns
+                and ('DATE' in df.columns or 'Rainfall_mm' in df.columns)):
+            self.rainfall_series.add_features(df)
+        
+        return df
+    
+    def load_model(self, model_dir="model_files", use_compiled=False):
+        """
+        Load the trained model and preprocessors
+        
+        Reads the single-file model bundle when present, otherwise the
+        separate joblib files. With use_compiled=True the compiled ensemble
+        is used when available, so XGBoost/LightGBM are not needed to
+        unpickle the model.
+        """
+        bundle_path = f'{model_dir}/{MODEL_BUNDLE_FILE}'
+        if os.path.exists(bundle_path):
+            self.load_model_bundle(bundle_path, use_compiled)
+        else:
+            compiled_path = f'{model_dir}/{COMPILED_ENSEMBLE_FILE}'
+            if use_compiled and os.path.exists(compiled_path):
+                self.model = load_compiled_ensemble(compiled_path)
+            else:
+                self.model = joblib.load(f'{model_dir}/advanced_flood_model.joblib')
+            self.scaler = joblib.load(f'{model_dir}/scaler.joblib')
+            self.target_encoder = joblib.load(f'{model_dir}/target_encoder.joblib')
+            self.feature_selector = joblib.load(f'{model_dir}/feature_selector.joblib')
+            self.feature_names = joblib.load(f'{model_dir}/feature_names.joblib')
+            self.category_encodings = None
+            self.rainfall_series = None
+            self.model_manifest = None
+        self.fast_inference = None  # Rebuilt by enable_fast_inference for the new features
+        self.loaded_at = datetime.now().isoformat()
+        
+        print("✅ Model loaded successfully!")
+    
+    def load_model_bundle(self, bundle_path, use_compiled=False):
+        """Load the model from a bundle, with its compiled arrays memory-mapped"""
+        bundle = load_model_bundle(bundle_path, mmap_mode='r')
+        
+        if use_compiled and bundle.compiled is not None:
+            self.model = bundle.compiled
+            self.feature_selector = None  # Only needed for retraining
+        else:
+            self.model = bundle.estimator()
+            self.feature_selector = bundle.feature_selector()
+        
+        preprocessors = bundle.preprocessors()
+        self.scaler = preprocessors['scaler']
+        self.target_encoder = preprocessors['target_encoder']
+        self.feature_names = preprocessors['feature_names']
+        self.category_encodings = preprocessors.get('category_encodings')
+        self.rainfall_series = preprocessors.get('rainfall_series')
+        self.model_manifest = bundle.manifest
+        if self.rainfall_series is not None and not self.rainfall_series.is_current():
+            print(f"⚠️ Rolling rainfall history ends {self.rainfall_series.last_day}: predictions raise "
+                  f"StaleRainfallError until it is current (see rainfall_features.DailyRainfallFeed)")
+
+    def limit_threads(self, n_jobs=1):
+        """
+        Cap the estimator's own parallelism (VotingClassifier and member n_jobs)
+
+        Training uses n_jobs=-1; a serving worker scoring one request at a
+        time gains nothing from a thread per core and, with several workers,
+        oversubscribes the CPU. The compiled ensemble has no threads to cap.
+        """
+        if hasattr(self.model, 'get_params'):
+            set_model_threads(self.model, n_jobs)
+
+    def get_live_weather_data(self, lat=19.0760, lon=72.8777):  # Mumbai coordinates
+        """Fetch live weather data from OpenWeatherMap API (through the weather cache if set)"""
+        try:
+            if self.weather_cache is not None:
+                return self.weather_cache.get(lat, lon)
+            
+            # Using OpenWeatherMap API (free tier)
+            if self.weather_upstream is None:
+                self.weather_upstream = OpenWeatherMapUpstream(self.weather_api_key)
+            return self.weather_upstream.fetch(lat, lon)
+            
+        except WeatherUpstreamError as e:
+            print(f"{e}")
+            return None
+                
+        except Exception as e:
+            print(f"Error fetching weather data: {e}")
+            print("⚠️ Using fallback weather data")
+            # Return dummy data for testing, flagged so callers can tell
+            return dict(self.FALLBACK_WEATHER, fallback=True)
+    
+    def create_prediction_features(self, weather_data, area_data=None, static_row=None):
+        """
+        Create feature vector for prediction using weather data
+        
+        static_row is an optional feature store row (DEFAULT_AREA_DATA
+        column order) used in place of the defaults; area_data overrides both.
+        """
+        import pandas as pd
+        
+        if static_row is not None:
+            default_area_data = dict(zip(self.DEFAULT_AREA_DATA, static_row.tolist()))
+        else:
+            default_area_data = dict(self.DEFAULT_AREA_DATA)
+        
+        if area_data:
+            default_area_data.update(area_data)
+        
+        # Create feature vector
+        features = {
+            **default_area_data,
+            'Rainfall_mm': weather_data['precipitation'],
+            'Rainfall_Intensity': weather_data['precipitation'],  # Using precipitation as intensity
+            'Rainfall_Days_Count': 1,  # Current day
+            'Longest_rainfall_days': 1
+        }
+        
+        # Create DataFrame
+        feature_df = pd.DataFrame([features])
+        
+        # Apply same feature engineering as training
+        feature_df = self.advanced_feature_engineering(feature_df)
+        
+        return feature_df
+    
+    def create_prediction_features_batch(self, records, static_rows=None):
+        """
+        Create one feature frame for many weather/area records at once
+        
+        static_rows is an optional (n_records, n_area_columns) block of
+        feature store rows used in place of the defaults.
+        """
+        import pandas as pd
+        
+        if static_rows is not None:
+            # Static area columns straight from the store, then any per-record overrides,
+            # assigned one whole column at a time
+            feature_df = pd.DataFrame(np.asarray(static_rows, dtype=float),
+                                      columns=list(self.DEFAULT_AREA_DATA))
+            overrides = [record.get('area_data') or {} for record in records]
+            for name in dict.fromkeys(name for area in overrides for name in area):
+                given = np.array([name in area for area in overrides])
+                values = pd.Series([area.get(name) for area in overrides], index=feature_df.index)
+                feature_df[name] = values.where(given, feature_df[name]) if name in feature_df else values
+        else:
+            # Static area columns, with per-record overrides on top of the defaults
+            area_rows = [{**self.DEFAULT_AREA_DATA, **(record.get('area_data') or {})}
+                         for record in records]
+            feature_df = pd.DataFrame.from_records(area_rows)
+        
+        # Weather columns, filled the same way as create_prediction_features
+        precipitation = np.array(
+            [record['weather_data']['precipitation'] for record in records], dtype=float
+        )
+        feature_df['Rainfall_mm'] = precipitation
+        feature_df['Rainfall_Intensity'] = precipitation  # Using precipitation as intensity
+        feature_df['Rainfall_Days_Count'] = 1  # Current day
+        feature_df['Longest_rainfall_days'] = 1
+        
+        # Apply same feature engineering as training, once for the whole batch
+        feature_df = self.advanced_feature_engineering(feature_df)
+        
+        return feature_df
+    
+    def select_model_features(self, feature_df):
+        """Align a feature frame with the features used in training"""
+        # Binned labels to the codes the training LabelEncoder assigned (-1 if unseen)
+        for name in self.CATEGORY_BINS:
+            if name in feature_df.columns and name in (self.category_encodings or {}):
+                vocabulary = self.category_encodings[name]
+                codes = {label: code for code, label in enumerate(vocabulary)}
+                codes[MISSING_CATEGORY] = missing_category_code(vocabulary)
+                feature_df[name] = category_labels(feature_df[name]).map(codes).fillna(-1).astype(int)
+        
+        if self.feature_names is not None:
+            # Ensure all required features are present
+            for feature in self.feature_names:
+                if feature not in feature_df.columns:
+                    feature_df[feature] = 0  # Default value
+            
+            feature_df = feature_df[self.feature_names]
+        
+        return feature_df
+    
+    def enable_fast_inference(self):
+        """
+        Switch single-row predictions to the pandas-free fast path
+        
+        The feature vector is assembled directly into a preallocated NumPy
+        row in feature_names order, reproducing create_prediction_features,
+        advanced_feature_engineering and select_model_features without
+        building a DataFrame. Returns False (and keeps the DataFrame path)
+        when binned features are selected but the model has no category
+        encodings (models saved before they were recorded), and likewise
+        for rolling rainfall features without their rainfall series.
+        """
+        from sklearn.preprocessing import RobustScaler  # Already loaded with the scaler
+        from rainfall_features import RAINFALL_FEATURES
+        
+        if self.feature_names is None or self.scaler is None:
+            print("⚠️ Fast inference needs a trained or loaded model")
+            return False
+        
+        feature_names = list(self.feature_names)
+        binned = [name for name in self.CATEGORY_BINS if name in feature_names]
+        if binned and not all(name in (self.category_encodings or {}) for name in binned):
+            print("⚠️ Binned features are selected without their encodings, fast inference disabled")
+            return False
+        
+        rainfall = [(column, name) for column, name in enumerate(RAINFALL_FEATURES) if name in feature_names]
+        if rainfall and self.rainfall_series is None:
+            print("⚠️ Rolling rainfall features are selected without their series, fast inference disabled")
+            return False
+        
+        # Raw input slots: area defaults, weather inputs, derived features and
+        # any other trained feature (which defaults to 0 when not supplied)
+        input_names = list(self.DEFAULT_AREA_DATA) + self.WEATHER_FEATURES
+        input_names += [name for name in self.FAST_DERIVED_FEATURES + feature_names 
+                        if name not in input_names]
+        input_index = {name: i for i, name in enumerate(input_names)}
+        
+        defaults = np.zeros(len(input_names))
+        for name, value in self.DEFAULT_AREA_DATA.items():
+            defaults[input_index[name]] = value
+        
+        # Apply RobustScaler arithmetic directly; other scalers use transform()
+        center = scale = None
+        if isinstance(self.scaler, RobustScaler):
+            center = self.scaler.center_ if self.scaler.with_centering else None
+            scale = self.scaler.scale_ if self.scaler.with_scaling else None
+        
+        self.fast_inference = {
+            'input_index': input_index,
+            'defaults': defaults,
+            'static_slots': slice(0, len(self.DEFAULT_AREA_DATA)),  # Feature store row layout
+            'feature_slots': np.array([input_index[name] for name in feature_names]),
+            'derived': [name for name in self.FAST_DERIVED_FEATURES if name in feature_names],
+            'categories': {name: self._category_plan(name, input_index) for name in binned},
+            'rainfall': [(column, input_index[name]) for column, name in rainfall],
+            'robust_scaling': isinstance(self.scaler, RobustScaler),
+            'center': center,
+            'scale': scale,
+            'buffers': threading.local(),  # Per-thread preallocated arrays
+            # Prediction cache namespace: bundle version, or load time for legacy files
+            'cache_version': (self.model_manifest or {}).get('model_version', self.loaded_at)
+        }
+        
+        print(f"⚡ Fast inference enabled for {len(feature_names)} features")
+        return True
+    
+    def _category_plan(self, name, input_index):
+        """(source slot, bin edges, code per bin, code for values outside the bins)"""
+        source, edges, labels = self.CATEGORY_BINS[name]
+        vocabulary = list(self.category_encodings[name])
+        codes = [vocabulary.index(label) if label in vocabulary else -1 for label in labels]
+        # pd.cut gives NaN outside the bins, which training encoded as MISSING_CATEGORY
+        return input_index[source], list(edges), codes, missing_category_code(vocabulary)
+    
+    def build_feature_vector(self, weather_data, area_data=None, static_row=None):
+        """Fill the preallocated fast-path row for one prediction (unscaled)"""
+        plan = self.fast_inference
+        buffers = plan['buffers']
+        
+        if not hasattr(buffers, 'raw'):
+            buffers.raw = np.empty(len(plan['defaults']))
+            buffers.row = np.empty((1, len(plan['feature_slots'])))
+        
+        raw = buffers.raw
+        np.copyto(raw, plan['defaults'])
+        input_index = plan['input_index']
+        
+        # A feature store row replaces all static area defaults in one copy
+        if static_row is not None:
+            raw[plan['static_slots']] = static_row
+        
+        # Area overrides, then weather inputs (same precedence as the dict merge)
+        if area_data:
+            for name, value in area_data.items():
+                slot = input_index.get(name)
+                if slot is not None:
+                    raw[slot] = np.nan if value is None else value
+        
+        precipitation = weather_data['precipitation']
+        raw[input_index['Rainfall_mm']] = precipitation
+        raw[input_index['Rainfall_Intensity']] = precipitation  # Using precipitation as intensity
+        raw[input_index['Rainfall_Days_Count']] = 1  # Current day
+        raw[input_index['Longest_rainfall_days']] = 1
+        
+        row = buffers.row
+        self._complete_vector(raw, row[0])
+        return row
+    
+    def _cache_key_vector(self):
+        """
+        Prediction cache key for the row build_feature_vector last built:
+        the same features computed from its inputs snapped to the cache grid
+        """
+        plan = self.fast_inference
+        buffers = plan['buffers']
+        if not hasattr(buffers, 'key'):
+            buffers.key = np.empty_like(buffers.row)
+        # The raw buffer's inputs are still those of the last row; derived slots are recomputed
+        self.prediction_cache.quantize(buffers.raw, plan['input_index'])
+        self._complete_vector(buffers.raw, buffers.key[0])
+        return buffers.key
+    
+    def _complete_vector(self, raw, row):
+        """Rolling rainfall, derived and binned features of a raw row, then its feature_names values into row"""
+        plan = self.fast_inference
+        input_index = plan['input_index']
+        
+        # Rolling rainfall features of the nearest region, with today's precipitation
+        if plan['rainfall']:
+            values = self.rainfall_series.today_at(raw[input_index['Latitude']], raw[input_index['Longitude']],
+                                                   raw[input_index['Rainfall_mm']])
+            for column, slot in plan['rainfall']:
+                raw[slot] = values[column]
+        
+        # Engineered features, same formulas as advanced_feature_engineering
+        for name in plan['derived']:
+            if name == 'Rainfall_Total_Impact':
+                value = raw[input_index['Rainfall_mm']] * raw[input_index['Rainfall_Intensity']]
+            elif name == 'Urban_Density_Factor':
+                value = raw[input_index['Population']] * (raw[input_index['Built_up_percent']] / 100)
+            elif name == 'Flood_Susceptibility':
+                value = ((1 / (raw[input_index['Elevation']] + 1)) * 
+                         (1 / (raw[input_index['Distance_to_water']] + 1)))
+            else:  # Avg_Daily_Rainfall
+                value = raw[input_index['Rainfall_mm']] / (raw[input_index['Rainfall_Days_Count']] + 1)
+            raw[input_index[name]] = value
+        
+        # Binned features: bin index of the source value, mapped to its training code
+        for name, (source, edges, codes, missing_code) in plan['categories'].items():
+            value = raw[source]
+            raw[input_index[name]] = (codes[bisect.bisect_left(edges, value) - 1]
+                                      if value > edges[0] else missing_code)
+        
+        np.take(raw, plan['feature_slots'], out=row)
+    
+    def _predict_flood_risk_fast(self, weather_data, area_data=None, static_row=None):
+        """Single-row prediction on the preallocated fast-path row"""
+        row = self.build_feature_vector(weather_data, area_data, static_row)
+        key = self._cache_key_vector() if self.prediction_cache is not None else None
+        output = self._score_rows_fast(row, key)[0]
+        
+        return {
+            **output,
+            'weather_data': weather_data,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def _build_feature_matrix_fast(self, records, static_rows=None):
+        """
+        (unscaled feature matrix, prediction cache keys or None) for a batch
+        of records, built column-wise in one pass
+        """
+        plan = self.fast_inference
+        if static_rows is None:
+            static_rows = np.tile(plan['defaults'][plan['static_slots']], (len(records), 1))
+        
+        # Per-record area overrides as whole columns; records without one keep their static value
+        overrides = [record.get('area_data') or {} for record in records]
+        area_columns = {}
+        for name in dict.fromkeys(name for area in overrides for name in area):
+            if name in plan['input_index']:
+                area_columns[name] = ([area.get(name, np.nan) for area in overrides],
+                                      np.array([name in area for area in overrides]))
+        
+        precipitation = np.array([record['weather_data']['precipitation'] for record in records], dtype=float)
+        raw = self._input_matrix(static_rows, area_columns, precipitation)
+        keys = None
+        if self.prediction_cache is not None:
+            snapped = raw.copy()
+            self.prediction_cache.quantize(snapped, plan['input_index'])
+            keys = self._feature_rows(snapped)
+        return self._feature_rows(raw), keys
+
+    def build_feature_matrix(self, static_rows, area_columns=None, precipitation=0.0):
+        """
+        Unscaled fast-path rows for many points, assembled column-wise
+
+        static_rows holds one feature store row per point, area_columns
+        optional per-point overrides ({name: values}, or {name: (values,
+        mask)} to override only the masked points) and precipitation a
+        scalar or one value per point. Gives the rows build_feature_vector would.
+        """
+        return self._feature_rows(self._input_matrix(static_rows, area_columns, precipitation))
+
+    def _input_matrix(self, static_rows, area_columns=None, precipitation=0.0):
+        """Raw fast-path inputs of many points (see build_feature_matrix)"""
+        plan = self.fast_inference
+        input_index = plan['input_index']
+        static_rows = np.asarray(static_rows, dtype=float)
+        raw = np.tile(plan['defaults'], (len(static_rows), 1))
+        raw[:, plan['static_slots']] = static_rows
+
+        for name, values in (area_columns or {}).items():
+            slot = input_index.get(name)
+            if slot is None:
+                continue
+            if isinstance(values, tuple):
+                values, mask = values
+                values = np.array([np.nan if value is None else value for value in values], dtype=float)
+                raw[mask, slot] = values[mask]
+            else:
+                raw[:, slot] = values
+
+        raw[:, input_index['Rainfall_mm']] = precipitation
+        raw[:, input_index['Rainfall_Intensity']] = precipitation
+        raw[:, input_index['Rainfall_Days_Count']] = 1
+        raw[:, input_index['Longest_rainfall_days']] = 1
+        return raw
+
+    def _feature_rows(self, raw):
+        """Rolling rainfall, derived and binned features of raw input rows (in place), in feature_names order"""
+        plan = self.fast_inference
+        input_index = plan['input_index']
+        column = lambda name: raw[:, input_index[name]]
+        if plan['rainfall'] and len(raw):
+            series = self.rainfall_series
+            values = series.features_today(series.region_of(column('Latitude'), column('Longitude')),
+                                           column('Rainfall_mm'))
+            for j, slot in plan['rainfall']:
+                raw[:, slot] = values[:, j]
+
+        # Same formulas as build_feature_vector, one column at a time
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name in plan['derived']:
+                if name == 'Rainfall_Total_Impact':
+                    value = column('Rainfall_mm') * column('Rainfall_Intensity')
+                elif name == 'Urban_Density_Factor':
+                    value = column('Population') * (column('Built_up_percent') / 100)
+                elif name == 'Flood_Susceptibility':
+                    value = (1 / (column('Elevation') + 1)) * (1 / (column('Distance_to_water') + 1))
+                else:  # Avg_Daily_Rainfall
+                    value = column('Rainfall_mm') / (column('Rainfall_Days_Count') + 1)
+                raw[:, input_index[name]] = value
+
+        for name, (source, edges, codes, missing_code) in plan['categories'].items():
+            value = raw[:, source]
+            bins = np.clip(np.searchsorted(edges, value, side='left') - 1, 0, len(codes) - 1)
+            raw[:, input_index[name]] = np.where(value > edges[0], np.take(codes, bins), missing_code)
+
+        return raw[:, plan['feature_slots']]
+
+    def _score_rows_fast(self, matrix, keys=None):
+        """
+        Model outputs for unscaled fast-path rows, through the prediction
+        cache when one is set: keys (the rows built from snapped inputs)
+        look results up and only cache misses reach the ensemble, which
+        scores the exact rows
+        """
+        plan = self.fast_inference
+        cache = self.prediction_cache
+        if cache is None:
+            return self._model_outputs(self._scale_rows_fast(matrix))
+        
+        version = plan['cache_version']
+        keys = matrix if keys is None else keys
+        outputs = [cache.get(version, key) for key in keys]
+        misses = [i for i, output in enumerate(outputs) if output is None]
+        if misses:
+            scored = self._model_outputs(self._scale_rows_fast(matrix[misses]))
+            for i, output in zip(misses, scored):
+                cache.put(version, keys[i], output)
+                outputs[i] = output
+        
+        # Cached outputs are shared, so hand out copies of the mutable part
+        return [dict(output, probabilities=dict(output['probabilities'])) for output in outputs]
+    
+    def _scale_rows_fast(self, matrix):
+        """Scale fast-path rows (in place for RobustScaler)"""
+        plan = self.fast_inference
+        if not plan['robust_scaling']:
+            return self.scaler.transform(matrix)
+        if plan['center'] is not None:
+            matrix -= plan['center']
+        if plan['scale'] is not None:
+            matrix /= plan['scale']
+        return matrix
+    
+    def _model_outputs(self, features_scaled):
+        """Risk level, confidence and class probabilities for each scaled row"""
+        # One ensemble pass; the soft-voting prediction is the argmax of the probabilities
+        prediction_proba = self.model.predict_proba(features_scaled)
+        predictions = self.model.classes_.take(np.argmax(prediction_proba, axis=1))
+        risk_levels = self.target_encoder.inverse_transform(predictions)
+        class_names = list(self.target_encoder.classes_)
+        
+        return [{
+            'predicted_risk_level': risk_level,
+            'confidence': round(max(row_proba), 4),
+            'probabilities': {class_name: round(row_proba[i], 4)
+                              for i, class_name in enumerate(class_names)}
+        } for risk_level, row_proba in zip(risk_levels, prediction_proba)]
+    
+    def predict_flood_risk(self, weather_data=None, area_data=None, static_row=None):
+        """Make flood risk prediction using live weather data"""
+        
+        if weather_data is None:
+            print("🌦️ Fetching live weather data...")
+            weather_data = self.get_live_weather_data()
+            
+            if weather_data is None:
+                return None
+        
+        if self.fast_inference is not None:
+            return self._predict_flood_risk_fast(weather_data, area_data, static_row)
+        
+        print("🔮 Making flood risk prediction...")
+        
+        # Create feature vector
+        feature_df = self.create_prediction_features(weather_data, area_data, static_row)
+        
+        # Select only the features used in training
+        feature_df = self.select_model_features(feature_df)
+        
+        # Scale features
+        features_scaled = self.scaler.transform(feature_df)
+        
+        # Make prediction
+        prediction = self.model.predict(features_scaled)[0]
+        prediction_proba = self.model.predict_proba(features_scaled)[0]
+        
+        # Convert prediction to label
+        risk_level = self.target_encoder.inverse_transform([prediction])[0]
+        
+        # Get probabilities for all classes
+        prob_dict = {}
+        for i, class_name in enumerate(self.target_encoder.classes_):
+            prob_dict[class_name] = round(prediction_proba[i], 4)
+        
+        result = {
+            'predicted_risk_level': risk_level,
+            'confidence': round(max(prediction_proba), 4),
+            'probabilities': prob_dict,
+            'weather_data': weather_data,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        return result
+    
+    def predict_flood_risk_batch(self, records, static_rows=None):
+        """
+        Make flood risk predictions for many records with a single model call
+        
+        Each record is a dict with 'weather_data' and optional 'area_data',
+        exactly as accepted by predict_flood_risk; static_rows optionally
+        gives one feature store row per record.
+        """
+        if not records:
+            return []
+        
+        if self.fast_inference is not None:
+            outputs = self._score_rows_fast(*self._build_feature_matrix_fast(records, static_rows))
+        else:
+            print(f"🔮 Making flood risk predictions for {len(records)} records...")
+            
+            # Build, align and scale the whole batch at once
+            feature_df = self.create_prediction_features_batch(records, static_rows)
+            feature_df = self.select_model_features(feature_df)
+            outputs = self._model_outputs(self.scaler.transform(feature_df))
+        
+        timestamp = datetime.now().isoformat()
+        return [{**output, 'weather_data': record['weather_data'], 'timestamp': timestamp}
+                for record, output in zip(records, outputs)]
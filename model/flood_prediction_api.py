@@ -6,14 +6,23 @@ Flask API for serving flood predictions to Flutter app
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import joblib
-import pandas as pd
-import numpy as np
-import requests
 from datetime import datetime
 import os
 import logging
-from improved_flood_prediction_model import AdvancedFloodPredictor
+from flood_inference import FloodPredictor
+from weather_cache import WeatherCache
+from risk_snapshot import RiskSnapshotJob, SharedRiskSnapshot, SHARED_SNAPSHOT_FILE
+from risk_grid import RiskGrid
+from risk_tiles import RiskTiles
+from evacuation_routing import RoadGraph
+from rainfall_features import DailyRainfallFeed
+from spatial_index import LocationResolver
+from feature_store import AreaFeatureStore
+from model_registry import ModelRegistry, run_canary
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache
+from prediction_service import (MUMBAI_AREAS, find_mumbai_area, area_prediction_data, 
+                                validate_batch_request, model_info_payload, parse_route_point)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Flutter app
@@ -25,17 +34,161 @@ logger = logging.getLogger(__name__)
 # Global model instance
 predictor = None
 
-def load_model():
-    """Load the trained model"""
+# Background job that keeps the city-wide risk snapshot fresh
+snapshot_job = None
+
+# City-wide risk grid and its map tiles, rebuilt from each new snapshot
+risk_tiles = None
+
+# Junction graph of the road network for risk-aware evacuation routes
+road_graph = None
+
+# Appends each day's live rainfall to the rolling rainfall features' history
+rainfall_feed = None
+
+# Memory-mapped static area attributes, read by row offset
+area_store = None
+
+# Nearest area/drain lookups for coordinate-only requests
+location_resolver = None
+
+# Watches model_files/ and hot-swaps the predictor when a new bundle appears
+registry = None
+
+# Coalesces concurrent single-row predictions into one model call
+batcher = None
+
+# Results of recently scored feature vectors (None when disabled)
+prediction_cache = PredictionCache.from_env()
+
+def current_predictor():
+    """
+    The predictor for a new request
+    
+    Handlers read it once into a local, so a request that started on one
+    model finishes on it even if a hot reload swaps the global meanwhile.
+    """
+    return predictor
+
+def build_predictor(model_dir="model_files"):
+    """Load a predictor ready to serve, sharing the live weather and prediction caches"""
+    new_predictor = FloodPredictor()
+    new_predictor.load_model(model_dir, use_compiled=True)
+    new_predictor.limit_threads(int(os.environ.get('PREDICT_N_JOBS', 1)))
+    new_predictor.prediction_cache = prediction_cache
+    new_predictor.enable_fast_inference()
+    if predictor is not None and predictor.weather_cache is not None:
+        new_predictor.weather_cache = predictor.weather_cache
+    else:
+        new_predictor.weather_cache = WeatherCache.from_env(new_predictor.weather_api_key)
+    return new_predictor
+
+def swap_predictor(new_predictor):
+    """Point new requests and the snapshot job at a freshly loaded model"""
     global predictor
+    predictor = new_predictor
+    if prediction_cache is not None:
+        prediction_cache.invalidate()
+    if rainfall_feed is not None and new_predictor.rainfall_series is not None:
+        new_predictor.rainfall_series = rainfall_feed.adopt(new_predictor.rainfall_series)
+    if risk_tiles is not None:
+        risk_tiles.grid.predictor = new_predictor
+    if snapshot_job is not None:
+        snapshot_job.predictor = new_predictor
+        snapshot_job.refresh_now()
+
+def load_model(watch=True):
+    """
+    Load the trained model
+    
+    With watch=False the hot-reload thread is not started; serve.py starts
+    it in each worker after forking, since threads do not survive fork.
+    """
+    global predictor, area_store, location_resolver, registry, batcher, road_graph
     try:
-        predictor = AdvancedFloodPredictor()
-        predictor.load_model("model_files")
+        predictor = build_predictor("model_files")
         logger.info("✅ Model loaded successfully!")
-        return True
     except Exception as e:
         logger.error(f"❌ Error loading model: {e}")
         return False
+    
+    try:
+        area_store = AreaFeatureStore.load_or_build(predictor, "model_files")
+        location_resolver = LocationResolver.from_store(area_store)
+        logger.info(f"✅ Area feature store mapped ({len(area_store)} areas), spatial index built!")
+    except Exception as e:
+        logger.warning(f"⚠️ Spatial index unavailable, using default area data: {e}")
+    
+    try:
+        road_graph = RoadGraph.from_env()
+        logger.info(f"✅ Road graph loaded ({len(road_graph.vertex_node)} junctions)")
+    except Exception as e:
+        logger.warning(f"⚠️ Evacuation routing unavailable: {e}")
+    
+    # Hot reload: new bundles are warmed on the area store rows before the swap
+    static_rows = area_store.rows if area_store is not None else None
+    registry = ModelRegistry.from_env("model_files", build_predictor, predictor,
+                                      canary=lambda candidate: run_canary(candidate, static_rows))
+    registry.add_listener(swap_predictor)
+    if watch:
+        registry.start()
+    
+    batcher = MicroBatcher.from_env(current_predictor)
+    return True
+
+def build_risk_tiles(builds=True):
+    """Risk tile layer over the spatial index, or None when it is unavailable"""
+    try:
+        if location_resolver is None:
+            raise RuntimeError("spatial index is not loaded")
+        grid = RiskGrid(predictor, location_resolver.area_index, location_resolver.drainage,
+                        cores=int(os.environ.get('RISK_TILES_CORES', 1)))
+        return RiskTiles.from_env(grid, "model_files", builds=builds)
+    except Exception as e:
+        logger.warning(f"⚠️ Risk tiles unavailable: {e}")
+        return None
+
+def follow_saved_rainfall(snapshot):
+    """Snapshot listener of follower workers: serve the rainfall history the leader saved"""
+    if rainfall_feed.reload():
+        predictor.rainfall_series = rainfall_feed.series
+
+def start_risk_snapshot(role=None):
+    """
+    Start the scheduled city-wide risk snapshot job (and the risk tiles it feeds)
+    
+    role is None for a single process; under serve.py one worker is the
+    'leader' (scores snapshots and grids, shares them in model_files) and
+    the others are 'follower's that serve what it shares.
+    """
+    global snapshot_job, risk_tiles, rainfall_feed
+    try:
+        if area_store is None:
+            raise RuntimeError("area feature store is not loaded")
+        shared_path = os.path.join("model_files", SHARED_SNAPSHOT_FILE) if role else None
+        if role == 'follower':
+            snapshot_job = SharedRiskSnapshot.from_env(shared_path)
+        else:
+            snapshot_job = RiskSnapshotJob.from_env(predictor, area_store, shared_path)
+        if predictor.rainfall_series is not None:
+            rainfall_feed = DailyRainfallFeed.from_env(predictor.rainfall_series, area_store, "model_files")
+            predictor.rainfall_series = rainfall_feed.series
+            if role == 'follower':  # The leader's feed appends the days; followers load what it saves
+                snapshot_job.add_listener(follow_saved_rainfall)
+            else:
+                snapshot_job.add_weather_listener(rainfall_feed.observe)
+        risk_tiles = build_risk_tiles(builds=role != 'follower')
+        if risk_tiles is not None:
+            snapshot_job.add_listener(risk_tiles.on_snapshot)
+            if road_graph is not None:  # Runs after the tiles have the new grid
+                snapshot_job.add_listener(lambda snapshot: road_graph.update_risk_from(risk_tiles))
+        snapshot_job.start()
+        logger.info(f"✅ Risk snapshot {'follower' if role == 'follower' else 'job'} started "
+                    f"for {len(area_store)} areas")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error starting risk snapshot job: {e}")
+        return False
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -46,6 +199,105 @@ def health_check():
         'model_loaded': predictor is not None
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Runtime metrics for the serving caches"""
+    weather_cache = predictor.weather_cache if predictor is not None else None
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        'weather_cache': weather_cache.stats() if weather_cache is not None else None,
+        'risk_snapshot': snapshot_job.stats() if snapshot_job is not None else None,
+        'risk_tiles': risk_tiles.stats() if risk_tiles is not None else None,
+        'road_graph': road_graph.stats() if road_graph is not None else None,
+        'rainfall_feed': rainfall_feed.stats() if rainfall_feed is not None else None,
+        'model_registry': registry.stats() if registry is not None else None,
+        'micro_batcher': batcher.stats() if batcher is not None else None,
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else None
+    })
+
+@app.route('/risk/snapshot', methods=['GET'])
+def risk_snapshot():
+    """
+    Latest precomputed risk levels for every area in the dataset
+    
+    Supports conditional GET: send the previous ETag in If-None-Match
+    to get a 304 when nothing has changed.
+    """
+    snapshot = snapshot_job.current() if snapshot_job is not None else None
+    
+    if snapshot is None:
+        return jsonify({
+            'error': 'Snapshot unavailable',
+            'message': 'The risk snapshot has not been computed yet'
+        }), 503
+    
+    response = app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Last-Modified'] = snapshot.last_modified
+    response.cache_control.no_cache = True  # Clients revalidate with the ETag
+    return response.make_conditional(request)
+
+@app.route('/tiles/risk/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def risk_tile(z, x, y):
+    """
+    Flood risk map tile (Web Mercator, 256 px) for overlaying on OpenStreetMap
+    
+    Tiles change only when a new snapshot or model rebuilds the risk grid;
+    the ETag carries the grid version for conditional GETs.
+    """
+    if risk_tiles is None or risk_tiles.version is None:
+        return jsonify({
+            'error': 'Risk tiles unavailable',
+            'message': 'The risk grid has not been computed yet'
+        }), 503
+    
+    tile = risk_tiles.tile(z, x, y)
+    if tile is None:
+        return jsonify({
+            'error': 'Tile not found',
+            'message': f'Zoom levels {risk_tiles.min_zoom}-{risk_tiles.max_zoom} are served'
+        }), 404
+    
+    version, png = tile
+    response = app.response_class(png, mimetype='image/png')
+    response.set_etag(f"{version}-{z}-{x}-{y}")
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
+
+@app.route('/route', methods=['GET'])
+def evacuation_route():
+    """
+    Cheapest road route between two points, avoiding high flood risk
+    
+    from and to are "lat,lon" or a predefined area name; road costs grow
+    with the risk of the latest risk grid.
+    """
+    if road_graph is None:
+        return jsonify({
+            'error': 'Routing unavailable',
+            'message': 'The road network is not loaded'
+        }), 503
+    
+    start = parse_route_point(request.args.get('from'))
+    end = parse_route_point(request.args.get('to'))
+    if start is None or end is None:
+        return jsonify({
+            'error': 'Invalid request',
+            'message': 'from and to must be "lat,lon" or a Mumbai area name',
+            'available_areas': [area['name'] for area in MUMBAI_AREAS]
+        }), 400
+    
+    route = road_graph.route(start, end)
+    if route is None:
+        return jsonify({
+            'error': 'No route',
+            'message': 'The start and destination are not connected by road'
+        }), 404
+    
+    route['timestamp'] = datetime.now().isoformat()
+    return jsonify(route)
+
 @app.route('/predict', methods=['POST'])
 def predict_flood_risk():
     """
@@ -67,6 +319,7 @@ def predict_flood_risk():
         }
     }
     """
+    predictor = current_predictor()
     try:
         if predictor is None:
             return jsonify({
@@ -81,7 +334,7 @@ def predict_flood_risk():
         area_data = data.get('area_data', {})
         
         # Make prediction
-        result = predictor.predict_flood_risk(weather_data, area_data)
+        result = batcher.predict(weather_data, area_data, predictor=predictor)
         
         if result is None:
             return jsonify({
@@ -104,6 +357,54 @@ def predict_flood_risk():
             'message': str(e)
         }), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_flood_risk_batch():
+    """
+    Predict flood risk for many records with a single model call
+    
+    Request body:
+    {
+        "records": [
+            {
+                "weather_data": {"precipitation": 15.5, "humidity": 85},
+                "area_data": {"Ward Code": 1, "Elevation": 10}
+            },
+            ...
+        ]
+    }
+    """
+    predictor = current_predictor()
+    try:
+        if predictor is None:
+            return jsonify({
+                'error': 'Model not loaded',
+                'message': 'Please ensure model is properly trained and loaded'
+            }), 500
+        
+        records, error = validate_batch_request(request.get_json())
+        if error is not None:
+            payload, status = error
+            return jsonify(payload), status
+        
+        # Make predictions for the whole batch at once
+        results = predictor.predict_flood_risk_batch(records)
+        
+        logger.info(f"Batch prediction made for {len(results)} records")
+        
+        return jsonify({
+            'predictions': results,
+            'count': len(results),
+            'api_version': '1.0',
+            'model_version': 'advanced_ensemble'
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in batch prediction: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
 @app.route('/predict/live', methods=['GET'])
 def predict_with_live_weather():
     """
@@ -113,6 +414,7 @@ def predict_with_live_weather():
     - lat: latitude (default: 19.0760 for Mumbai)
     - lon: longitude (default: 72.8777 for Mumbai)
     """
+    predictor = current_predictor()
     try:
         if predictor is None:
             return jsonify({
@@ -133,14 +435,18 @@ def predict_with_live_weather():
                 'message': 'Unable to fetch live weather data'
             }), 503
         
-        # Create area data from coordinates
-        area_data = {
-            'latitude': lat,
-            'longitude': lon
-        }
+        # Static attributes of the nearest area and drain to these coordinates
+        static_row = location = None
+        if location_resolver is not None:
+            static_row, area_data, location = location_resolver.resolve(lat, lon)
+        else:
+            area_data = {
+                'Latitude': lat,
+                'Longitude': lon
+            }
         
         # Make prediction
-        result = predictor.predict_flood_risk(weather_data, area_data)
+        result = batcher.predict(weather_data, area_data, static_row, predictor)
         
         if result is None:
             return jsonify({
@@ -153,6 +459,7 @@ def predict_with_live_weather():
         result['model_version'] = 'advanced_ensemble'
         result['data_source'] = 'live_weather'
         result['coordinates'] = {'lat': lat, 'lon': lon}
+        result['location'] = location
         
         logger.info(f"Live prediction made: {result['predicted_risk_level']} (confidence: {result['confidence']})")
         
@@ -168,77 +475,15 @@ def predict_with_live_weather():
 @app.route('/areas/mumbai', methods=['GET'])
 def get_mumbai_areas():
     """Get predefined Mumbai areas with their coordinates and characteristics"""
-    mumbai_areas = [
-        {
-            'name': 'Colaba',
-            'ward': 'A',
-            'latitude': 18.9151,
-            'longitude': 72.8141,
-            'elevation': 6,
-            'population': 185000,
-            'built_up_percent': 90,
-            'land_use': 'commercial_mixed'
-        },
-        {
-            'name': 'Ballard Estate',
-            'ward': 'A',
-            'latitude': 18.9496,
-            'longitude': 72.8414,
-            'elevation': 17,
-            'population': 185000,
-            'built_up_percent': 90,
-            'land_use': 'commercial_institutional'
-        },
-        {
-            'name': 'Fort',
-            'ward': 'A',
-            'latitude': 18.9320,
-            'longitude': 72.8347,
-            'elevation': 12,
-            'population': 185000,
-            'built_up_percent': 95,
-            'land_use': 'commercial'
-        },
-        {
-            'name': 'Bandra',
-            'ward': 'H/West',
-            'latitude': 19.0596,
-            'longitude': 72.8295,
-            'elevation': 15,
-            'population': 250000,
-            'built_up_percent': 85,
-            'land_use': 'residential_commercial'
-        },
-        {
-            'name': 'Andheri',
-            'ward': 'K/West',
-            'latitude': 19.1136,
-            'longitude': 72.8697,
-            'elevation': 25,
-            'population': 400000,
-            'built_up_percent': 80,
-            'land_use': 'residential_mixed'
-        },
-        {
-            'name': 'Dadar',
-            'ward': 'G/North',
-            'latitude': 19.0176,
-            'longitude': 72.8562,
-            'elevation': 8,
-            'population': 300000,
-            'built_up_percent': 88,
-            'land_use': 'residential_commercial'
-        }
-    ]
-    
     return jsonify({
-        'areas': mumbai_areas,
-        'total_areas': len(mumbai_areas)
+        'areas': MUMBAI_AREAS,
+        'total_areas': len(MUMBAI_AREAS)
     })
 
 @app.route('/predict/area/<area_name>', methods=['GET'])
 def predict_for_specific_area(area_name):
     """Predict flood risk for a specific Mumbai area using live weather"""
+    predictor = current_predictor()
     try:
         if predictor is None:
             return jsonify({
@@ -246,22 +491,14 @@ def predict_for_specific_area(area_name):
                 'message': 'Please ensure model is properly trained and loaded'
             }), 500
         
-        # Get Mumbai areas
-        response = get_mumbai_areas()
-        mumbai_areas = response.get_json()['areas']
-        
         # Find the specified area
-        area_info = None
-        for area in mumbai_areas:
-            if area['name'].lower() == area_name.lower():
-                area_info = area
-                break
+        area_info = find_mumbai_area(area_name)
         
         if area_info is None:
             return jsonify({
                 'error': 'Area not found',
                 'message': f'Area "{area_name}" not found in Mumbai areas',
-                'available_areas': [area['name'] for area in mumbai_areas]
+                'available_areas': [area['name'] for area in MUMBAI_AREAS]
             }), 404
         
         # Fetch live weather data for this area
@@ -276,18 +513,11 @@ def predict_for_specific_area(area_name):
                 'message': f'Unable to fetch live weather data for {area_name}'
             }), 503
         
-        # Create area data
-        area_data = {
-            'Ward Code': 1,  # Default encoding
-            'latitude': area_info['latitude'],
-            'longitude': area_info['longitude'],
-            'elevation': area_info['elevation'],
-            'Population': area_info['population'],
-            'Built_up_percent': area_info['built_up_percent']
-        }
+        # Static attributes of the nearest area and drain, as for /predict/live
+        static_row, area_data, location = area_prediction_data(area_info, location_resolver)
         
         # Make prediction
-        result = predictor.predict_flood_risk(weather_data, area_data)
+        result = batcher.predict(weather_data, area_data, static_row, predictor)
         
         if result is None:
             return jsonify({
@@ -297,6 +527,7 @@ def predict_for_specific_area(area_name):
         
         # Add area information to result
         result['area_info'] = area_info
+        result['location'] = location
         result['api_version'] = '1.0'
         result['model_version'] = 'advanced_ensemble'
         result['data_source'] = 'live_weather'
@@ -315,6 +546,7 @@ def predict_for_specific_area(area_name):
 @app.route('/model/info', methods=['GET'])
 def model_info():
     """Get information about the loaded model"""
+    predictor = current_predictor()
     try:
         if predictor is None:
             return jsonify({
@@ -322,17 +554,7 @@ def model_info():
                 'message': 'Please ensure model is properly trained and loaded'
             }), 500
         
-        info = {
-            'model_type': 'Advanced Ensemble Classifier',
-            'algorithms': ['Random Forest', 'XGBoost', 'LightGBM', 'Extra Trees'],
-            'features_count': len(predictor.feature_names) if predictor.feature_names is not None else 0,
-            'target_classes': list(predictor.target_encoder.classes_) if predictor.target_encoder else [],
-            'api_version': '1.0',
-            'model_version': 'advanced_ensemble',
-            'last_loaded': datetime.now().isoformat()
-        }
-        
-        return jsonify(info)
+        return jsonify(model_info_payload(predictor))
         
     except Exception as e:
         logger.error(f"Error getting model info: {e}")
@@ -347,13 +569,19 @@ if __name__ == '__main__':
     # Load model on startup
     if load_model():
         print("✅ Model loaded successfully!")
+        start_risk_snapshot()
         print("🚀 Starting Flask server...")
         print("📝 Available endpoints:")
         print("   GET  /health - Health check")
+        print("   GET  /metrics - Cache metrics")
         print("   POST /predict - Predict with custom data")
+        print("   POST /predict/batch - Predict for many records at once")
         print("   GET  /predict/live - Predict with live weather")
         print("   GET  /predict/area/<area_name> - Predict for specific area")
         print("   GET  /areas/mumbai - Get Mumbai areas")
+        print("   GET  /risk/snapshot - City-wide risk snapshot")
+        print("   GET  /tiles/risk/<z>/<x>/<y>.png - Risk map tiles")
+        print("   GET  /route?from=&to= - Risk-aware evacuation route")
         print("   GET  /model/info - Model information")
         print("\n🌐 Server will run on http://localhost:5000")
         
@@ -0,0 +1,491 @@
+"""
+Async Flood Prediction API Server
+=================================
+asyncio serving mode for the flood prediction endpoints. Live weather is
+fetched with a pooled aiohttp client (behind the weather cache) and model
+scoring runs on a bounded thread pool, so no request holds a worker for
+the upstream weather round trip.
+
+Run: python flood_prediction_async_api.py [--port 5000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+from flood_inference import FloodPredictor
+from weather_cache import (AsyncWeatherCache, WeatherCache, WeatherUpstreamError,
+                           parse_current_weather, DEFAULT_WEATHER_URL)
+from prediction_service import (MUMBAI_AREAS, find_mumbai_area, area_prediction_data,
+                                validate_batch_request, model_info_payload)
+from risk_snapshot import RiskSnapshotJob, etag_matches
+from rainfall_features import DailyRainfallFeed
+from spatial_index import LocationResolver
+from feature_store import AreaFeatureStore
+from model_registry import ModelRegistry, run_canary
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsyncOpenWeatherMapUpstream:
+    """OpenWeatherMap current-weather upstream on a shared aiohttp session"""
+
+    def __init__(self, session, api_key, base_url=DEFAULT_WEATHER_URL, timeout=10):
+        self.session = session
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def fetch(self, lat, lon):
+        """Fetch current weather; raises WeatherUpstreamError on a bad response"""
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": "metric"
+        }
+        async with self.session.get(self.base_url, params=params, timeout=self.timeout) as response:
+            if response.status != 200:
+                raise WeatherUpstreamError(f"Weather API Error: {response.status}",
+                                           status_code=response.status)
+            return parse_current_weather(await response.json(content_type=None))
+
+
+class ScoringBusy(Exception):
+    """The scoring executor's queue is full"""
+
+
+class BoundedExecutor:
+    """Thread pool for model scoring with a cap on queued jobs"""
+
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scoring')
+
+    async def run(self, func, *args):
+        """Run func(*args) on the pool; raises ScoringBusy when the queue is full"""
+        if self.pending >= self.max_pending:
+            raise ScoringBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def wait_for(self, submit, *args):
+        """Await the future from submit(*args) (scored elsewhere), counted against the same queue cap"""
+        if self.pending >= self.max_pending:
+            raise ScoringBusy()
+        self.pending += 1
+        try:
+            return await asyncio.wrap_future(submit(*args))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def error_response(error, message, status, **extra):
+    """JSON error body in the same shape as the Flask API"""
+    return web.json_response({'error': error, 'message': message, **extra}, status=status)
+
+
+def model_not_loaded():
+    return error_response('Model not loaded',
+                          'Please ensure model is properly trained and loaded', 500)
+
+
+async def get_live_weather(app, lat, lon):
+    """Live weather through the async cache, with the predictor's fallback rules"""
+    try:
+        return await app['weather_cache'].get(lat, lon)
+    except WeatherUpstreamError as e:
+        logger.warning(f"{e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching weather data: {e}, using fallback weather data")
+        return dict(FloodPredictor.FALLBACK_WEATHER, fallback=True)
+
+
+async def score(app, func, *args):
+    """Run a predictor call on the scoring executor"""
+    return await app['scoring'].run(func, *args)
+
+
+async def score_one(app, predictor, weather_data, area_data=None, static_row=None):
+    """Score a single request, micro-batched with concurrent ones when enabled"""
+    batcher = app['batcher']
+    if not batcher.enabled:
+        return await score(app, predictor.predict_flood_risk, weather_data, area_data, static_row)
+    return await app['scoring'].wait_for(batcher.submit, weather_data, area_data, static_row, predictor)
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    return web.json_response({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'model_loaded': request.app['registry'].predictor is not None,
+        'server_mode': 'async'
+    })
+
+
+async def metrics(request):
+    """Runtime metrics for the serving caches and the scoring pool"""
+    scoring = request.app['scoring']
+    return web.json_response({
+        'timestamp': datetime.now().isoformat(),
+        'weather_cache': request.app['weather_cache'].stats(),
+        'snapshot_weather_cache': request.app['snapshot_weather_cache'].stats(),
+        'rainfall_feed': request.app['rainfall_feed'].stats() if request.app.get('rainfall_feed') else None,
+        'scoring': {
+            'workers': scoring.max_workers,
+            'max_pending': scoring.max_pending,
+            'pending': scoring.pending
+        },
+        'risk_snapshot': request.app['snapshot_job'].stats() if request.app['snapshot_job'] else None,
+        'model_registry': request.app['registry'].stats(),
+        'micro_batcher': request.app['batcher'].stats(),
+        'prediction_cache': request.app['prediction_cache'].stats() if request.app['prediction_cache'] else None
+    })
+
+
+async def risk_snapshot(request):
+    """Latest precomputed risk levels for every area, with conditional GET"""
+    job = request.app['snapshot_job']
+    snapshot = job.current() if job is not None else None
+    if snapshot is None:
+        return error_response('Snapshot unavailable',
+                              'The risk snapshot has not been computed yet', 503)
+
+    headers = {
+        'ETag': f'"{snapshot.etag}"',
+        'Last-Modified': snapshot.last_modified,
+        'Cache-Control': 'no-cache'
+    }
+    if etag_matches(request.headers.get('If-None-Match'), snapshot.etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=snapshot.body, content_type='application/json', headers=headers)
+
+
+async def predict_flood_risk(request):
+    """Predict flood risk based on weather data (same body as the Flask API)"""
+    predictor = request.app['registry'].predictor
+    if predictor is None:
+        return model_not_loaded()
+
+    data = await request.json()
+    result = await score_one(request.app, predictor,
+                             data.get('weather_data', {}), data.get('area_data', {}))
+
+    if result is None:
+        return error_response('Prediction failed',
+                              'Unable to make prediction with provided data', 400)
+
+    result['api_version'] = '1.0'
+    result['model_version'] = 'advanced_ensemble'
+    return web.json_response(result)
+
+
+async def predict_flood_risk_batch(request):
+    """Predict flood risk for many records with a single model call"""
+    predictor = request.app['registry'].predictor
+    if predictor is None:
+        return model_not_loaded()
+
+    records, error = validate_batch_request(await request.json())
+    if error is not None:
+        payload, status = error
+        return web.json_response(payload, status=status)
+
+    results = await score(request.app, predictor.predict_flood_risk_batch, records)
+    return web.json_response({
+        'predictions': results,
+        'count': len(results),
+        'api_version': '1.0',
+        'model_version': 'advanced_ensemble'
+    })
+
+
+async def predict_with_live_weather(request):
+    """Predict flood risk using live weather data (?lat=&lon=)"""
+    predictor = request.app['registry'].predictor
+    if predictor is None:
+        return model_not_loaded()
+
+    lat = float(request.query.get('lat', 19.0760))
+    lon = float(request.query.get('lon', 72.8777))
+
+    weather_data = await get_live_weather(request.app, lat, lon)
+    if weather_data is None:
+        return error_response('Weather data unavailable',
+                              'Unable to fetch live weather data', 503)
+
+    # Static attributes of the nearest area and drain to these coordinates
+    static_row = location = None
+    if request.app['location_resolver'] is not None:
+        static_row, area_data, location = request.app['location_resolver'].resolve(lat, lon)
+    else:
+        area_data = {
+            'Latitude': lat,
+            'Longitude': lon
+        }
+    result = await score_one(request.app, predictor, weather_data, area_data, static_row)
+
+    if result is None:
+        return error_response('Prediction failed',
+                              'Unable to make prediction with live weather data', 400)
+
+    result['api_version'] = '1.0'
+    result['model_version'] = 'advanced_ensemble'
+    result['data_source'] = 'live_weather'
+    result['coordinates'] = {'lat': lat, 'lon': lon}
+    result['location'] = location
+    return web.json_response(result)
+
+
+async def get_mumbai_areas(request):
+    """Get predefined Mumbai areas with their coordinates and characteristics"""
+    return web.json_response({
+        'areas': MUMBAI_AREAS,
+        'total_areas': len(MUMBAI_AREAS)
+    })
+
+
+async def predict_for_specific_area(request):
+    """Predict flood risk for a specific Mumbai area using live weather"""
+    predictor = request.app['registry'].predictor
+    if predictor is None:
+        return model_not_loaded()
+
+    area_name = request.match_info['area_name']
+    area_info = find_mumbai_area(area_name)
+    if area_info is None:
+        return error_response('Area not found', f'Area "{area_name}" not found in Mumbai areas',
+                              404, available_areas=[area['name'] for area in MUMBAI_AREAS])
+
+    weather_data = await get_live_weather(request.app, area_info['latitude'], area_info['longitude'])
+    if weather_data is None:
+        return error_response('Weather data unavailable',
+                              f'Unable to fetch live weather data for {area_name}', 503)
+
+    static_row, area_data, location = area_prediction_data(area_info, request.app['location_resolver'])
+    result = await score_one(request.app, predictor, weather_data, area_data, static_row)
+
+    if result is None:
+        return error_response('Prediction failed', f'Unable to make prediction for {area_name}', 400)
+
+    result['area_info'] = area_info
+    result['location'] = location
+    result['api_version'] = '1.0'
+    result['model_version'] = 'advanced_ensemble'
+    result['data_source'] = 'live_weather'
+    return web.json_response(result)
+
+
+async def model_info(request):
+    """Get information about the loaded model"""
+    predictor = request.app['registry'].predictor
+    if predictor is None:
+        return model_not_loaded()
+
+    return web.json_response(model_info_payload(predictor))
+
+
+@web.middleware
+async def error_middleware(request, handler):
+    """Map failures to the Flask API's JSON error responses"""
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except ScoringBusy:
+        return error_response('Server busy', 'Too many predictions in progress, retry shortly', 503)
+    except Exception as e:
+        logger.error(f"Error handling {request.path}: {e}")
+        return error_response('Internal server error', str(e), 500)
+
+
+async def _start_clients(app):
+    """Pooled weather client and scoring executor, created on the server's loop"""
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=int(os.environ.get('WEATHER_POOL_SIZE', 100)))
+    )
+    predictor = app['registry'].predictor
+    api_key = predictor.weather_api_key if predictor is not None else ''
+    upstream = AsyncOpenWeatherMapUpstream(
+        session,
+        api_key=os.environ.get('OPENWEATHER_API_KEY', api_key),
+        base_url=os.environ.get('WEATHER_API_URL', DEFAULT_WEATHER_URL),
+        timeout=float(os.environ.get('WEATHER_API_TIMEOUT', 10))
+    )
+    app['weather_session'] = session
+    app['weather_cache'] = AsyncWeatherCache(
+        upstream,
+        grid_size=float(os.environ.get('WEATHER_CACHE_GRID', 0.01)),
+        ttl=float(os.environ.get('WEATHER_CACHE_TTL', 300)),
+        stale_ttl=float(os.environ.get('WEATHER_CACHE_STALE_TTL', 900)),
+        max_entries=int(os.environ.get('WEATHER_CACHE_MAX_ENTRIES', 2048))
+    )
+    app['scoring'] = BoundedExecutor(
+        max_workers=int(os.environ.get('SCORING_WORKERS', min(4, os.cpu_count() or 1))),
+        max_pending=int(os.environ.get('SCORING_MAX_PENDING', 256))
+    )
+
+
+async def _start_snapshot_job(app):
+    """Scheduled city-wide risk snapshot, scored on its own background thread"""
+    app['snapshot_job'] = app['rainfall_feed'] = None
+    if app['area_store'] is None:
+        return
+    try:
+        predictor = app['registry'].predictor
+        job = RiskSnapshotJob.from_env(predictor, app['area_store'])
+        if predictor.rainfall_series is not None:
+            # Each finished day's live rainfall extends the rolling features' history
+            feed = DailyRainfallFeed.from_env(predictor.rainfall_series, app['area_store'], app['model_dir'])
+            predictor.rainfall_series = feed.series
+            job.add_weather_listener(feed.observe)
+            app['rainfall_feed'] = feed
+        app['snapshot_job'] = job.start()
+    except Exception as e:
+        logger.error(f"❌ Error starting risk snapshot job: {e}")
+
+
+def _follow_model_swaps(app):
+    """Drop cached results and repoint the snapshot job when the registry swaps in a new model"""
+    def on_swap(new_predictor):
+        if app['prediction_cache'] is not None:
+            app['prediction_cache'].invalidate()
+        feed = app.get('rainfall_feed')
+        if feed is not None and new_predictor.rainfall_series is not None:
+            new_predictor.rainfall_series = feed.adopt(new_predictor.rainfall_series)
+        job = app.get('snapshot_job')
+        if job is not None:
+            job.predictor = new_predictor
+            job.refresh_now()
+    return on_swap
+
+
+async def _start_registry(app):
+    """Watch the model directory for new bundles (only for models loaded here)"""
+    if app['watch_model_dir']:
+        app['registry'].start()
+
+
+async def _stop_clients(app):
+    await app['weather_session'].close()
+    app['scoring'].shutdown()
+    if app['snapshot_job'] is not None:
+        app['snapshot_job'].stop()
+    app['registry'].stop()
+
+
+def build_predictor(model_dir="model_files", prediction_cache=None, weather_cache=None):
+    """
+    Load a predictor ready to serve (startup and hot reloads)
+
+    weather_cache is the sync WeatherCache behind get_live_weather_data,
+    which the snapshot job calls from its own thread (handlers use the
+    app's async cache).
+    """
+    predictor = FloodPredictor()
+    predictor.load_model(model_dir, use_compiled=True)
+    predictor.limit_threads(int(os.environ.get('PREDICT_N_JOBS', 1)))
+    predictor.prediction_cache = prediction_cache
+    predictor.weather_cache = weather_cache
+    predictor.enable_fast_inference()
+    return predictor
+
+
+def create_app(predictor=None, model_dir="model_files"):
+    """
+    Build the aiohttp application, loading the model unless one is given
+    
+    A model loaded here is hot-reloaded when model_dir gets a new bundle.
+    """
+    watch_model_dir = predictor is None
+    prediction_cache = PredictionCache.from_env()
+    # Shared by every loaded model, so hot reloads keep the snapshot job's cached weather
+    weather_cache = WeatherCache.from_env(FloodPredictor().weather_api_key)
+    if predictor is None:
+        try:
+            predictor = build_predictor(model_dir, prediction_cache, weather_cache)
+            logger.info("✅ Model loaded successfully!")
+        except Exception as e:
+            logger.error(f"❌ Error loading model: {e}")
+            predictor = None
+    elif predictor.weather_cache is None:
+        predictor.weather_cache = weather_cache
+
+    area_store = location_resolver = None
+    if predictor is not None:
+        try:
+            area_store = AreaFeatureStore.load_or_build(predictor, model_dir)
+            location_resolver = LocationResolver.from_store(area_store)
+        except Exception as e:
+            logger.warning(f"⚠️ Spatial index unavailable, using default area data: {e}")
+
+    static_rows = area_store.rows if area_store is not None else None
+    registry = ModelRegistry.from_env(model_dir, lambda path: build_predictor(path, prediction_cache, weather_cache),
+                                      predictor, canary=lambda candidate: run_canary(candidate, static_rows))
+
+    app = web.Application(middlewares=[error_middleware])
+    app['registry'] = registry
+    app['prediction_cache'] = prediction_cache
+    app['snapshot_weather_cache'] = weather_cache
+    app['model_dir'] = model_dir
+    app['batcher'] = MicroBatcher.from_env(lambda: registry.predictor)
+    app['watch_model_dir'] = watch_model_dir and predictor is not None
+    registry.add_listener(_follow_model_swaps(app))
+    app['area_store'] = area_store
+    app['location_resolver'] = location_resolver
+    app.on_startup.append(_start_clients)
+    app.on_startup.append(_start_snapshot_job)
+    app.on_startup.append(_start_registry)
+    app.on_cleanup.append(_stop_clients)
+
+    app.router.add_get('/health', health_check)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_post('/predict', predict_flood_risk)
+    app.router.add_post('/predict/batch', predict_flood_risk_batch)
+    app.router.add_get('/predict/live', predict_with_live_weather)
+    app.router.add_get('/predict/area/{area_name}', predict_for_specific_area)
+    app.router.add_get('/areas/mumbai', get_mumbai_areas)
+    app.router.add_get('/risk/snapshot', risk_snapshot)
+    app.router.add_get('/model/info', model_info)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async flood prediction API server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--model-dir', default='model_files')
+    args = parser.parse_args()
+
+    print("🌊 Starting async Flood Prediction API Server...")
+    app = create_app(model_dir=args.model_dir)
+    if app['registry'].predictor is None:
+        print("❌ Failed to load model. Please train the model first.")
+        return
+
+    print(f"🌐 Server will run on http://localhost:{args.port}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
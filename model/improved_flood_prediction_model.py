@@ -17,15 +17,17 @@ from sklearn.feature_selection import SelectKBest, f_classif, RFECV
 from sklearn.utils import class_weight
 import seaborn as sns
 import matplotlib.pyplot as plt
-import joblib
 import warnings
 from xgboost import XGBClassifier
 from lightgbm import LGBMClassifier
 from catboost import CatBoostClassifier
-import requests
 import json
-from datetime import datetime
 import os
+from flood_inference import FloodPredictor, category_labels, set_model_threads
+from ensemble_compiler import compile_ensemble, parity_inputs, check_parity
+from model_bundle import save_model_bundle, MODEL_BUNDLE_FILE
+from feature_ranking import RankedFeatureSelector
+from rainfall_features import RainfallSeries
 
 # Suppress warnings
 warnings.filterwarnings('ignore')
@@ -34,147 +36,132 @@ warnings.filterwarnings('ignore')
 import matplotlib
 matplotlib.use('Agg')
 
-class AdvancedFloodPredictor:
+def parse_dates(dates):
+    """DATE column ('01-06-2023 00:00', day first) as datetimes"""
+    return pd.to_datetime(dates, dayfirst=True, errors='coerce')
+
+def training_window(df):
+    """First and last DATE and row count of a training frame"""
+    dates = parse_dates(df['DATE'])
+    return {
+        'first_date': f"{dates.min():%Y-%m-%d}",
+        'last_date': f"{dates.max():%Y-%m-%d}",
+        'rows': len(df)
+    }
+
+class AdvancedFloodPredictor(FloodPredictor):
     """
     Advanced Flood Prediction System with Real-time Weather Integration
+    
+    Adds training, evaluation and export to the serving FloodPredictor.
     """
     
-    def __init__(self):
-        self.model = None
-        self.scaler = None
-        self.target_encoder = None
-        self.feature_selector = None
-        self.feature_names = None
-        self.weather_api_key = "your_api_key_here"  # Replace with actual API key
-        
-    def load_and_preprocess_data(self, csv_path):
-        """Load and preprocess the flood dataset with advanced feature engineering"""
-        print("🔄 Loading and preprocessing data...")
-        
-        # Load data
-        df = pd.read_csv(csv_path)
-        
-        # Clean column names
-        df.columns = df.columns.str.strip()
-        
-        # Rename columns for consistency
-        column_mapping = {
-            'Discharge (m³/s)': 'Discharge_m3s',
-            'Discharge_m3s': 'Discharge_m3s',
-            'Road Density_m': 'Road_Density_m',
-            'Built_up%': 'Built_up_percent',
-            'Soil Wetness Index': 'Soil_Wetness_Index',
-            'Runoff equivalent': 'Runoff_equivalent',
-            'Rainfall_Intensity_mm_hr': 'Rainfall_Intensity',
-            'Rainfall Days Count': 'Rainfall_Days_Count',
-            'Longest rainfall _days': 'Longest_rainfall_days',
-            'Distance_to_water_m': 'Distance_to_water',
-            'True_nearest_distance_m': 'True_nearest_distance'
-        }
-        
-        for old_col, new_col in column_mapping.items():
-            if old_col in df.columns:
-                df.rename(columns={old_col: new_col}, inplace=True)
-        
-        # Replace missing values
-        df = df.replace(["--", "", " ", "nan", "NaN"], np.nan)
-        
-        print(f"Dataset shape: {df.shape}")
-        print(f"Columns: {list(df.columns)}")
-        
-        return df
+    # Define features to drop (data leakage prevention)
+    FEATURES_TO_DROP = [
+        "Flood-risk_level",  # Target variable
+        "DATE",  # Not useful for prediction
+        "Areas",  # Too specific
+        "Nearest Station",  # Not useful
+        "Drainage_properties",  # Text data
+        "Drainage_line_id",  # ID
+        # Remove highly correlated features to prevent overfitting
+        "true_conditions_count",  # Derived from target
+        "Flood_occured",  # Directly related to target
+        "Monitoring_required"  # Policy decision based on risk
+    ]
     
-    def advanced_feature_engineering(self, df):
-        """Create advanced features for better prediction"""
-        print("🔧 Advanced feature engineering...")
-        
-        # Create interaction features
-        if 'Rainfall_mm' in df.columns and 'Rainfall_Intensity' in df.columns:
-            df['Rainfall_Total_Impact'] = df['Rainfall_mm'] * df['Rainfall_Intensity']
-        
-        if 'Population' in df.columns and 'Built_up_percent' in df.columns:
-            df['Urban_Density_Factor'] = df['Population'] * (df['Built_up_percent'] / 100)
-        
-        if 'Elevation' in df.columns and 'Distance_to_water' in df.columns:
-            df['Flood_Susceptibility'] = (1 / (df['Elevation'] + 1)) * (1 / (df['Distance_to_water'] + 1))
-        
-        # Create categorical bins for continuous variables
-        if 'Rainfall_mm' in df.columns:
-            df['Rainfall_Category'] = pd.cut(df['Rainfall_mm'], 
-                                           bins=[0, 10, 50, 100, 200, float('inf')], 
-                                           labels=['Very_Low', 'Low', 'Moderate', 'High', 'Extreme'])
-        
-        if 'Elevation' in df.columns:
-            df['Elevation_Category'] = pd.cut(df['Elevation'], 
-                                            bins=[0, 5, 15, 30, float('inf')], 
-                                            labels=['Very_Low', 'Low', 'Medium', 'High'])
-        
-        # Weather pattern features
-        if all(col in df.columns for col in ['Rainfall_mm', 'Rainfall_Days_Count']):
-            df['Avg_Daily_Rainfall'] = df['Rainfall_mm'] / (df['Rainfall_Days_Count'] + 1)
-        
-        return df
+    # Label-encoded categorical variables
+    CATEGORICAL_COLUMNS = ['Ward Code', 'Land Use Classes', 'Soil Type', 
+                           'Rainfall_Category', 'Elevation_Category']
     
-    def prepare_features_and_target(self, df):
-        """Prepare features and target with careful feature selection"""
-        print("🎯 Preparing features and target...")
+    def __init__(self, rainfall_csv=None):
+        super().__init__()
+        # Daily ward rainfall for the rolling features (opt-in: serving needs the history kept current)
+        if rainfall_csv:
+            self.rainfall_series = RainfallSeries.from_csv(rainfall_csv)
+    
+    def prepare_features_and_target(self, df, fit_encoders=True):
+        """
+        Prepare features and target with careful feature selection
         
-        # Define features to drop (data leakage prevention)
-        features_to_drop = [
-            "Flood-risk_level",  # Target variable
-            "DATE",  # Not useful for prediction
-            "Areas",  # Too specific
-            "Nearest Station",  # Not useful
-            "Drainage_properties",  # Text data
-            "Drainage_line_id",  # ID
-            # Remove highly correlated features to prevent overfitting
-            "true_conditions_count",  # Derived from target
-            "Flood_occured",  # Directly related to target
-            "Monitoring_required"  # Policy decision based on risk
-        ]
+        fit_encoders=False reuses the loaded model's label vocabularies
+        (unseen labels become -1) and target encoder, for incremental updates.
+        """
+        print("🎯 Preparing features and target...")
         
         # Separate features and target
-        X = df.drop(columns=features_to_drop, errors='ignore')
+        X = df.drop(columns=self.FEATURES_TO_DROP, errors='ignore')
         y = df["Flood-risk_level"]
+        if y.isna().any():
+            raise ValueError(f"{int(y.isna().sum())} rows have no Flood-risk_level")
         
         # Handle categorical variables
-        categorical_columns = ['Ward Code', 'Land Use Classes', 'Soil Type', 
-                             'Rainfall_Category', 'Elevation_Category']
-        
-        for col in categorical_columns:
+        if fit_encoders:
+            self.category_encodings = {}
+        for col in self.CATEGORICAL_COLUMNS:
             if col in X.columns:
-                X[col] = X[col].astype(str).fillna('Unknown')
-                le = LabelEncoder()
-                X[col] = le.fit_transform(X[col])
-        
-        # Handle numerical variables
+                X[col] = category_labels(X[col])
+                if fit_encoders:
+                    le = LabelEncoder()
+                    X[col] = le.fit_transform(X[col])
+                    self.category_encodings[col] = [str(label) for label in le.classes_]
+                else:
+                    codes = {label: code for code, label in enumerate(self.category_encodings.get(col, []))}
+                    X[col] = X[col].map(codes).fillna(-1).astype(int)
+        
+        # Handle numerical variables (text such as export error messages becomes NaN)
+        for col in X.columns.difference(self.CATEGORICAL_COLUMNS):
+            if not pd.api.types.is_numeric_dtype(X[col]):
+                X[col] = pd.to_numeric(X[col], errors='coerce')
         numerical_columns = X.select_dtypes(include=[np.number]).columns
         for col in numerical_columns:
             X[col] = pd.to_numeric(X[col], errors='coerce')
             X[col] = X[col].fillna(X[col].median())
         
         # Encode target
-        self.target_encoder = LabelEncoder()
-        y_encoded = self.target_encoder.fit_transform(y)
+        if fit_encoders:
+            self.target_encoder = LabelEncoder()
+            y_encoded = self.target_encoder.fit_transform(y)
+        else:
+            y_encoded = self.target_encoder.transform(y)
         
         print(f"Features shape: {X.shape}")
         print(f"Target distribution: {pd.Series(y).value_counts()}")
         
         return X, y_encoded
     
-    def feature_selection(self, X, y):
-        """Select best features to prevent overfitting"""
-        print("🔍 Selecting best features...")
-        
-        # Use RFECV for optimal feature selection
-        rf_temp = RandomForestClassifier(n_estimators=50, random_state=42)
-        self.feature_selector = RFECV(
-            estimator=rf_temp,
-            step=1,
-            cv=StratifiedKFold(5),
-            scoring='f1_macro',
-            n_jobs=-1
-        )
+    def feature_selection(self, X, y, cv=None, n_jobs=-1, estimator_n_jobs=None, strategy='ranked'):
+        """
+        Select best features to prevent overfitting
+        
+        strategy='ranked' ranks features once per fold and scores subsets on
+        a fractional schedule (see feature_ranking); 'rfecv' is the original
+        RFECV(step=1). cv takes precomputed fold indices (training_pipeline
+        shares one set of folds across stages); n_jobs parallelises the
+        fits and estimator_n_jobs the forest inside each fit.
+        """
+        print(f"🔍 Selecting best features ({strategy})...")
+        
+        rf_temp = RandomForestClassifier(n_estimators=50, random_state=42, n_jobs=estimator_n_jobs)
+        cv = cv if cv is not None else StratifiedKFold(5)
+        if strategy == 'ranked':
+            self.feature_selector = RankedFeatureSelector(
+                estimator=rf_temp,
+                cv=cv,
+                scoring='f1_macro',
+                n_jobs=n_jobs
+            )
+        elif strategy == 'rfecv':
+            # Use RFECV for optimal feature selection
+            self.feature_selector = RFECV(
+                estimator=rf_temp,
+                step=1,
+                cv=cv,
+                scoring='f1_macro',
+                n_jobs=n_jobs
+            )
+        else:
+            raise ValueError(f"Unknown feature selection strategy: {strategy}")
         
         X_selected = self.feature_selector.fit_transform(X, y)
         selected_features = X.columns[self.feature_selector.support_]
@@ -236,26 +223,114 @@ class AdvancedFloodPredictor:
         
         return self.model
     
-    def train_model(self, X_train, y_train):
-        """Train the ensemble model with cross-validation"""
+    def train_model(self, X_train, y_train, cross_validate=True, scaler=None):
+        """
+        Train the ensemble model with cross-validation
+        
+        training_pipeline passes cross_validate=False: it cross-validates
+        the members on shared folds before the final fit instead. A
+        prefitted scaler (from streaming preprocessing) is used as is.
+        """
         print("🏋️ Training ensemble model...")
         
         # Scale features
-        self.scaler = RobustScaler()  # More robust to outliers
-        X_train_scaled = self.scaler.fit_transform(X_train)
+        if scaler is not None:
+            self.scaler = scaler
+            X_train_scaled = self.scaler.transform(X_train)
+        else:
+            self.scaler = RobustScaler()  # More robust to outliers
+            X_train_scaled = self.scaler.fit_transform(X_train)
         
         # Train model
         self.model.fit(X_train_scaled, y_train)
         
         # Cross-validation for model evaluation
-        cv_scores = cross_val_score(
-            self.model, X_train_scaled, y_train, 
-            cv=StratifiedKFold(5), scoring='f1_macro', n_jobs=-1
+        if cross_validate:
+            cv_scores = cross_val_score(
+                self.model, X_train_scaled, y_train, 
+                cv=StratifiedKFold(5), scoring='f1_macro', n_jobs=-1
+            )
+            
+            print(f"Cross-validation F1 Score: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
+        
+        return self.model
+    
+    def incremental_update(self, df, new_trees=50, boosting_rounds=50, holdout=0.2,
+                           random_state=42, n_jobs=-1):
+        """
+        Grow the loaded ensemble on the days after its training window
+        
+        Forest members (RF/ET) get `new_trees` more trees through warm_start,
+        boosted members (XGB/LGBM) `boosting_rounds` more rounds continuing
+        from their booster; the new trees see only the new days. The scaler
+        is kept as is: the existing trees split on values scaled with it.
+        df is load_and_preprocess_data output (old days are skipped).
+        Returns F1 before/after on held-out new days and the new window.
+        """
+        print("🌱 Incremental update...")
+        if self.category_encodings is None:
+            raise ValueError("Model has no category encodings; retrain it with training_pipeline first")
+        
+        window = (self.model_manifest or {}).get('training_window')
+        dates = parse_dates(df['DATE'])
+        if window:
+            df = df[dates > pd.Timestamp(window['last_date'])]
+            if df.empty:
+                raise ValueError(f"No days after {window['last_date']} in the new data")
+        else:
+            print("⚠️ Model has no training window, using every row of the new data")
+        new_window = training_window(df)
+        print(f"New days: {new_window['first_date']} to {new_window['last_date']} ({len(df)} rows)")
+        
+        # Days past the rainfall history extend it, so their rolling features are not NaN
+        if self.rainfall_series is not None:
+            added = self.rainfall_series.extend_from_frame(df)
+            print(f"Rainfall history extended by {added} days to {self.rainfall_series.last_day}")
+        
+        df = self.advanced_feature_engineering(df)
+        X, y = self.prepare_features_and_target(df, fit_encoders=False)
+        X = X.reindex(columns=self.feature_names, fill_value=0)
+        missing = [label for code, label in enumerate(self.target_encoder.classes_) if code not in set(y)]
+        if missing:
+            raise ValueError(f"New days have no rows for {missing}; wait for more days or retrain")
+        
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=holdout, random_state=random_state, stratify=y
         )
+        X_train_scaled = self.scaler.transform(X_train)
+        X_test_scaled = self.scaler.transform(X_test)
+        f1_before = f1_score(y_test, self.model.predict(X_test_scaled), average='macro')
+        
+        for name, member in self.model.named_estimators_.items():
+            set_model_threads(member, n_jobs)
+            if hasattr(member, 'warm_start'):
+                member.set_params(warm_start=True, n_estimators=member.n_estimators + new_trees)
+                member.fit(X_train_scaled, y_train)
+                member.set_params(warm_start=False)
+                grown = f"{member.n_estimators} trees"
+            elif hasattr(member, 'get_booster'):
+                rounds = member.n_estimators
+                member.set_params(n_estimators=boosting_rounds)
+                member.fit(X_train_scaled, y_train, xgb_model=member.get_booster())
+                member.set_params(n_estimators=rounds + boosting_rounds)
+                grown = f"{member.n_estimators} rounds"
+            elif hasattr(member, 'booster_'):
+                rounds = member.n_estimators
+                member.set_params(n_estimators=boosting_rounds)
+                member.fit(X_train_scaled, y_train, init_model=member.booster_)
+                member.set_params(n_estimators=rounds + boosting_rounds)
+                grown = f"{member.n_estimators} rounds"
+            else:
+                raise ValueError(f"Cannot grow ensemble member of type {type(member).__name__}")
+            print(f"  {name:<4} grown to {grown}")
         
-        print(f"Cross-validation F1 Score: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
+        f1_after = f1_score(y_test, self.model.predict(X_test_scaled), average='macro')
+        print(f"Held-out new days F1: {f1_before:.4f} -> {f1_after:.4f}")
         
-        return self.model
+        if window:
+            new_window = {'first_date': window['first_date'], 'last_date': new_window['last_date'],
+                          'rows': window['rows'] + new_window['rows']}
+        return {'f1_before': f1_before, 'f1_after': f1_after, 'training_window': new_window}
     
     def evaluate_model(self, X_test, y_test):
         """Comprehensive model evaluation"""
@@ -291,199 +366,39 @@ class AdvancedFloodPredictor:
         
         return accuracy, f1
     
-    def save_model(self, model_dir="model_files"):
-        """Save the trained model and preprocessors"""
+    def save_model(self, model_dir="model_files", training_data=None, training_window=None,
+                   parent_version=None):
+        """Save the trained model and preprocessors as a single model bundle"""
         os.makedirs(model_dir, exist_ok=True)
         
-        joblib.dump(self.model, f'{model_dir}/advanced_flood_model.joblib')
-        joblib.dump(self.scaler, f'{model_dir}/scaler.joblib')
-        joblib.dump(self.target_encoder, f'{model_dir}/target_encoder.joblib')
-        joblib.dump(self.feature_selector, f'{model_dir}/feature_selector.joblib')
-        joblib.dump(self.feature_names, f'{model_dir}/feature_names.joblib')
-        
-        print(f"✅ Model saved to {model_dir}/")
-    
-    def load_model(self, model_dir="model_files"):
-        """Load the trained model and preprocessors"""
-        self.model = joblib.load(f'{model_dir}/advanced_flood_model.joblib')
-        self.scaler = joblib.load(f'{model_dir}/scaler.joblib')
-        self.target_encoder = joblib.load(f'{model_dir}/target_encoder.joblib')
-        self.feature_selector = joblib.load(f'{model_dir}/feature_selector.joblib')
-        self.feature_names = joblib.load(f'{model_dir}/feature_names.joblib')
-        
-        print("✅ Model loaded successfully!")
-    
-    def get_live_weather_data(self, lat=19.0760, lon=72.8777):  # Mumbai coordinates
-        """Fetch live weather data from OpenWeatherMap API"""
+        # Flat array-backed copy of the ensemble for serving without the tree libraries
+        compiled = None
         try:
-            # Using OpenWeatherMap API (free tier)
-            base_url = "http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "appid": self.weather_api_key,
-                "units": "metric"
-            }
-            
-            response = requests.get(base_url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                weather_data = {
-                    'temperature': data['main']['temp'],
-                    'humidity': data['main']['humidity'],
-                    'pressure': data['main']['pressure'],
-                    'wind_speed': data['wind'].get('speed', 0),
-                    'precipitation': data.get('rain', {}).get('1h', 0),  # Rain in last 1h
-                    'weather_condition': data['weather'][0]['main']
-                }
-                
-                return weather_data
-                
-            else:
-                print(f"Weather API Error: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            print(f"Error fetching weather data: {e}")
-            # Return dummy data for testing
-            return {
-                'temperature': 28.5,
-                'humidity': 85,
-                'pressure': 1013.25,
-                'wind_speed': 3.5,
-                'precipitation': 5.2,
-                'weather_condition': 'Rain'
-            }
-    
-    def create_prediction_features(self, weather_data, area_data=None):
-        """Create feature vector for prediction using weather data"""
-        
-        # Default static values for Mumbai areas (you can customize these)
-        default_area_data = {
-            'Ward Code': 1,  # Ward A
-            'Latitude': 19.0760,
-            'Longitude': 72.8777,
-            'Elevation': 10,  # Average Mumbai elevation
-            'Land Use Classes': 1,  # Commercial/Mixed use
-            'Population': 185000,
-            'Road_Density_m': 15.0,
-            'Built_up_percent': 85,
-            'Distance_to_water': 500,
-            'Soil Type': 1,  # Urban
-            'True_nearest_distance': 2000
-        }
-        
-        if area_data:
-            default_area_data.update(area_data)
-        
-        # Create feature vector
-        features = {
-            **default_area_data,
-            'Rainfall_mm': weather_data['precipitation'],
-            'Rainfall_Intensity': weather_data['precipitation'],  # Using precipitation as intensity
-            'Rainfall_Days_Count': 1,  # Current day
-            'Longest_rainfall_days': 1
-        }
-        
-        # Create DataFrame
-        feature_df = pd.DataFrame([features])
-        
-        # Apply same feature engineering as training
-        feature_df = self.advanced_feature_engineering(feature_df)
-        
-        return feature_df
-    
-    def predict_flood_risk(self, weather_data=None, area_data=None):
-        """Make flood risk prediction using live weather data"""
-        
-        if weather_data is None:
-            print("🌦️ Fetching live weather data...")
-            weather_data = self.get_live_weather_data()
-            
-            if weather_data is None:
-                return None
-        
-        print("🔮 Making flood risk prediction...")
-        
-        # Create feature vector
-        feature_df = self.create_prediction_features(weather_data, area_data)
-        
-        # Select only the features used in training
-        if self.feature_names is not None:
-            # Ensure all required features are present
-            for feature in self.feature_names:
-                if feature not in feature_df.columns:
-                    feature_df[feature] = 0  # Default value
-            
-            feature_df = feature_df[self.feature_names]
-        
-        # Scale features
-        features_scaled = self.scaler.transform(feature_df)
-        
-        # Make prediction
-        prediction = self.model.predict(features_scaled)[0]
-        prediction_proba = self.model.predict_proba(features_scaled)[0]
-        
-        # Convert prediction to label
-        risk_level = self.target_encoder.inverse_transform([prediction])[0]
-        
-        # Get probabilities for all classes
-        prob_dict = {}
-        for i, class_name in enumerate(self.target_encoder.classes_):
-            prob_dict[class_name] = round(prediction_proba[i], 4)
-        
-        result = {
-            'predicted_risk_level': risk_level,
-            'confidence': round(max(prediction_proba), 4),
-            'probabilities': prob_dict,
-            'weather_data': weather_data,
-            'timestamp': datetime.now().isoformat()
-        }
+            compiled = compile_ensemble(self.model)
+            parity = check_parity(self.model, compiled, parity_inputs(compiled))
+            if not parity['passed']:
+                print(f"⚠️ Compiled ensemble failed parity (max |Δp| = {parity['max_abs_diff']:.2e}), not exported")
+                compiled = None
+        except ValueError as e:
+            print(f"⚠️ Compiled ensemble not exported: {e}")
+        
+        manifest = save_model_bundle(
+            f'{model_dir}/{MODEL_BUNDLE_FILE}', self.model, self.scaler, self.target_encoder,
+            self.feature_names, feature_selector=self.feature_selector, compiled=compiled,
+            training_data=training_data, category_encodings=self.category_encodings,
+            training_window=training_window, parent_version=parent_version,
+            rainfall_series=self.rainfall_series
+        )
+        self.model_manifest = manifest
         
-        return result
+        print(f"✅ Model {manifest['model_version']} saved to {model_dir}/{MODEL_BUNDLE_FILE}")
 
 def main():
-    """Main training function"""
-    print("🚀 Starting Advanced Flood Prediction Model Training...")
-    
-    # Initialize predictor
-    predictor = AdvancedFloodPredictor()
-    
-    # Load and preprocess data
-    df = predictor.load_and_preprocess_data("final_flood_classification data.csv")
-    
-    # Feature engineering
-    df = predictor.advanced_feature_engineering(df)
+    """Main training function (stages and timings live in training_pipeline)"""
+    from training_pipeline import run_pipeline, TRAINING_CSV
     
-    # Prepare features and target
-    X, y = predictor.prepare_features_and_target(df)
-    
-    # Feature selection
-    X_selected = predictor.feature_selection(X, y)
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_selected, y, test_size=0.2, random_state=42, stratify=y
-    )
-    
-    print(f"Training set: {X_train.shape}")
-    print(f"Test set: {X_test.shape}")
-    
-    # Build and train model
-    predictor.build_ensemble_model()
-    predictor.train_model(X_train, y_train)
-    
-    # Evaluate model
-    accuracy, f1 = predictor.evaluate_model(X_test, y_test)
-    
-    # Save model
-    predictor.save_model()
-    
-    print("\n🎉 Model training completed successfully!")
-    print(f"Final Test Accuracy: {accuracy:.4f}")
-    print(f"Final F1 Score: {f1:.4f}")
+    print("🚀 Starting Advanced Flood Prediction Model Training...")
+    predictor = run_pipeline(TRAINING_CSV)
     
     # Test real-time prediction
     print("\n🔮 Testing real-time prediction...")
@@ -0,0 +1,172 @@
+"""
+Micro-Batching Scheduler
+========================
+Collects concurrent single-row predictions for up to max_wait seconds or
+max_batch rows and scores them with one predict_flood_risk_batch call
+(one predict_proba over the whole block), then hands each caller its own
+result. Tree ensembles are much cheaper per row in a batch, so during a
+burst of requests throughput goes up instead of queueing single rows.
+
+A lone request waits at most max_wait before it is scored on its own.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets reported in stats()
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class MicroBatcher:
+    """
+    Queue in front of the predictor; a single scoring thread drains it
+
+    Each request is scored by the predictor it was submitted with (the one
+    its handler captured, else get_predictor() at submit time), so a
+    request started on one model finishes on it. A batch that spans a hot
+    swap is split into one model call per predictor.
+    """
+
+    def __init__(self, get_predictor, max_wait=0.002, max_batch=64):
+        self.get_predictor = get_predictor
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._histogram = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self._stats = {
+            'batches': 0,
+            'rows': 0,
+            'failed_batches': 0,
+            'max_batch_seen': 0,
+            'queue_wait_s': 0.0
+        }
+
+    @classmethod
+    def from_env(cls, get_predictor):
+        """Build a batcher from PREDICT_BATCH_* environment variables"""
+        return cls(get_predictor,
+                   max_wait=float(os.environ.get('PREDICT_BATCH_MAX_WAIT_MS', 2)) / 1000,
+                   max_batch=int(os.environ.get('PREDICT_BATCH_MAX_SIZE', 64)))
+
+    @property
+    def enabled(self):
+        return self.max_batch > 1
+
+    def start(self):
+        """Start the scoring thread (submit() does this on first use, so after a fork)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, weather_data, area_data=None, static_row=None, predictor=None):
+        """Queue one prediction; returns a Future with predict_flood_risk's result"""
+        if self._thread is None:
+            self.start()
+        predictor = predictor or self.get_predictor()
+        future = Future()
+        self._queue.put((future, time.perf_counter(), weather_data, area_data, static_row, predictor))
+        return future
+
+    def predict(self, weather_data, area_data=None, static_row=None, predictor=None):
+        """Blocking single prediction through the batcher (drop-in for predict_flood_risk)"""
+        if not self.enabled:
+            predictor = predictor or self.get_predictor()
+            return predictor.predict_flood_risk(weather_data, area_data, static_row)
+        return self.submit(weather_data, area_data, static_row, predictor).result()
+
+    def _collect(self):
+        """Block for the first request, then gather more until max_wait or max_batch"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except Exception as e:
+                logger.error(f"Micro-batch scoring failed: {e}")
+
+    def _score(self, batch):
+        """Score a batch in one model call per predictor (normally one)"""
+        started = time.perf_counter()
+        groups = {}
+        for item in batch:
+            if item[0].set_running_or_notify_cancel():
+                groups.setdefault(id(item[-1]), []).append(item)
+        for group in groups.values():
+            self._score_group(group, group[0][-1], started)
+
+    def _score_group(self, batch, predictor, started):
+        """Score one predictor's requests together; isolate failures to their own request"""
+        # Rows without a feature store row take the default area attributes
+        default_row = np.array(list(predictor.DEFAULT_AREA_DATA.values()), dtype=np.float64)
+        records = [{'weather_data': weather_data, 'area_data': area_data}
+                   for _, _, weather_data, area_data, _, _ in batch]
+        static_rows = [default_row if static_row is None else static_row
+                       for _, _, _, _, static_row, _ in batch]
+
+        try:
+            results = predictor.predict_flood_risk_batch(records, static_rows=static_rows)
+        except Exception:
+            # A bad record fails the whole block; rescore one by one so only it errors
+            self._record(batch, started, failed=True)
+            for future, _, weather_data, area_data, static_row, _ in batch:
+                try:
+                    future.set_result(predictor.predict_flood_risk(weather_data, area_data, static_row))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        self._record(batch, started)
+        for (future, *_), result in zip(batch, results):
+            future.set_result(result)
+
+    def _record(self, batch, started, failed=False):
+        size = len(batch)
+        with self._lock:
+            bound = next((b for b in BATCH_SIZE_BUCKETS if size <= b), BATCH_SIZE_BUCKETS[-1])
+            self._histogram[bound] += 1
+            self._stats['batches'] += 1
+            self._stats['rows'] += size
+            self._stats['failed_batches'] += failed
+            self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], size)
+            self._stats['queue_wait_s'] += sum(started - queued for _, queued, *_ in batch)
+
+    def stats(self):
+        """Batch counters and the batch-size histogram (bucket upper bound -> batches)"""
+        with self._lock:
+            stats = dict(self._stats)
+            histogram = dict(self._histogram)
+        rows = stats.pop('rows')
+        queue_wait = stats.pop('queue_wait_s')
+        stats.update({
+            'rows': rows,
+            'mean_batch_size': round(rows / stats['batches'], 2) if stats['batches'] else None,
+            'mean_queue_wait_ms': round(1000 * queue_wait / rows, 3) if rows else None,
+            'batch_size_histogram': {f"<={bound}": count for bound, count in histogram.items()},
+            'max_wait_ms': self.max_wait * 1000,
+            'max_batch': self.max_batch
+        })
+        return stats
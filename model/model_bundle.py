@@ -0,0 +1,215 @@
+"""
+Model Bundle
+============
+Single-file, versioned model export. One uncompressed joblib file holds:
+
+- manifest: format/model version, feature order, class labels, training
+  data hash, library versions and checksums of everything below
+- compiled: the CompiledEnsemble, whose node arrays load as read-only
+  memmaps (joblib mmap_mode) and are shared by forked workers
+- blobs: pickled preprocessors and the original estimator, unpickled
+  only when asked for, so serving never imports XGBoost/LightGBM
+
+Files are written to a temporary name and renamed into place.
+
+Usage: python model_bundle.py [model_dir]   (prints the manifest)
+"""
+
+import hashlib
+import io
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+from importlib import metadata
+
+import joblib
+import numpy as np
+
+MODEL_BUNDLE_FILE = "flood_model_bundle.joblib"
+BUNDLE_FORMAT_VERSION = 1
+
+# Libraries whose versions are recorded in the manifest
+BUNDLE_LIBRARIES = ['numpy', 'pandas', 'scikit-learn', 'xgboost', 'lightgbm', 'joblib']
+
+
+class BundleIntegrityError(Exception):
+    """A bundle's contents do not match its manifest checksums"""
+
+
+def library_versions():
+    """Installed versions of the libraries the model depends on"""
+    versions = {'python': platform.python_version()}
+    for name in BUNDLE_LIBRARIES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def file_fingerprint(path):
+    """Name, size and SHA-256 of a file (used for the training data)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {
+        'file': os.path.basename(path),
+        'bytes': os.path.getsize(path),
+        'sha256': digest.hexdigest()
+    }
+
+
+def _dumps(obj):
+    """joblib-pickle an object to bytes"""
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.getvalue()
+
+
+def _compiled_sha256(compiled):
+    """Checksum over a compiled ensemble's pickled arrays, in attribute order"""
+    digest = hashlib.sha256()
+    for name, value in sorted(compiled.__getstate__().items()):
+        if isinstance(value, np.ndarray):
+            digest.update(name.encode('utf-8'))
+            digest.update(np.ascontiguousarray(value).view(np.uint8).ravel())
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """A loaded bundle; blobs are unpickled on first access"""
+
+    def __init__(self, manifest, compiled, blobs, path=None):
+        self.manifest = manifest
+        self.compiled = compiled
+        self.path = path
+        self._blobs = blobs
+        self._loaded = {}
+
+    def _blob(self, name):
+        if name not in self._loaded:
+            self._loaded[name] = joblib.load(io.BytesIO(self._blobs[name]))
+        return self._loaded[name]
+
+    def preprocessors(self):
+        """dict with scaler, target_encoder, feature_names and category_encodings"""
+        return self._blob('preprocessors')
+
+    def estimator(self):
+        """The original fitted ensemble (imports the tree libraries)"""
+        return self._blob('estimator')
+
+    def feature_selector(self):
+        """The fitted feature selector, only needed for retraining"""
+        return self._blob('feature_selector')
+
+    def verify(self):
+        """Check every blob and the compiled arrays against the manifest"""
+        checksums = self.manifest['checksums']
+        for name, blob in self._blobs.items():
+            if hashlib.sha256(blob).hexdigest() != checksums.get(name):
+                raise BundleIntegrityError(f"Checksum mismatch for '{name}' in {self.path}")
+        if self.compiled is not None and _compiled_sha256(self.compiled) != checksums.get('compiled'):
+            raise BundleIntegrityError(f"Checksum mismatch for the compiled ensemble in {self.path}")
+
+
+def save_model_bundle(path, model, scaler, target_encoder, feature_names,
+                      feature_selector=None, compiled=None, training_data=None,
+                      category_encodings=None, training_window=None, parent_version=None,
+                      rainfall_series=None):
+    """
+    Write a bundle and return its manifest
+
+    training_data is the path of the CSV the model was trained on; its
+    fingerprint is recorded so a model can be traced back to its data.
+    category_encodings maps categorical columns to their label vocabulary.
+    training_window ({first_date, last_date, rows}) and parent_version
+    record what an incremental update grew the model from. rainfall_series
+    is the rainfall_features.RainfallSeries the rolling features came from.
+    """
+    from rainfall_features import RAINFALL_FEATURES
+
+    if compiled is not None:
+        compiled._node_table()  # Store the packed node records so they are mapped too
+
+    blobs = {
+        'preprocessors': _dumps({
+            'scaler': scaler,
+            'target_encoder': target_encoder,
+            'feature_names': list(feature_names),
+            'category_encodings': category_encodings,
+            'rainfall_series': rainfall_series
+        }),
+        'estimator': _dumps(model)
+    }
+    if feature_selector is not None:
+        blobs['feature_selector'] = _dumps(feature_selector)
+
+    checksums = {name: hashlib.sha256(blob).hexdigest() for name, blob in blobs.items()}
+    if compiled is not None:
+        checksums['compiled'] = _compiled_sha256(compiled)
+
+    created_at = datetime.now().replace(microsecond=0)
+    content_hash = hashlib.sha256(json.dumps(checksums, sort_keys=True).encode('utf-8')).hexdigest()
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': f"{created_at:%Y%m%d%H%M%S}-{content_hash[:8]}",
+        'created_at': created_at.isoformat(),
+        'model_type': type(model).__name__,
+        'members': [name for name, _ in getattr(model, 'estimators', [])],
+        'feature_names': list(feature_names),
+        'class_labels': [str(label) for label in target_encoder.classes_],
+        'scaler': type(scaler).__name__,
+        'compiled': {
+            'n_trees': compiled.n_trees,
+            'n_nodes': compiled.n_nodes
+        } if compiled is not None else None,
+        'training_data': file_fingerprint(training_data) if training_data else None,
+        'training_window': training_window,
+        'parent_version': parent_version,
+        # Serving raises StaleRainfallError until the history reaches the day before
+        'rainfall_history': {
+            'first_day': str(rainfall_series.first_day),
+            'last_day': str(rainfall_series.last_day),
+            'unobserved_through': str(rainfall_series.unobserved) if rainfall_series.unobserved is not None else None,
+            'features': [name for name in feature_names if name in RAINFALL_FEATURES]
+        } if rainfall_series is not None else None,
+        'libraries': library_versions(),
+        'checksums': checksums
+    }
+
+    tmp_path = f"{path}.tmp"
+    joblib.dump({'manifest': manifest, 'compiled': compiled, 'blobs': blobs}, tmp_path)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_model_bundle(path, mmap_mode='r', verify=True):
+    """
+    Load a bundle; with mmap_mode='r' the compiled node arrays stay in the
+    page cache and are shared between processes instead of copied
+    """
+    payload = joblib.load(path, mmap_mode=mmap_mode)
+    manifest = payload['manifest']
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported model bundle format: {manifest.get('format_version')}")
+
+    bundle = ModelBundle(manifest, payload['compiled'], payload['blobs'], path)
+    if verify:
+        bundle.verify()
+    return bundle
+
+
+def main():
+    """Print the manifest of model_files/ bundle"""
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "model_files"
+    bundle = load_model_bundle(os.path.join(model_dir, MODEL_BUNDLE_FILE))
+    print(json.dumps(bundle.manifest, indent=2))
+    print("✅ Bundle checksums verified")
+
+
+if __name__ == "__main__":
+    main()
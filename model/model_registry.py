@@ -0,0 +1,180 @@
+"""
+Model Registry
+==============
+Watches the model directory for a newly published model bundle, loads it
+in the background, warms it with a canary batch and swaps it in with a
+single reference assignment. Requests that already picked up the old
+predictor finish on it; new requests get the new one.
+
+Publish a model by writing a new bundle (save_model writes to a temporary
+file and renames it into place, so the watcher never sees half a file).
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from model_bundle import MODEL_BUNDLE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Canary weather levels: dry, moderate, heavy and extreme rain
+CANARY_PRECIPITATION = [0.0, 15.0, 60.0, 150.0, 300.0]
+
+
+def model_version(predictor):
+    """Bundle version of a loaded predictor (None for legacy model files)"""
+    manifest = predictor.model_manifest if predictor is not None else None
+    return manifest.get('model_version') if manifest else None
+
+
+def run_canary(predictor, static_rows=None):
+    """
+    Score a small batch and one single-row request on a freshly loaded
+    predictor; raises ValueError if the outputs are not usable
+
+    This also warms lazy state (pandas import, compiled node tables, the
+    fast-path plan) before the predictor takes traffic.
+    """
+    records = [{'weather_data': {'precipitation': precipitation}}
+               for precipitation in CANARY_PRECIPITATION]
+    rows = None
+    if static_rows is not None and len(static_rows):
+        rows = [static_rows[i % len(static_rows)] for i in range(len(records))]
+
+    results = predictor.predict_flood_risk_batch(records, static_rows=rows)
+    results.append(predictor.predict_flood_risk(records[-1]['weather_data']))
+
+    class_names = set(str(name) for name in predictor.target_encoder.classes_)
+    if len(results) != len(records) + 1:
+        raise ValueError(f"Canary returned {len(results)} results for {len(records) + 1} requests")
+    for result in results:
+        total = sum(result['probabilities'].values())
+        if str(result['predicted_risk_level']) not in class_names:
+            raise ValueError(f"Canary predicted unknown class {result['predicted_risk_level']!r}")
+        if not math.isfinite(total) or abs(total - 1.0) > 1e-3:
+            raise ValueError(f"Canary probabilities sum to {total}")
+    return results
+
+
+class ModelRegistry:
+    """
+    Holds the serving predictor and hot-swaps it when the bundle changes
+
+    - loader(model_dir) builds a ready predictor (loaded, fast path on)
+    - canary(predictor) must return without raising before a swap
+    - listeners(predictor) run after every swap, e.g. to repoint globals
+    """
+
+    def __init__(self, model_dir, loader, predictor=None, poll_interval=5.0,
+                 canary=run_canary):
+        self.model_dir = model_dir
+        self.loader = loader
+        self.predictor = predictor
+        self.poll_interval = poll_interval
+        self.canary = canary
+
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._bundle_signature()
+        self._stats = {
+            'version': model_version(predictor),
+            'swaps': 0,
+            'failed_loads': 0,
+            'last_check': None,
+            'last_swap': None,
+            'last_error': None
+        }
+
+    @classmethod
+    def from_env(cls, model_dir, loader, predictor=None, canary=run_canary):
+        """Build a registry from MODEL_RELOAD_* environment variables (0 disables polling)"""
+        return cls(model_dir, loader, predictor,
+                   poll_interval=float(os.environ.get('MODEL_RELOAD_INTERVAL', 5)),
+                   canary=canary)
+
+    @property
+    def bundle_path(self):
+        return os.path.join(self.model_dir, MODEL_BUNDLE_FILE)
+
+    def add_listener(self, listener):
+        """Call listener(predictor) after each swap"""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start polling the bundle on a daemon thread"""
+        if self._thread is None and self.poll_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='model-registry', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _bundle_signature(self):
+        """(inode, size, mtime) of the bundle, or None when there is none"""
+        try:
+            stat = os.stat(self.bundle_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Model registry check failed: {e}")
+
+    def check(self):
+        """Reload if the bundle changed since the last check; True if swapped"""
+        self._stats['last_check'] = datetime.now().isoformat()
+        signature = self._bundle_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return self.reload()
+
+    def reload(self):
+        """Load, canary and swap in the current bundle; True if swapped"""
+        start = time.perf_counter()
+        try:
+            candidate = self.loader(self.model_dir)
+            version = model_version(candidate)
+            if version is not None and version == self._stats['version']:
+                return False
+            self.canary(candidate)
+        except Exception as e:
+            self._stats['failed_loads'] += 1
+            self._stats['last_error'] = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ New model rejected, keeping {self._stats['version']}: {e}")
+            return False
+
+        with self._lock:
+            previous = self._stats['version']
+            self.predictor = candidate
+            self._stats['version'] = version
+            self._stats['swaps'] += 1
+            self._stats['last_swap'] = datetime.now().isoformat()
+            self._stats['last_error'] = None
+
+        for listener in self._listeners:
+            try:
+                listener(candidate)
+            except Exception as e:
+                logger.error(f"Model swap listener failed: {e}")
+
+        logger.info(f"✅ Model {previous} -> {version} swapped in "
+                    f"({time.perf_counter() - start:.2f}s to load and warm)")
+        return True
+
+    def stats(self):
+        """Current version plus reload counters"""
+        stats = dict(self._stats)
+        stats['poll_interval_s'] = self.poll_interval
+        return stats
@@ -0,0 +1,171 @@
+"""
+Prediction Service Helpers
+==========================
+Framework-agnostic pieces shared by the Flask and asyncio API servers
+"""
+
+# Upper bound on records accepted by /predict/batch in one request
+MAX_BATCH_RECORDS = 10000
+
+# Predefined Mumbai areas with their coordinates and characteristics
+MUMBAI_AREAS = [
+    {
+        'name': 'Colaba',
+        'ward': 'A',
+        'latitude': 18.9151,
+        'longitude': 72.8141,
+        'elevation': 6,
+        'population': 185000,
+        'built_up_percent': 90,
+        'land_use': 'commercial_mixed'
+    },
+    {
+        'name': 'Ballard Estate',
+        'ward': 'A',
+        'latitude': 18.9496,
+        'longitude': 72.8414,
+        'elevation': 17,
+        'population': 185000,
+        'built_up_percent': 90,
+        'land_use': 'commercial_institutional'
+    },
+    {
+        'name': 'Fort',
+        'ward': 'A',
+        'latitude': 18.9320,
+        'longitude': 72.8347,
+        'elevation': 12,
+        'population': 185000,
+        'built_up_percent': 95,
+        'land_use': 'commercial'
+    },
+    {
+        'name': 'Bandra',
+        'ward': 'H/West',
+        'latitude': 19.0596,
+        'longitude': 72.8295,
+        'elevation': 15,
+        'population': 250000,
+        'built_up_percent': 85,
+        'land_use': 'residential_commercial'
+    },
+    {
+        'name': 'Andheri',
+        'ward': 'K/West',
+        'latitude': 19.1136,
+        'longitude': 72.8697,
+        'elevation': 25,
+        'population': 400000,
+        'built_up_percent': 80,
+        'land_use': 'residential_mixed'
+    },
+    {
+        'name': 'Dadar',
+        'ward': 'G/North',
+        'latitude': 19.0176,
+        'longitude': 72.8562,
+        'elevation': 8,
+        'population': 300000,
+        'built_up_percent': 88,
+        'land_use': 'residential_commercial'
+    }
+]
+
+
+def find_mumbai_area(area_name):
+    """Look up a predefined area by name (case-insensitive)"""
+    for area in MUMBAI_AREAS:
+        if area['name'].lower() == area_name.lower():
+            return area
+    return None
+
+
+def area_prediction_data(area_info, location_resolver=None):
+    """
+    (static_row, area_data, location) passed to the predictor for a predefined area
+
+    With a location resolver the area is scored like /predict/live at its
+    coordinates (nearest feature store area and drain); without one its
+    listed attributes override the defaults.
+    """
+    lat, lon = area_info['latitude'], area_info['longitude']
+    if location_resolver is not None:
+        return location_resolver.resolve(lat, lon)
+    return None, {
+        'Latitude': lat,
+        'Longitude': lon,
+        'Elevation': area_info['elevation'],
+        'Population': area_info['population'],
+        'Built_up_percent': area_info['built_up_percent']
+    }, None
+
+
+def model_info_payload(predictor):
+    """/model/info body, reporting the loaded bundle's manifest when there is one"""
+    manifest = predictor.model_manifest or {}
+    info = {
+        'model_type': 'Advanced Ensemble Classifier',
+        'algorithms': ['Random Forest', 'XGBoost', 'LightGBM', 'Extra Trees'],
+        'features_count': len(predictor.feature_names) if predictor.feature_names is not None else 0,
+        'target_classes': [str(c) for c in predictor.target_encoder.classes_] if predictor.target_encoder else [],
+        'api_version': '1.0',
+        'model_version': manifest.get('model_version', 'advanced_ensemble'),
+        'serving_model': 'compiled' if type(predictor.model).__name__ == 'CompiledEnsemble' else 'estimator',
+        'last_loaded': predictor.loaded_at
+    }
+    
+    if manifest:
+        info['bundle'] = {key: manifest.get(key) for key in 
+                          ('format_version', 'created_at', 'members', 'feature_names', 'class_labels', 
+                           'compiled', 'training_data', 'libraries')}
+    
+    return info
+
+
+def validate_batch_request(data):
+    """
+    Check a /predict/batch body
+    
+    Returns (records, None) when valid, otherwise (None, (payload, status)).
+    """
+    records = data.get('records') if isinstance(data, dict) else None
+    
+    if not isinstance(records, list) or not records:
+        return None, ({
+            'error': 'Invalid request',
+            'message': 'Request body must contain a non-empty "records" list'
+        }, 400)
+    
+    if len(records) > MAX_BATCH_RECORDS:
+        return None, ({
+            'error': 'Batch too large',
+            'message': f'At most {MAX_BATCH_RECORDS} records are accepted per request'
+        }, 413)
+    
+    # Every record needs weather data with a precipitation value
+    for index, record in enumerate(records):
+        weather_data = record.get('weather_data') if isinstance(record, dict) else None
+        if not isinstance(weather_data, dict) or 'precipitation' not in weather_data:
+            return None, ({
+                'error': 'Invalid record',
+                'message': f'Record {index} is missing weather_data.precipitation'
+            }, 400)
+    
+    return records, None
+
+
+def parse_route_point(value):
+    """
+    A /route endpoint as (lat, lon): either "lat,lon" or a predefined
+    area name; None when it is neither
+    """
+    if not value:
+        return None
+    parts = value.split(',')
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    area = find_mumbai_area(value.strip())
+    return (area['latitude'], area['longitude']) if area is not None else None
@@ -0,0 +1,525 @@
+"""
+Rolling Rainfall Features
+=========================
+Time-series features from the daily ward rainfall matrix (one row per
+monitoring region, one column per day, 06-01 to 09-30), for every region
+at once:
+
+- Rain_{3,7,14}d_mm: rainfall over the last N days, today included, as
+  differences of one running cumulative sum
+- Rain_API: antecedent precipitation index, API(t) = k * API(t - 1) + P(t)
+- Wet_day_run: consecutive days (today included) with at least 2.5 mm,
+  from the running maximum of the last dry day's index
+
+The matrix is one contiguous (regions, days) float64 array with spare
+columns, so append_day() adds a new day in O(regions): one cumulative-sum
+column, one API step and one run-length step, without recomputing the
+history. Rows are matched to the region nearest to their coordinates.
+
+Training rows (with a DATE) get the values of their day; prediction rows
+(no DATE) get today's values, with their precipitation as the day after
+the last one in the series. That needs a series ending yesterday: while it
+does not (or within the longest window after days filled without
+observations), prediction rows raise StaleRainfallError rather than add
+a stale history to today's rain. The features are opt-in at training
+(training_pipeline.py --rainfall-history) for that reason, and the model
+manifest records the history's last day.
+
+The series is kept current by DailyRainfallFeed, which integrates each
+day's live snapshot readings (hourly rain rates) per region into a daily
+total, appends the finished day and saves the series; incremental updates
+extend it from the new days' Rainfall_mm.
+
+Check incremental against full computation, and the feed's daily totals:
+    python rainfall_features.py [csv_path]
+"""
+
+import argparse
+import math
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from scipy.signal import lfilter
+from scipy.spatial import cKDTree
+
+from drainage_network import EARTH_RADIUS_M, REFERENCE_LATITUDE, project
+
+RAINFALL_MATRIX_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Dataset",
+                                   "rainfall", "mumbai_rainfall_monsoon_2023 (1).csv")
+
+# Live series saved by DailyRainfallFeed, next to the model
+LIVE_RAINFALL_FILE = "rainfall_series.npz"
+
+# Rolling sum windows in days
+ROLLING_WINDOWS = (3, 7, 14)
+
+# Daily decay of the antecedent precipitation index
+API_DECAY = 0.85
+
+# A wet day has at least this much rain (IMD rainy-day threshold)
+WET_DAY_MM = 2.5
+
+# Live readings are rain rates over the hour before them (OpenWeatherMap rain.1h)
+READING_SPAN = timedelta(hours=1)
+
+# A live day with fewer hours covered by readings is appended as unobserved
+MIN_COVERED_HOURS = 12.0
+
+
+class StaleRainfallError(RuntimeError):
+    """Today's rolling rainfall features were asked for, but the history does not end yesterday"""
+
+RAINFALL_FEATURES = [f'Rain_{window}d_mm' for window in ROLLING_WINDOWS] + ['Rain_API', 'Wet_day_run']
+
+
+class RainfallSeries:
+    """
+    Daily rainfall per region plus the running state behind the features
+
+    rainfall, cumulative, api and wet_run share one column per day; columns
+    past `days` are spare capacity for append_day(). unobserved is the last
+    day filled in without observations (by extend()), if any. Appends may
+    run on another thread than predictions: today's state is published as
+    one (serving day, values) tuple.
+    """
+
+    def __init__(self, regions, latitudes, longitudes, first_day, rainfall, unobserved=None):
+        self.regions = list(regions)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.first_day = np.datetime64(first_day, 'D')
+        self.unobserved = None if unobserved is None else np.datetime64(unobserved, 'D')
+        self._tree = cKDTree(project(self.latitudes, self.longitudes))
+
+        rainfall = np.nan_to_num(np.asarray(rainfall, dtype=np.float64))
+        n_regions, self.days = rainfall.shape
+        self._allocate(n_regions, max(self.days, 1) * 2)
+        self.rainfall[:, :self.days] = rainfall
+
+        # Full history at once: cumulative sums (with a leading zero column),
+        # the API recursion as a first-order filter and wet-day run lengths
+        self.cumulative[:, 0] = 0.0
+        np.cumsum(rainfall, axis=1, out=self.cumulative[:, 1:self.days + 1])
+        self.api[:, :self.days] = lfilter([1.0], [1.0, -API_DECAY], rainfall, axis=1)
+        day = np.arange(self.days)
+        last_dry = np.maximum.accumulate(np.where(rainfall >= WET_DAY_MM, -1, day), axis=1)
+        self.wet_run[:, :self.days] = day - last_dry
+
+        self._refresh_today()
+
+    def __setstate__(self, state):
+        """Unpickle, filling in state that series pickled by older versions lack"""
+        for name in ('_today', '_serving_day', 'typical'):  # Replaced by _current
+            state.pop(name, None)
+        self.__dict__.update(state)
+        self.__dict__.setdefault('unobserved', None)
+        self._refresh_today()
+
+    @classmethod
+    def from_csv(cls, path=RAINFALL_MATRIX_CSV, year=None):
+        """
+        Load the wide matrix (Ward, Region, Latitude, Longitude, then one
+        'MM-DD-tif' column per consecutive day); the year defaults to the
+        one in the file name
+        """
+        import pandas as pd
+
+        df = pd.read_csv(path)
+        day_columns = [col for col in df.columns if re.fullmatch(r'\d{2}-\d{2}-tif', col)]
+        if year is None:
+            match = re.search(r'(?:19|20)\d{2}', path)
+            if match is None:
+                raise ValueError(f"No year in {path}; pass year explicitly")
+            year = int(match.group())
+
+        days = np.array([f"{year}-{col[:5]}" for col in day_columns], dtype='datetime64[D]')
+        if len(days) and not (np.diff(days) == np.timedelta64(1, 'D')).all():
+            raise ValueError(f"Day columns of {path} are not consecutive")
+
+        rainfall = np.ascontiguousarray(df[day_columns].to_numpy(dtype=np.float64))
+        return cls(df['Region'], df['Latitude'], df['Longitude'], days[0], rainfall)
+
+    @classmethod
+    def load(cls, path):
+        """A series written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            unobserved = str(data['unobserved'])
+            return cls(data['regions'].tolist(), data['latitudes'], data['longitudes'],
+                       str(data['first_day']), data['rainfall'], unobserved or None)
+
+    def save(self, path):
+        """Write the observed days to an .npz file, replacing it atomically"""
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, regions=np.array(self.regions, dtype=str), latitudes=self.latitudes,
+                 longitudes=self.longitudes, first_day=str(self.first_day),
+                 rainfall=self.rainfall[:, :self.days],
+                 unobserved='' if self.unobserved is None else str(self.unobserved))
+        os.replace(tmp_path, path)
+
+    def _allocate(self, n_regions, capacity):
+        """(Re)allocate the day-column arrays with room for `capacity` days"""
+        previous = getattr(self, 'rainfall', None)
+        arrays = {
+            'rainfall': np.zeros((n_regions, capacity)),
+            'cumulative': np.zeros((n_regions, capacity + 1)),
+            'api': np.zeros((n_regions, capacity)),
+            'wet_run': np.zeros((n_regions, capacity))
+        }
+        if previous is not None:
+            for name, array in arrays.items():
+                old = getattr(self, name)
+                array[:, :old.shape[1]] = old
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @property
+    def last_day(self):
+        return self.first_day + np.timedelta64(self.days - 1, 'D')
+
+    def append_day(self, values):
+        """Add the next day's rainfall (one value per region), updating the features in O(regions)"""
+        values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+        if values.shape != (len(self.regions),):
+            raise ValueError(f"Expected {len(self.regions)} regional values, got {values.shape}")
+        if self.days == self.rainfall.shape[1]:
+            self._allocate(len(self.regions), self.days * 2)
+
+        t = self.days
+        self.rainfall[:, t] = values
+        self.cumulative[:, t + 1] = self.cumulative[:, t] + values
+        self.api[:, t] = values + API_DECAY * self.api[:, t - 1] if t else values
+        self.wet_run[:, t] = np.where(values >= WET_DAY_MM, (self.wet_run[:, t - 1] if t else 0) + 1, 0)
+        self.days = t + 1
+        self._refresh_today()
+
+    def extend(self, day, values, observed=True):
+        """
+        Append `day`'s rainfall (one value per region) after the last day;
+        days in between are filled in as dry and marked unobserved, as is
+        `day` itself when not observed. Days the series already has are
+        ignored (returns False).
+        """
+        day = np.datetime64(day, 'D')
+        gap = int((day - self.last_day) / np.timedelta64(1, 'D')) - 1
+        if gap < 0:
+            return False
+        # Marked before appending, so no intermediate state counts as current
+        if not observed:
+            self.unobserved = day
+        elif gap:
+            self.unobserved = day - np.timedelta64(1, 'D')
+        for _ in range(gap):
+            self.append_day(np.zeros(len(self.regions)))
+        self.append_day(values)
+        return True
+
+    def extend_from_frame(self, df):
+        """
+        Extend the series with the days of a dataset frame after its last
+        day: each region's value is the mean Rainfall_mm of its rows that
+        day (the day's mean for regions without rows). Returns the days added.
+        """
+        import pandas as pd
+
+        dates = pd.to_datetime(df['DATE'], dayfirst=True, errors='coerce').to_numpy(dtype='datetime64[D]')
+        rain = pd.to_numeric(df['Rainfall_mm'], errors='coerce').to_numpy(dtype=np.float64)
+        lat = pd.to_numeric(df['Latitude'], errors='coerce').to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(df['Longitude'], errors='coerce').to_numpy(dtype=np.float64)
+        usable = ~(np.isnat(dates) | np.isnan(rain) | np.isnan(lat) | np.isnan(lon))
+        usable &= dates > self.last_day
+        dates, rain = dates[usable], rain[usable]
+        regions = self.region_of(lat[usable], lon[usable]) if usable.any() else np.empty(0, dtype=int)
+
+        added = 0
+        for day in np.unique(dates):
+            on_day = dates == day
+            self.extend(day, regional_means(regions[on_day], rain[on_day], len(self.regions)))
+            added += 1
+        return added
+
+    def is_current(self, day=None):
+        """Whether today's features (for `day`, default today) can be built from the history"""
+        return (day or date.today()) == self._current[0]
+
+    def _today_values(self):
+        """Today's per-region history (see _refresh_today), or StaleRainfallError"""
+        serving_day, today = self._current
+        if date.today() != serving_day:
+            raise StaleRainfallError(
+                f"Rainfall history ends {self.last_day}"
+                + (f" (unobserved through {self.unobserved})" if self.unobserved is not None else "")
+                + f"; today's rolling rainfall features need observed days through yesterday"
+            )
+        return today
+
+    def _refresh_today(self):
+        """
+        Per-region history behind today's features: the last (window - 1)
+        days' sums, the decayed API and the wet run up to yesterday
+        """
+        t = self.days
+        # Only the day after the last one, and not while unobserved days are within a window
+        serving_day = self.last_day + np.timedelta64(1, 'D')
+        settled = (self.unobserved is None or
+                   serving_day - self.unobserved > np.timedelta64(max(ROLLING_WINDOWS), 'D'))
+
+        today = np.empty((len(self.regions), len(RAINFALL_FEATURES)))
+        for j, window in enumerate(ROLLING_WINDOWS):
+            today[:, j] = self.cumulative[:, t] - self.cumulative[:, max(t + 1 - window, 0)]
+        today[:, -2] = API_DECAY * self.api[:, t - 1] if t else 0.0
+        today[:, -1] = self.wet_run[:, t - 1] if t else 0.0
+        # Published together in one assignment, so readers never pair a day with another day's values
+        self._current = (serving_day.astype(date) if settled else None, today)
+
+    def region_of(self, lat, lon):
+        """Row of the region nearest to each coordinate"""
+        return self._tree.query(project(lat, lon).reshape(-1, 2))[1]
+
+    def today_at(self, lat, lon, precipitation):
+        """features_today() for a single coordinate, without the KD-tree and array overhead"""
+        today = self._today_values()
+        # project() for one point in scalar math, then a brute-force nearest region
+        x = math.radians(lon) * EARTH_RADIUS_M * math.cos(math.radians(REFERENCE_LATITUDE))
+        offsets = self._tree.data - (x, math.radians(lat) * EARTH_RADIUS_M)
+        history = today[np.einsum('ij,ij->i', offsets, offsets).argmin()].tolist()
+        *sums, api, run = history
+        values = [total + precipitation for total in sums]
+        values.append(precipitation + api)
+        values.append(run + 1 if precipitation >= WET_DAY_MM else 0.0)
+        return values
+
+    def features(self, regions, day_index):
+        """
+        (n, len(RAINFALL_FEATURES)) features of regions on day offsets from
+        first_day; NaN for days outside the series
+        """
+        regions = np.asarray(regions)
+        day_index = np.asarray(day_index)
+        known = (day_index >= 0) & (day_index < self.days)
+        r, t = regions[known], day_index[known]
+
+        values = np.full((len(regions), len(RAINFALL_FEATURES)), np.nan)
+        for j, window in enumerate(ROLLING_WINDOWS):
+            values[known, j] = self.cumulative[r, t + 1] - self.cumulative[r, np.maximum(t + 1 - window, 0)]
+        values[known, -2] = self.api[r, t]
+        values[known, -1] = self.wet_run[r, t]
+        return values
+
+    def features_today(self, regions, precipitation):
+        """
+        Features of regions today, given today's precipitation; raises
+        StaleRainfallError unless the series ends yesterday
+        """
+        today = self._today_values()
+        precipitation = np.asarray(precipitation, dtype=np.float64)
+        values = today[np.asarray(regions)]
+        values[:, :-1] += precipitation[..., None]
+        values[:, -1] = np.where(precipitation >= WET_DAY_MM, values[:, -1] + 1, 0)
+        return values
+
+    def add_features(self, df):
+        """
+        Add RAINFALL_FEATURES columns to a frame with Latitude/Longitude and
+        either DATE (its day's values) or Rainfall_mm (today's values); in place
+        """
+        import pandas as pd
+
+        lat = pd.to_numeric(df['Latitude'], errors='coerce').to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(df['Longitude'], errors='coerce').to_numpy(dtype=np.float64)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        regions = np.zeros(len(df), dtype=np.int64)
+        regions[located] = self.region_of(lat[located], lon[located])
+
+        if 'DATE' in df.columns:
+            dates = pd.to_datetime(df['DATE'], dayfirst=True, errors='coerce')
+            day_index = np.where(dates.isna(), -1,
+                                 (dates.to_numpy(dtype='datetime64[D]') - self.first_day).astype(np.int64))
+            values = self.features(regions, np.where(located, day_index, -1))
+        else:
+            precipitation = pd.to_numeric(df['Rainfall_mm'], errors='coerce').to_numpy(dtype=np.float64)
+            values = self.features_today(regions, precipitation)
+            values[~located] = np.nan
+
+        for j, name in enumerate(RAINFALL_FEATURES):
+            df[name] = values[:, j]
+        return df
+
+
+def regional_means(regions, values, n_regions):
+    """Mean of values per region, the overall mean for regions without values"""
+    counts = np.bincount(regions, minlength=n_regions)
+    sums = np.bincount(regions, weights=values, minlength=n_regions)
+    overall = values.mean() if len(values) else 0.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, overall)
+
+
+class DailyRainfallFeed:
+    """
+    Keeps a RainfallSeries current from the risk snapshot job's weather sweeps
+
+    Each snapshot reading is a rain rate (mm over the hour before it, as
+    OpenWeatherMap's rain.1h), averaged per region and integrated over the
+    time since the previous reading (at most READING_SPAN), so a day adds
+    up to its rainfall in mm, the unit of the training matrix. The first
+    reading of a later day closes the running day: covered by at least
+    MIN_COVERED_HOURS of readings, its total (scaled up to 24 hours) is
+    appended to the series, otherwise it is appended as unobserved. The
+    series is then saved to path, where reload() in other processes picks
+    it up.
+    """
+
+    def __init__(self, series, latitudes, longitudes, path=None):
+        self.series = series
+        self.path = path
+        self.area_regions = series.region_of(np.asarray(latitudes), np.asarray(longitudes))
+        self._day = None
+        self._totals = np.zeros(len(series.regions))  # mm so far on the running day
+        self._covered_hours = 0.0
+        self._last_reading = None
+        self._saved_mtime = None
+        self._stats = {'snapshots': 0, 'days_appended': 0, 'days_unobserved': 0, 'save_errors': 0}
+
+    @classmethod
+    def from_env(cls, series, store, model_dir="model_files"):
+        """
+        A feed for the feature store's areas, saving to RAINFALL_SERIES_FILE
+        (default <model_dir>/rainfall_series.npz); a saved series that is
+        further along than the model's replaces it
+        """
+        path = os.environ.get('RAINFALL_SERIES_FILE', os.path.join(model_dir, LIVE_RAINFALL_FILE))
+        feed = cls(series, store.latitudes, store.longitudes, path)
+        feed.reload()
+        return feed
+
+    def adopt(self, series):
+        """Switch to another series (a new model's) if it is further along; returns the one in use"""
+        if series is not None and series.regions == self.series.regions and series.last_day > self.series.last_day:
+            self.series = series
+        return self.series
+
+    def reload(self):
+        """Adopt the saved series if it changed on disk and is further along; whether it was adopted"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns if self.path else None
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None or mtime == self._saved_mtime:
+            return False
+        self._saved_mtime = mtime
+        previous = self.series
+        return self.adopt(RainfallSeries.load(self.path)) is not previous
+
+    def observe(self, area_precipitation, at):
+        """
+        Add one reading per area (mm in the hour before `at`, None where
+        unavailable), split at midnight between the days it covers; a
+        RiskSnapshotJob weather listener
+        """
+        values = np.array([np.nan if value is None else value for value in area_precipitation], dtype=np.float64)
+        known = ~np.isnan(values)
+        rates = regional_means(self.area_regions[known], values[known], len(self._totals)) if known.any() else None
+
+        span = READING_SPAN if self._last_reading is None else min(at - self._last_reading, READING_SPAN)
+        start = at - max(span, timedelta(0))
+        while start.date() < at.date():
+            midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time(), at.tzinfo)
+            self._add(start.date(), rates, midnight - start)
+            start = midnight
+        self._add(at.date(), rates, at - start)
+        self._last_reading = at
+        self._stats['snapshots'] += 1
+
+    def _add(self, day, rates, span):
+        """Integrate per-region rates (mm/h) over `span` of `day`"""
+        if self._day is not None and day > self._day:
+            self._close_day()
+        if self._day is None or day > self._day:
+            self._day = day
+        if rates is not None and day == self._day:
+            hours = span.total_seconds() / 3600
+            self._totals += rates * hours
+            self._covered_hours += hours
+
+    def _close_day(self):
+        """Append the running day's rainfall (or an unobserved day) to the series and save it"""
+        observed = self._covered_hours >= MIN_COVERED_HOURS
+        totals = self._totals * (24 / self._covered_hours) if observed else np.zeros_like(self._totals)
+        if self.series.extend(self._day, totals, observed=observed):
+            self._stats['days_appended' if observed else 'days_unobserved'] += 1
+            if self.path:
+                try:
+                    self.series.save(self.path)
+                    self._saved_mtime = os.stat(self.path).st_mtime_ns
+                except OSError:
+                    self._stats['save_errors'] += 1
+        self._totals[:] = 0.0
+        self._covered_hours = 0.0
+
+    def stats(self):
+        return {
+            **self._stats,
+            'last_day': str(self.series.last_day),
+            'unobserved_through': str(self.series.unobserved) if self.series.unobserved is not None else None,
+            'current': self.series.is_current(),
+            'running_day': str(self._day) if self._day is not None else None,
+            'running_covered_hours': round(self._covered_hours, 2)
+        }
+
+
+def check_feed_units(series):
+    """
+    Feed a day of readings every 10 minutes at a constant 2 mm/h and check
+    the day is appended as 48 mm, a daily total like the matrix's values
+    """
+    feed = DailyRainfallFeed(series, series.latitudes, series.longitudes)
+    day = (series.last_day + np.timedelta64(1, 'D')).astype(date)
+    at = datetime.combine(day, datetime.min.time())
+    while at.date() <= day:
+        feed.observe([2.0] * len(series.regions), at)
+        at += timedelta(minutes=10)
+    feed.observe([2.0] * len(series.regions), at)  # First reading of the next day closes it
+    appended = series.rainfall[:, series.days - 1]
+    return series.last_day.astype(date) == day and np.allclose(appended, 48.0)
+
+
+def main():
+    """Build the features in one pass and day by day, and compare"""
+    parser = argparse.ArgumentParser(description="Check incremental rolling rainfall features")
+    parser.add_argument('csv_path', nargs='?', default=RAINFALL_MATRIX_CSV)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    full = RainfallSeries.from_csv(args.csv_path)
+    load_seconds = time.perf_counter() - started
+    print(f"🌧️ {len(full.regions)} regions x {full.days} days "
+          f"({full.first_day} to {full.last_day}) loaded in {load_seconds * 1000:.1f}ms")
+
+    # Same history, grown one day at a time from an empty series
+    incremental = RainfallSeries(full.regions, full.latitudes, full.longitudes, full.first_day,
+                                 np.empty((len(full.regions), 0)))
+    started = time.perf_counter()
+    for t in range(full.days):
+        incremental.append_day(full.rainfall[:, t])
+    per_day = (time.perf_counter() - started) / max(full.days, 1)
+
+    regions = np.repeat(np.arange(len(full.regions)), full.days)
+    days = np.tile(np.arange(full.days), len(full.regions))
+    same = np.allclose(full.features(regions, days), incremental.features(regions, days))
+    print(f"⚡ append_day: {per_day * 1e6:.1f}µs per day; matches the full computation: {same}")
+
+    latest = full.features(np.arange(len(full.regions)), np.full(len(full.regions), full.days - 1))
+    for j, name in enumerate(RAINFALL_FEATURES):
+        print(f"  {name:<12} last day mean {latest[:, j].mean():8.2f}  max {latest[:, j].max():8.2f}")
+
+    units_ok = check_feed_units(incremental)
+    print(f"🕐 Live feed: a day at 2 mm/h is appended as 48 mm: {units_ok}")
+    if not units_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
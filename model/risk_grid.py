@@ -0,0 +1,262 @@
+"""
+City-wide Risk Grid
+===================
+Scores a regular lat/lon grid over Mumbai (100 m cells by default) with
+the trained ensemble and saves the result as a float32 raster that map
+tiles can be sliced from.
+
+Every cell takes the static attributes of its nearest area in the feature
+store, its own coordinates and, when the drainage export is available,
+its own distance to the nearest drain. Weather is one precipitation value
+for the whole city or a per-cell field (an .npy array in grid shape).
+Cells farther than max_area_distance from every known area (sea, creeks)
+are left as NaN.
+
+Features are built column-wise in chunks and the chunks are scored in
+parallel worker processes, each evaluating the ensemble on its own core.
+
+The raster is saved as <out>.npy, shape (n_classes, rows, cols), holding
+each class's probability with row 0 at the northern edge; <out>.json
+holds the bounds, cell size and class names.
+
+Usage: python risk_grid.py [--model-dir model_files] [--cell-m 100] [--precipitation 50]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from drainage_network import DrainageNetwork, DRAINAGE_GEOJSON, EARTH_RADIUS_M, REFERENCE_LATITUDE
+
+# Cells per scoring task: features for one chunk are built, scaled and scored together
+GRID_CHUNK_CELLS = 32768
+
+# Margin added around the feature store's areas when no bounds are given
+GRID_MARGIN_M = 1000.0
+
+# Cells farther than this from every area are outside the modelled city
+MAX_AREA_DISTANCE_M = 3000.0
+
+RISK_GRID_FILE = "risk_grid"
+
+
+def grid_steps(cell_m):
+    """(latitude, longitude) size in degrees of a cell_m metre cell"""
+    lat_step = np.degrees(cell_m / EARTH_RADIUS_M)
+    return lat_step, lat_step / np.cos(np.radians(REFERENCE_LATITUDE))
+
+
+def grid_axes(bounds, cell_m):
+    """
+    Cell-centre latitudes (north to south) and longitudes (west to east)
+    of a grid of cell_m metre cells covering bounds (south, west, north, east)
+    """
+    south, west, north, east = bounds
+    lat_step, lon_step = grid_steps(cell_m)
+    rows = max(1, int(np.ceil((north - south) / lat_step)))
+    cols = max(1, int(np.ceil((east - west) / lon_step)))
+    latitudes = north - (np.arange(rows) + 0.5) * lat_step
+    longitudes = west + (np.arange(cols) + 0.5) * lon_step
+    return latitudes, longitudes
+
+
+def store_bounds(store, margin_m=GRID_MARGIN_M):
+    """(south, west, north, east) around the feature store's areas plus a margin"""
+    lat_margin, lon_margin = grid_steps(margin_m)
+    latitudes, longitudes = np.asarray(store.latitudes), np.asarray(store.longitudes)
+    return (float(latitudes.min() - lat_margin), float(longitudes.min() - lon_margin),
+            float(latitudes.max() + lat_margin), float(longitudes.max() + lon_margin))
+
+
+def _predict_chunk(model, features_scaled, n_jobs=None):
+    """Class probabilities for one chunk of scaled cells (in a worker, capped to n_jobs threads)"""
+    if not len(features_scaled):
+        return np.empty((0, len(model.classes_)), dtype=np.float32)
+    if n_jobs is not None and hasattr(model, 'get_params'):
+        from flood_inference import set_model_threads
+        set_model_threads(model, n_jobs)
+    return model.predict_proba(features_scaled).astype(np.float32)
+
+
+class RiskGrid:
+    """
+    Scores grid cells with a fast-inference predictor
+
+    area_index resolves cells to feature store rows (spatial_index.AreaIndex);
+    drainage, when given, supplies each cell's own drain distance.
+    """
+
+    def __init__(self, predictor, area_index, drainage=None, cores=None,
+                 chunk_cells=GRID_CHUNK_CELLS, max_area_distance=MAX_AREA_DISTANCE_M):
+        if predictor.fast_inference is None and not predictor.enable_fast_inference():
+            raise ValueError("The risk grid needs a model that supports fast inference")
+        self.predictor = predictor
+        self.area_index = area_index
+        self.drainage = drainage
+        self.cores = cores or os.cpu_count() or 1
+        self.chunk_cells = chunk_cells
+        self.max_area_distance = max_area_distance
+
+    @classmethod
+    def from_model_dir(cls, model_dir="model_files", drainage_path=DRAINAGE_GEOJSON, **kwargs):
+        """Load the compiled model, its feature store and (if present) the drainage export"""
+        from feature_store import AreaFeatureStore
+        from flood_inference import FloodPredictor
+        from spatial_index import AreaIndex
+
+        predictor = FloodPredictor()
+        predictor.load_model(model_dir, use_compiled=True)
+        store = AreaFeatureStore.load_or_build(predictor, model_dir)
+        drainage = None
+        if drainage_path and os.path.exists(drainage_path):
+            drainage = DrainageNetwork.from_geojson(drainage_path)
+        else:
+            print(f"⚠️ Drainage export {drainage_path} not found, using the areas' drain distances")
+        return cls(predictor, AreaIndex(store), drainage, **kwargs)
+
+    def _chunk_features(self, lat, lon, precipitation, area_precipitation=None):
+        """Scaled feature rows and the in-city mask for one chunk of cells"""
+        predictor = self.predictor
+        distances, rows = self.area_index.query(lat, lon)
+        inside = distances <= self.max_area_distance
+        if area_precipitation is not None:
+            precipitation = area_precipitation[rows]
+
+        area_columns = {'Latitude': lat[inside], 'Longitude': lon[inside]}
+        if self.drainage is not None:
+            area_columns['True_nearest_distance'] = self.drainage.query(lat[inside], lon[inside])[0]
+        if np.ndim(precipitation):
+            precipitation = precipitation[inside]
+
+        matrix = predictor.build_feature_matrix(self.area_index.store.rows[rows[inside]],
+                                                area_columns, precipitation)
+        return predictor._scale_rows_fast(matrix), inside
+
+    def score(self, bounds, cell_m=100.0, precipitation=0.0, area_precipitation=None):
+        """
+        (raster, metadata) for a grid over bounds (south, west, north, east)
+
+        precipitation is a scalar or an array in grid shape (rows, cols);
+        area_precipitation, one value per feature store row, replaces it
+        with each cell's nearest-area value (e.g. a snapshot's live weather).
+        The raster is float32 (n_classes, rows, cols), NaN outside the city.
+        """
+        predictor = self.predictor
+        latitudes, longitudes = grid_axes(bounds, cell_m)
+        shape = (len(latitudes), len(longitudes))
+        lat = np.repeat(latitudes, shape[1])
+        lon = np.tile(longitudes, shape[0])
+
+        precipitation = np.asarray(precipitation, dtype=np.float64)
+        if precipitation.ndim:
+            if precipitation.shape != shape:
+                raise ValueError(f"Precipitation field {precipitation.shape} does not match the grid {shape}")
+            precipitation = precipitation.ravel()
+        if area_precipitation is not None:
+            area_precipitation = np.asarray(area_precipitation, dtype=np.float64)
+
+        # Feature assembly stays in this process; the ensemble runs in the workers
+        chunks = [slice(start, start + self.chunk_cells) for start in range(0, len(lat), self.chunk_cells)]
+        processes = max(1, min(len(chunks), self.cores))
+        # In-process scoring keeps the model's own thread settings (it may be the serving model)
+        threads = max(1, self.cores // processes) if processes > 1 else None
+
+        def tasks():
+            for chunk in chunks:
+                field = precipitation[chunk] if precipitation.ndim else precipitation
+                features_scaled, inside = self._chunk_features(lat[chunk], lon[chunk], field,
+                                                               area_precipitation)
+                masks.append(inside)
+                yield delayed(_predict_chunk)(predictor.model, features_scaled, threads)
+
+        masks = []
+        n_classes = len(predictor.target_encoder.classes_)
+        cells = np.full((len(lat), n_classes), np.nan, dtype=np.float32)
+        outputs = Parallel(n_jobs=processes, backend='loky', return_as='generator')(tasks())
+        for chunk, probabilities in zip(chunks, outputs):
+            cells[chunk][masks.pop(0)] = probabilities
+
+        # Soft-vote columns follow model.classes_; store them in target_encoder order
+        class_order = np.argsort(np.asarray(predictor.model.classes_))
+        raster = np.ascontiguousarray(cells[:, class_order].T).reshape(n_classes, *shape)
+
+        lat_step, lon_step = grid_steps(cell_m)
+        metadata = {
+            'bounds': {'south': float(bounds[0]), 'west': float(bounds[1]),
+                       'north': float(bounds[2]), 'east': float(bounds[3])},
+            'cell_m': float(cell_m),
+            'shape': [n_classes, *shape],
+            'lat_step': float(lat_step),
+            'lon_step': float(lon_step),
+            'first_cell': {'latitude': float(latitudes[0]), 'longitude': float(longitudes[0])},
+            'classes': [str(name) for name in predictor.target_encoder.classes_],
+            'precipitation': ('per-area' if area_precipitation is not None else
+                              'per-cell' if precipitation.ndim else float(precipitation)),
+            'drainage': self.drainage is not None,
+            'max_area_distance_m': self.max_area_distance,
+            'cells_scored': int(np.count_nonzero(~np.isnan(cells[:, 0]))),
+            'model_version': (predictor.model_manifest or {}).get('model_version'),
+            'generated_at': datetime.now().replace(microsecond=0).isoformat()
+        }
+        return raster, metadata
+
+
+def save_risk_grid(raster, metadata, path=RISK_GRID_FILE):
+    """Write <path>.npy and <path>.json, replacing any previous grid atomically"""
+    with open(path + '.npy.tmp', 'wb') as f:
+        np.save(f, raster.astype(np.float32, copy=False))
+    with open(path + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=1)
+    os.replace(path + '.npy.tmp', path + '.npy')
+    os.replace(path + '.json.tmp', path + '.json')
+
+
+def load_risk_grid(path=RISK_GRID_FILE, mmap_mode='r'):
+    """(raster, metadata) of a saved grid; the raster is memory-mapped by default"""
+    with open(path + '.json', encoding='utf-8') as f:
+        metadata = json.load(f)
+    raster = np.load(path + '.npy', mmap_mode=mmap_mode)
+    if list(raster.shape) != metadata['shape']:
+        raise ValueError(f"Risk grid raster {raster.shape} does not match its metadata")
+    return raster, metadata
+
+
+def main():
+    """Score the grid and save it next to the model"""
+    parser = argparse.ArgumentParser(description="Score a city-wide flood risk grid")
+    parser.add_argument('--model-dir', default='model_files')
+    parser.add_argument('--cell-m', type=float, default=100.0, help="cell size in metres")
+    parser.add_argument('--precipitation', type=float, default=0.0, help="uniform precipitation (mm)")
+    parser.add_argument('--precipitation-grid', default=None, help=".npy per-cell precipitation in grid shape")
+    parser.add_argument('--bounds', type=float, nargs=4, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'),
+                        default=None, help="default: the feature store's areas plus a margin")
+    parser.add_argument('--geojson', default=DRAINAGE_GEOJSON)
+    parser.add_argument('--cores', type=int, default=None, help="core budget (default: all cores)")
+    parser.add_argument('--chunk-cells', type=int, default=GRID_CHUNK_CELLS)
+    parser.add_argument('--out', default=None, help=f"output prefix (default: <model-dir>/{RISK_GRID_FILE})")
+    args = parser.parse_args()
+
+    grid = RiskGrid.from_model_dir(args.model_dir, args.geojson, cores=args.cores,
+                                   chunk_cells=args.chunk_cells)
+    bounds = args.bounds or store_bounds(grid.area_index.store)
+    precipitation = np.load(args.precipitation_grid) if args.precipitation_grid else args.precipitation
+
+    started = time.perf_counter()
+    raster, metadata = grid.score(bounds, args.cell_m, precipitation)
+    seconds = time.perf_counter() - started
+
+    out = args.out or os.path.join(args.model_dir, RISK_GRID_FILE)
+    save_risk_grid(raster, metadata, out)
+    total = metadata['shape'][1] * metadata['shape'][2]
+    print(f"✅ Risk grid {metadata['shape'][1]}x{metadata['shape'][2]} ({total} cells, "
+          f"{metadata['cells_scored']} in the city) scored in {seconds:.1f}s "
+          f"({total / seconds:,.0f} cells/s), saved to {out}.npy")
+
+
+if __name__ == "__main__":
+    main()
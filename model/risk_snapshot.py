@@ -0,0 +1,302 @@
+"""
+City-wide Risk Snapshot
+=======================
+Background job that scores every area in the training dataset on a
+schedule and keeps the latest result as a ready-to-serve JSON body with
+an ETag, so dashboards polling /risk/snapshot get a 304 or a precomputed
+blob instead of triggering fresh model runs.
+
+Several server processes share one job: the process holding the leader
+lock (acquire_leader_lock) runs RiskSnapshotJob and writes each new
+snapshot to a shared file; the others follow that file with
+SharedRiskSnapshot, so every process serves the same body and ETag.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+logger = logging.getLogger(__name__)
+
+# Published snapshot and leader lock, in the shared directory (model_files)
+SHARED_SNAPSHOT_FILE = "risk_snapshot.json"
+SNAPSHOT_LEADER_LOCK = "risk_snapshot.lock"
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value matches a strong ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag.replace('W/', '', 1).strip('"') == etag for tag in tags)
+
+
+class RiskSnapshot:
+    """One published snapshot: serialized body plus its validators"""
+
+    __slots__ = ('version', 'etag', 'generated_at', 'body', 'area_count', 'area_precipitation')
+
+    def __init__(self, version, etag, generated_at, body, area_count, area_precipitation=None):
+        self.version = version
+        self.etag = etag
+        self.generated_at = generated_at
+        self.body = body
+        self.area_count = area_count
+        # Precipitation per feature store row (None where weather was unavailable)
+        self.area_precipitation = area_precipitation
+
+    @property
+    def last_modified(self):
+        """generated_at as an HTTP date"""
+        return format_datetime(self.generated_at.astimezone(timezone.utc), usegmt=True)
+
+    def save(self, path):
+        """Write the snapshot to a shared file, replacing it atomically"""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.version,
+                'etag': self.etag,
+                'generated_at': self.generated_at.isoformat(),
+                'area_count': self.area_count,
+                'area_precipitation': self.area_precipitation,
+                'body': self.body.decode('utf-8')
+            }, f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """A snapshot written by save()"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['version'], data['etag'], datetime.fromisoformat(data['generated_at']),
+                   data['body'].encode('utf-8'), data['area_count'], data['area_precipitation'])
+
+
+def acquire_leader_lock(path):
+    """
+    Open file descriptor holding an exclusive lock on path, or None when
+    another process holds it; the lock lasts until the process exits
+    """
+    import fcntl
+
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class RiskSnapshotJob:
+    """
+    Periodically scores every area in the feature store with live (cached) weather
+
+    - One batch model call per refresh, weather fetched on a small pool
+    - The snapshot is only replaced (and its version bumped) when the
+      predictions change, so the ETag stays stable between refreshes
+    - refresh_now() wakes the job early, e.g. after a model reload
+    - listeners(snapshot) run after every successful refresh, e.g. to
+      rebuild views derived from the snapshot's weather
+    - weather listeners(area_precipitation, at) get every weather sweep
+      before it is scored, so they see the weather even when scoring fails
+    - With shared_path, each new snapshot is also written there for
+      SharedRiskSnapshot followers in other processes
+    """
+
+    def __init__(self, predictor, store, interval=600, weather_workers=8, shared_path=None):
+        self.predictor = predictor
+        self.store = store
+        self.interval = interval
+        self.weather_workers = weather_workers
+        self.shared_path = shared_path
+
+        self._snapshot = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self._weather_listeners = []
+        self._stats = {
+            'refreshes': 0,
+            'failures': 0,
+            'last_refresh': None,
+            'last_duration_s': None
+        }
+
+    @classmethod
+    def from_env(cls, predictor, store, shared_path=None):
+        """Build the job from RISK_SNAPSHOT_* environment variables"""
+        return cls(
+            predictor,
+            store,
+            interval=float(os.environ.get('RISK_SNAPSHOT_INTERVAL', 600)),
+            weather_workers=int(os.environ.get('RISK_SNAPSHOT_WEATHER_WORKERS', 8)),
+            shared_path=shared_path
+        )
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) after each successful refresh, changed or not"""
+        self._listeners.append(listener)
+
+    def add_weather_listener(self, listener):
+        """Call listener(precipitation per store row, None where unavailable; sweep time) after each sweep"""
+        self._weather_listeners.append(listener)
+
+    def current(self):
+        """Latest published snapshot, or None before the first refresh"""
+        return self._snapshot
+
+    def start(self):
+        """Run the first refresh and the schedule on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='risk-snapshot', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def refresh_now(self):
+        """Ask the background thread to refresh without waiting for the interval"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self._stats['failures'] += 1
+                logger.error(f"Risk snapshot refresh failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Score every area once and publish the result if it changed"""
+        start = time.perf_counter()
+
+        areas_info = self.store.areas
+        coordinates = [(area['latitude'], area['longitude']) for area in areas_info]
+        with ThreadPoolExecutor(max_workers=self.weather_workers) as pool:
+            weather = list(pool.map(lambda c: self.predictor.get_live_weather_data(*c), coordinates))
+        area_precipitation = [weather_data['precipitation'] if weather_data is not None else None
+                              for weather_data in weather]
+        swept_at = datetime.now()
+        for listener in self._weather_listeners:
+            try:
+                listener(area_precipitation, swept_at)
+            except Exception as e:
+                logger.error(f"Risk snapshot weather listener failed: {e}")
+
+        scored = [i for i, weather_data in enumerate(weather) if weather_data is not None]
+        unavailable = [areas_info[i]['area'] for i, weather_data in enumerate(weather)
+                       if weather_data is None]
+
+        # Static attributes come straight from the store rows
+        records = [{'weather_data': weather[i]} for i in scored]
+        results = self.predictor.predict_flood_risk_batch(
+            records, static_rows=self.store.rows[scored])
+
+        areas = []
+        for i, result in zip(scored, results):
+            areas.append({
+                **areas_info[i],
+                'predicted_risk_level': result['predicted_risk_level'],
+                'confidence': float(result['confidence']),
+                'probabilities': {k: float(v) for k, v in result['probabilities'].items()},
+                'weather_data': weather[i]
+            })
+
+        # The ETag covers the content only, not when it was computed
+        content = {'areas': areas, 'unavailable_areas': unavailable}
+        etag = hashlib.sha256(
+            json.dumps(content, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:32]
+
+        previous = self._snapshot
+        if previous is None or previous.etag != etag:
+            generated_at = datetime.now().replace(microsecond=0)
+            version = previous.version + 1 if previous is not None else 1
+            body = json.dumps({
+                'version': version,
+                'generated_at': generated_at.isoformat(),
+                'total_areas': len(areas),
+                'api_version': '1.0',
+                'model_version': 'advanced_ensemble',
+                **content
+            }, default=str).encode('utf-8')
+            self._snapshot = RiskSnapshot(version, etag, generated_at, body, len(areas),
+                                          area_precipitation)
+            if self.shared_path:
+                self._snapshot.save(self.shared_path)
+            logger.info(f"Risk snapshot v{version} published for {len(areas)} areas")
+
+        self._stats['refreshes'] += 1
+        self._stats['last_refresh'] = datetime.now().isoformat()
+        self._stats['last_duration_s'] = round(time.perf_counter() - start, 3)
+        self._notify()
+        return self._snapshot
+
+    def _notify(self):
+        """Run the listeners on the current snapshot"""
+        for listener in self._listeners:
+            try:
+                listener(self._snapshot)
+            except Exception as e:
+                logger.error(f"Risk snapshot listener failed: {e}")
+
+    def stats(self):
+        """Refresh counters plus the published version"""
+        stats = dict(self._stats)
+        snapshot = self._snapshot
+        stats['interval_s'] = self.interval
+        stats['version'] = snapshot.version if snapshot is not None else None
+        stats['etag'] = snapshot.etag if snapshot is not None else None
+        stats['areas'] = snapshot.area_count if snapshot is not None else 0
+        return stats
+
+
+class SharedRiskSnapshot(RiskSnapshotJob):
+    """
+    Serves the snapshots a RiskSnapshotJob in another process writes to
+    shared_path, instead of scoring the areas itself
+
+    refresh() reloads the file when it changed; listeners run after every
+    poll once a snapshot exists, as after every job refresh.
+    """
+
+    def __init__(self, shared_path, interval=5):
+        super().__init__(None, None, interval=interval)
+        self.shared_path = shared_path
+        self._mtime = None
+        self._stats['loads'] = 0
+
+    @classmethod
+    def from_env(cls, shared_path):
+        """Follow shared_path, polled every RISK_SNAPSHOT_POLL_INTERVAL seconds"""
+        return cls(shared_path, interval=float(os.environ.get('RISK_SNAPSHOT_POLL_INTERVAL', 5)))
+
+    def refresh(self):
+        """Load the shared snapshot if it was replaced since the last poll"""
+        try:
+            mtime = os.stat(self.shared_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != self._mtime:
+            self._snapshot = RiskSnapshot.load(self.shared_path)
+            self._mtime = mtime
+            self._stats['loads'] += 1
+            self._stats['last_refresh'] = datetime.now().isoformat()
+        if self._snapshot is not None:
+            self._notify()
+        return self._snapshot
@@ -0,0 +1,382 @@
+"""
+Risk Map Tiles
+==============
+Slippy-map PNG tiles (/tiles/risk/{z}/{x}/{y}.png, Web Mercator, 256 px)
+rendered from the city-wide risk grid, for overlaying flood risk on
+OpenStreetMap.
+
+- The grid is rescored whenever the risk snapshot job publishes new live
+  weather or a new model is swapped in: each cell takes its nearest
+  area's precipitation from the snapshot
+- Every pixel is coloured by its risk score (the probability-weighted
+  risk level, Low 0 to High 1) through a 255-colour palette, so a tile
+  is a small palette PNG; cells outside the city are transparent
+- Tiles of the prerender zoom levels are written to disk as soon as a
+  grid is built; other tiles are rendered on first request. Disk tiles
+  live under a directory per grid version, so a new snapshot invalidates
+  them all at once and workers sharing the directory reuse each other's
+  grid and tiles. With several workers only one builds grids and prunes
+  old versions (builds=True); the others load the grids it saves
+- Recently served tiles are kept in memory, least recently used evicted
+  first
+
+Prerender tiles for a saved grid: python risk_tiles.py [model_dir] [--zooms 10-14]
+"""
+
+import argparse
+import hashlib
+import logging
+import math
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from risk_grid import RISK_GRID_FILE, load_risk_grid, save_risk_grid, store_bounds
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# Risk score of each class; a cell's score is the probability-weighted sum
+RISK_WEIGHTS = {'Low': 0.0, 'Moderate': 0.5, 'High': 1.0}
+
+# Palette: scores 0-1 map to indices 0-254 on a green-amber-red ramp, 255 is no data
+NO_DATA = 255
+RAMP_STOPS = [(0.0, (46, 204, 113)), (0.5, (241, 196, 15)), (1.0, (231, 76, 60))]
+TILE_ALPHA = 160
+
+DEFAULT_PRERENDER_ZOOMS = range(10, 15)
+
+
+def parse_zooms(spec):
+    """'10-14' -> range(10, 15), '12' -> range(12, 13)"""
+    low, _, high = spec.partition('-')
+    return range(int(low), int(high or low) + 1)
+
+
+def risk_palette():
+    """(RGB palette bytes, alpha bytes) for the 256 tile colour indices"""
+    scores = np.linspace(0.0, 1.0, NO_DATA)
+    stops = [stop for stop, _ in RAMP_STOPS]
+    colours = np.stack([np.interp(scores, stops, [colour[channel] for _, colour in RAMP_STOPS])
+                        for channel in range(3)], axis=1)
+    rgb = np.vstack([np.round(colours), [[0, 0, 0]]]).astype(np.uint8)
+    alpha = np.full(NO_DATA + 1, TILE_ALPHA, dtype=np.uint8)
+    alpha[NO_DATA] = 0
+    return rgb.tobytes(), alpha.tobytes()
+
+
+PALETTE, PALETTE_ALPHA = risk_palette()
+
+
+def encode_png(indices):
+    """Palette PNG of a 2-D uint8 array of colour indices"""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    height, width = indices.shape
+    rows = np.empty((height, width + 1), dtype=np.uint8)
+    rows[:, 0] = 0  # No filter
+    rows[:, 1:] = indices
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        chunk(b'PLTE', PALETTE),
+        chunk(b'tRNS', PALETTE_ALPHA),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        chunk(b'IEND', b'')
+    ])
+
+
+EMPTY_TILE = encode_png(np.full((TILE_SIZE, TILE_SIZE), NO_DATA, dtype=np.uint8))
+
+
+def risk_index(raster, classes):
+    """uint8 palette indices (rows, cols) of a risk grid's probability-weighted scores"""
+    weights = np.array([RISK_WEIGHTS.get(name, 0.5) for name in classes], dtype=np.float32)
+    scores = np.tensordot(weights, np.asarray(raster, dtype=np.float32), axes=1)
+    index = np.full(scores.shape, NO_DATA, dtype=np.uint8)
+    known = ~np.isnan(scores)
+    index[known] = np.round(np.clip(scores[known], 0.0, 1.0) * (NO_DATA - 1)).astype(np.uint8)
+    return index
+
+
+def tile_x(lon, z):
+    """Tile column of a longitude at zoom z"""
+    return int((lon + 180.0) / 360.0 * 2 ** z)
+
+
+def tile_y(lat, z):
+    """Tile row of a latitude at zoom z"""
+    lat_rad = math.radians(lat)
+    return int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * 2 ** z)
+
+
+def tiles_covering(bounds, z):
+    """(x, y) of every zoom z tile that overlaps bounds (south, west, north, east)"""
+    south, west, north, east = bounds
+    return [(x, y) for x in range(tile_x(west, z), tile_x(east, z) + 1)
+            for y in range(tile_y(north, z), tile_y(south, z) + 1)]
+
+
+def tile_pixel_coordinates(z, x, y):
+    """Latitudes (per pixel row) and longitudes (per pixel column) of a tile's pixel centres"""
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    n = 2.0 ** z
+    longitudes = (x + offsets) / n * 360.0 - 180.0
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (y + offsets) / n))))
+    return latitudes, longitudes
+
+
+class RiskTiles:
+    """
+    Risk grid plus its tile caches
+
+    grid is a risk_grid.RiskGrid; tiles are served from memory, then the
+    version's disk directory, then rendered from the current grid. With
+    builds=False a missing grid is waited for (the next snapshot poll tries
+    again) instead of scored, and other versions' directories are kept.
+    """
+
+    def __init__(self, grid, cache_dir, cell_m=100.0, bounds=None, max_tiles=2048,
+                 prerender_zooms=DEFAULT_PRERENDER_ZOOMS, min_zoom=8, max_zoom=18, builds=True):
+        self.grid = grid
+        self.cache_dir = cache_dir
+        self.builds = builds
+        self.cell_m = cell_m
+        self.bounds = tuple(bounds or store_bounds(grid.area_index.store))
+        self.max_tiles = max_tiles
+        self.prerender_zooms = list(prerender_zooms)
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+
+        self._current = None  # (version, palette index raster, metadata), swapped as a whole
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'rendered': 0,
+            'evictions': 0,
+            'grid_builds': 0,
+            'grid_loads': 0,
+            'last_build_s': None
+        }
+
+    @classmethod
+    def from_env(cls, grid, model_dir="model_files", builds=True):
+        """Build the tile layer from RISK_TILES_* environment variables"""
+        return cls(
+            grid,
+            os.environ.get('RISK_TILES_DIR', os.path.join(model_dir, 'risk_tiles')),
+            cell_m=float(os.environ.get('RISK_TILES_CELL_M', 100)),
+            max_tiles=int(os.environ.get('RISK_TILES_MEMORY_TILES', 2048)),
+            prerender_zooms=parse_zooms(os.environ.get('RISK_TILES_PRERENDER_ZOOMS', '10-14')),
+            builds=builds
+        )
+
+    @property
+    def version(self):
+        current = self._current
+        return current[0] if current is not None else None
+
+    def grid_version(self, snapshot_etag):
+        """Directory name for the grid of a model and snapshot"""
+        model_version = self.grid.predictor.fast_inference['cache_version']
+        key = f"{model_version}|{snapshot_etag}|{self.cell_m}|{self.bounds}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    def on_snapshot(self, snapshot):
+        """Snapshot job listener: rebuild the grid when the weather or the model changed"""
+        version = self.grid_version(snapshot.etag)
+        with self._update_lock:
+            if version == self.version:
+                return
+            precipitation = np.array([np.nan if value is None else value
+                                      for value in snapshot.area_precipitation], dtype=np.float64)
+            if np.isnan(precipitation).all():
+                precipitation[:] = self.grid.predictor.FALLBACK_WEATHER['precipitation']
+            else:
+                precipitation[np.isnan(precipitation)] = np.nanmedian(precipitation)
+            self.update_from(version, area_precipitation=precipitation)
+
+    def update_from(self, version, **weather):
+        """
+        Make `version` current, loading its grid if another worker already
+        built it, otherwise scoring it (weather as for RiskGrid.score);
+        without builds, returns False while the grid is not saved yet
+        """
+        start = time.perf_counter()
+        folder = os.path.join(self.cache_dir, version)
+        path = os.path.join(folder, RISK_GRID_FILE)
+        try:
+            raster, metadata = load_risk_grid(path)
+            self._stats['grid_loads'] += 1
+        except FileNotFoundError:
+            if not self.builds:
+                return False
+            raster, metadata = self.grid.score(self.bounds, self.cell_m, **weather)
+            os.makedirs(folder, exist_ok=True)
+            save_risk_grid(raster, metadata, path)
+            self._stats['grid_builds'] += 1
+
+        self.update(version, raster, metadata)
+        if self.builds:
+            self.prerender()
+        self._stats['last_build_s'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Risk tiles {version} ready ({metadata['cells_scored']} cells, "
+                    f"{self._stats['last_build_s']}s)")
+        return True
+
+    def update(self, version, raster, metadata):
+        """Serve tiles of a new grid and drop the previous version's caches"""
+        current = (version, risk_index(raster, metadata['classes']), metadata)
+        with self._lock:
+            self._current = current
+            self._tiles.clear()
+
+        # Older versions' directories (a worker still on one falls back to rendering)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if not self.builds:
+            return
+        for name in os.listdir(self.cache_dir):
+            if name != version:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def risk_scores(self):
+        """
+        (version, risk scores, metadata) of the current grid, or None; scores
+        are float32 (rows, cols) on the palette's 1/254 steps, NaN outside the city
+        """
+        current = self._current
+        if current is None:
+            return None
+        version, index, metadata = current
+        scores = index.astype(np.float32) / (NO_DATA - 1)
+        scores[index == NO_DATA] = np.nan
+        return version, scores, metadata
+
+    def prerender(self):
+        """Write every tile of the prerender zoom levels to the current version's directory"""
+        current = self._current
+        for z in self.prerender_zooms:
+            for x, y in tiles_covering(self.bounds, z):
+                path = self._tile_path(current[0], z, x, y)
+                if not os.path.exists(path):
+                    self._write(path, self._render(current, z, x, y))
+
+    def tile(self, z, x, y):
+        """
+        (version, PNG bytes) of a tile; None before the first grid or for
+        zoom levels or tile numbers outside the served range
+        """
+        current = self._current
+        if current is None or not self.min_zoom <= z <= self.max_zoom or not (
+                0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return None
+        version = current[0]
+        key = (version, z, x, y)
+
+        with self._lock:
+            png = self._tiles.get(key)
+            if png is not None:
+                self._tiles.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return version, png
+
+        path = self._tile_path(version, z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+            self._stats['disk_hits'] += 1
+        except FileNotFoundError:
+            png = self._render(current, z, x, y)
+            self._stats['rendered'] += 1
+            if png is not EMPTY_TILE:
+                self._write(path, png)
+
+        with self._lock:
+            self._tiles[key] = png
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+                self._stats['evictions'] += 1
+        return version, png
+
+    def _render(self, current, z, x, y):
+        """PNG of one tile, sampling the nearest grid cell under each pixel"""
+        _, index, metadata = current
+        bounds = metadata['bounds']
+        latitudes, longitudes = tile_pixel_coordinates(z, x, y)
+        rows = np.floor((bounds['north'] - latitudes) / metadata['lat_step']).astype(np.int64)
+        cols = np.floor((longitudes - bounds['west']) / metadata['lon_step']).astype(np.int64)
+        row_ok = (rows >= 0) & (rows < index.shape[0])
+        col_ok = (cols >= 0) & (cols < index.shape[1])
+        if not row_ok.any() or not col_ok.any():
+            return EMPTY_TILE
+
+        pixels = index[np.clip(rows, 0, index.shape[0] - 1)[:, None],
+                       np.clip(cols, 0, index.shape[1] - 1)[None, :]]
+        pixels[~(row_ok[:, None] & col_ok[None, :])] = NO_DATA
+        return encode_png(pixels)
+
+    def _tile_path(self, version, z, x, y):
+        return os.path.join(self.cache_dir, version, str(z), str(x), f'{y}.png')
+
+    def _write(self, path, png):
+        """Write a tile atomically (workers may render the same tile at once)"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(png)
+            os.replace(temporary, path)
+        except OSError as e:  # The version directory was pruned meanwhile
+            logger.debug(f"Risk tile not cached: {e}")
+
+    def stats(self):
+        """Cache counters plus the current version"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_tiles'] = len(self._tiles)
+        stats['version'] = self.version
+        stats['max_tiles'] = self.max_tiles
+        stats['prerender_zooms'] = self.prerender_zooms
+        return stats
+
+
+def main():
+    """Render the prerender zoom levels of a grid saved by risk_grid.py"""
+    parser = argparse.ArgumentParser(description="Prerender risk tiles from a saved risk grid")
+    parser.add_argument('model_dir', nargs='?', default='model_files')
+    parser.add_argument('--grid', default=None, help=f"grid prefix (default: <model_dir>/{RISK_GRID_FILE})")
+    parser.add_argument('--zooms', default='10-14')
+    parser.add_argument('--out', default=None, help="tile directory (default: <model_dir>/risk_tiles)")
+    args = parser.parse_args()
+
+    raster, metadata = load_risk_grid(args.grid or os.path.join(args.model_dir, RISK_GRID_FILE))
+    bounds = metadata['bounds']
+    bounds = (bounds['south'], bounds['west'], bounds['north'], bounds['east'])
+    version = hashlib.sha256(f"{metadata['generated_at']}|{bounds}".encode('utf-8')).hexdigest()[:16]
+
+    # Rendering needs the grid's bounds only, not the model
+    tiles = RiskTiles(None, args.out or os.path.join(args.model_dir, 'risk_tiles'),
+                      cell_m=metadata['cell_m'], bounds=bounds, prerender_zooms=parse_zooms(args.zooms))
+
+    start = time.perf_counter()
+    tiles.update(version, raster, metadata)
+    tiles.prerender()
+    count = sum(len(tiles_covering(bounds, z)) for z in tiles.prerender_zooms)
+    print(f"✅ {count} tiles for zooms {args.zooms} rendered in {time.perf_counter() - start:.2f}s "
+          f"to {os.path.join(tiles.cache_dir, version)}/")
+
+
+if __name__ == "__main__":
+    main()
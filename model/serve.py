@@ -0,0 +1,111 @@
+"""
+Production Server
+=================
+Pre-fork launcher for flood_prediction_api on gunicorn.
+
+- The model, area store and spatial index are loaded once in the master
+  (preload_app) and shared with every worker: the compiled tree arrays
+  are read-only memmaps backed by the page cache, everything else is
+  inherited copy-on-write. gc.freeze() keeps the collector from touching
+  (and so copying) the preloaded objects in the workers.
+- Native thread pools (OpenMP/BLAS) and the estimator's n_jobs are capped
+  per worker, so N workers use N x PREDICT_THREADS cores instead of
+  N x cores.
+- Threads do not survive fork, so the model hot-reload watcher and the
+  risk snapshot job are started in each worker after it forks.
+- Only one worker (the holder of model_files/risk_snapshot.lock) runs the
+  snapshot job's weather sweep and scores the risk grid; it shares the
+  snapshot and grid in model_files, and the other workers serve those, so
+  every worker answers /risk/snapshot with the same ETag. If the leader
+  dies, its replacement worker takes the lock over.
+
+Usage: python serve.py [--workers 4] [--threads 4] [--port 5000]
+"""
+
+import argparse
+import gc
+import os
+
+# Must be set before NumPy or any OpenMP runtime is loaded
+PREDICT_THREADS = os.environ.get('PREDICT_THREADS', '1')
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, PREDICT_THREADS)
+os.environ.setdefault('PREDICT_N_JOBS', PREDICT_THREADS)
+
+from gunicorn.app.base import BaseApplication
+
+# Held by the worker that runs the risk snapshot job, for its lifetime
+snapshot_lock = None
+
+
+def post_fork(server, worker):
+    """Per-worker setup: thread caps, hot reload and the risk snapshot job (leader) or follower"""
+    global snapshot_lock
+    from threadpoolctl import threadpool_limits
+    import flood_prediction_api as api
+    from risk_snapshot import SNAPSHOT_LEADER_LOCK, acquire_leader_lock
+
+    threadpool_limits(int(PREDICT_THREADS))
+    gc.enable()
+    if api.registry is not None:
+        api.registry.start()
+    snapshot_lock = acquire_leader_lock(os.path.join("model_files", SNAPSHOT_LEADER_LOCK))
+    role = 'leader' if snapshot_lock is not None else 'follower'
+    api.start_risk_snapshot(role)
+    server.log.info(f"Worker {worker.pid} ready (model {api.registry.stats()['version']}, "
+                    f"risk snapshot {role})")
+
+
+class FloodPredictionServer(BaseApplication):
+    """gunicorn application that preloads the model before forking workers"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        import flood_prediction_api as api
+
+        if not api.load_model(watch=False):
+            raise SystemExit("❌ Failed to load model. Please train the model first.")
+
+        # Move everything loaded so far out of the collector's reach, so
+        # workers do not dirty the shared pages when collecting
+        gc.collect()
+        gc.disable()
+        gc.freeze()
+        return api.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork flood prediction API server")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help="worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WORKER_THREADS', 4)),
+                        help="request threads per worker (mostly waiting on weather I/O)")
+    parser.add_argument('--timeout', type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"🌊 Starting {args.workers} workers x {args.threads} threads "
+          f"({PREDICT_THREADS} compute thread(s) each) on http://{args.host}:{args.port}")
+
+    FloodPredictionServer({
+        'bind': f"{args.host}:{args.port}",
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'accesslog': '-'
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
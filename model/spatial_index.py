@@ -0,0 +1,69 @@
+"""
+Spatial Index
+=============
+Resolve any coordinate to its nearest area in the static feature store
+and its nearest drain, so location-only requests are scored with the
+location's real static attributes instead of the Mumbai-wide defaults.
+"""
+
+from scipy.spatial import cKDTree
+
+from drainage_network import DrainageNetwork, DRAINAGE_GEOJSON, project
+
+
+class AreaIndex:
+    """KD-tree over the feature store's area coordinates (projected to metres)"""
+
+    def __init__(self, store):
+        self.store = store
+        self._tree = cKDTree(project(store.latitudes, store.longitudes))
+
+    def nearest(self, lat, lon):
+        """(distance in metres, store row offset) of the area closest to a coordinate"""
+        distance, index = self._tree.query(project(lat, lon))
+        return float(distance), int(index)
+
+    def query(self, lat, lon, workers=-1):
+        """(distances in metres, store row offsets) of the closest area to every coordinate"""
+        return self._tree.query(project(lat, lon).reshape(-1, 2), workers=workers)
+
+
+class LocationResolver:
+    """Maps arbitrary coordinates to feature store rows plus per-point overrides"""
+
+    def __init__(self, area_index, drainage=None):
+        self.area_index = area_index
+        self.drainage = drainage
+
+    @classmethod
+    def from_store(cls, store, drainage_path=DRAINAGE_GEOJSON):
+        """Index a feature store's areas and the drainage export"""
+        return cls(AreaIndex(store), DrainageNetwork.from_geojson(drainage_path))
+
+    def resolve(self, lat, lon):
+        """
+        (static_row, area_data, location) for a coordinate
+
+        static_row holds the nearest area's attributes; area_data overrides
+        the coordinates and, when the drainage index is loaded, the distance
+        to the nearest drain with those of the queried point itself.
+        """
+        area_distance, index = self.area_index.nearest(lat, lon)
+        area = self.area_index.store.areas[index]
+        area_data = {'Latitude': lat, 'Longitude': lon}
+
+        location = {
+            'nearest_area': area['area'],
+            'ward': area['ward'],
+            'area_distance_m': round(area_distance, 1)
+        }
+
+        if self.drainage is not None:
+            drain_distance, drain = self.drainage.nearest(lat, lon)
+            area_data['True_nearest_distance'] = drain_distance
+            location['nearest_drain'] = drain['name'] or drain['id']
+            location['drain_distance_m'] = round(drain_distance, 1)
+            location['drain_waterway'] = drain['waterway']
+            location['drain_covered'] = bool(drain['covered'])
+
+        return self.area_index.store.row(index), area_data, location
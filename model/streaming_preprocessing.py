@@ -0,0 +1,222 @@
+"""
+Streaming Preprocessing
+=======================
+Chunked replacement for load_and_preprocess_data +
+advanced_feature_engineering + prepare_features_and_target, for datasets
+too large to hold (and copy several times) as DataFrames. Row chunks come
+from the dataset cache (data_ingestion.iter_dataset) in two passes:
+
+1. fit: label vocabularies of the categorical features and the target,
+   encoded targets, the DATE window, and a bounded sample of every
+   numeric feature, whose medians fill missing values
+2. transform: each chunk is engineered, encoded, median-filled and
+   written into a preallocated float32 matrix; a sample of the filled
+   values gives RobustScaler statistics without another pass
+
+Only one chunk exists as a DataFrame at a time, so peak memory is the
+output matrix plus one chunk. Medians and quantiles are exact while a
+column has at most sample_size values, and estimated from a uniform
+sample of sample_size values beyond that.
+
+Compare with the in-memory path: python streaming_preprocessing.py [csv_path] [--chunk-rows N]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder, RobustScaler
+
+from data_ingestion import DATASET_CSV, dataset_rows, iter_dataset
+from flood_inference import category_labels
+
+TARGET_COLUMN = "Flood-risk_level"
+
+# Rows per chunk: peak memory is roughly the output matrix plus one chunk
+CHUNK_ROWS = 50000
+
+
+class ColumnSample:
+    """Uniform sample of at most `size` non-NaN values (the smallest random keys are kept)"""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.values = np.empty(0)
+        self.keys = np.empty(0)
+
+    def update(self, values):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        keys = np.concatenate([self.keys, self.rng.random(len(values))])
+        values = np.concatenate([self.values, values])
+        if len(values) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            values, keys = values[keep], keys[keep]
+        self.values, self.keys = values, keys
+
+    def quantile(self, q):
+        return float(np.quantile(self.values, q)) if len(self.values) else np.nan
+
+
+class StreamingPreprocessor:
+    """
+    Two-pass chunked feature preparation for an AdvancedFloodPredictor
+
+    fit() sets the predictor's category_encodings and target_encoder and
+    this object's columns, medians, y and training_window; transform()
+    returns the feature DataFrame backed by one float32 matrix.
+    """
+
+    def __init__(self, predictor, chunk_rows=CHUNK_ROWS, sample_size=100000, random_state=42):
+        self.predictor = predictor
+        self.chunk_rows = chunk_rows
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(random_state)
+
+        self.columns = None
+        self.medians = None
+        self.y = None
+        self.training_window = None
+        self.scaler_samples = None
+
+    def _chunks(self, csv_path):
+        """Engineered DataFrame chunks, in file order"""
+        predictor = self.predictor
+        unused = [col for col in predictor.FEATURES_TO_DROP if col not in (TARGET_COLUMN, 'DATE')]
+        for chunk in iter_dataset(csv_path, self.chunk_rows, exclude=unused):
+            yield predictor.advanced_feature_engineering(predictor.standardize_columns(chunk))
+
+    def fit(self, csv_path=DATASET_CSV):
+        """First pass: vocabularies, encoded targets, medians and the DATE window"""
+        import pandas as pd
+        from improved_flood_prediction_model import parse_dates
+
+        print("🌊 Streaming pass 1: vocabularies and medians...")
+        predictor = self.predictor
+        vocabularies, samples, labels = {}, {}, {}
+        label_codes = np.empty(dataset_rows(csv_path), dtype=np.int64)
+        first_date = last_date = None
+        start = 0
+
+        for df in self._chunks(csv_path):
+            if self.columns is None:
+                self.columns = [col for col in df.columns if col not in predictor.FEATURES_TO_DROP]
+            for col in self.columns:
+                if col in predictor.CATEGORICAL_COLUMNS:
+                    vocabularies.setdefault(col, set()).update(category_labels(df[col]).unique())
+                else:
+                    values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+                    samples.setdefault(col, ColumnSample(self.sample_size, self.rng)).update(values)
+
+            # Targets as codes into first-seen labels, remapped once all labels are known
+            codes, uniques = pd.factorize(df[TARGET_COLUMN])
+            if (codes < 0).any():
+                raise ValueError(f"{int((codes < 0).sum())} rows in the chunk starting at row {start} have no {TARGET_COLUMN}")
+            lookup = np.array([labels.setdefault(label, len(labels)) for label in uniques])
+            label_codes[start:start + len(df)] = lookup[codes]
+            start += len(df)
+
+            dates = parse_dates(df['DATE'])
+            first_date = dates.min() if first_date is None else min(first_date, dates.min())
+            last_date = dates.max() if last_date is None else max(last_date, dates.max())
+
+        predictor.category_encodings = {col: sorted(vocabulary) for col, vocabulary in vocabularies.items()}
+        predictor.target_encoder = LabelEncoder().fit(list(labels))
+        self.y = predictor.target_encoder.transform(list(labels))[label_codes]
+        self.medians = {col: sample.quantile(0.5) for col, sample in samples.items()}
+        self.training_window = {
+            'first_date': f"{first_date:%Y-%m-%d}",
+            'last_date': f"{last_date:%Y-%m-%d}",
+            'rows': len(self.y)
+        }
+        print(f"Rows: {len(self.y)}, features: {len(self.columns)}")
+        return self
+
+    def transform(self, csv_path=DATASET_CSV, sample_rows=None):
+        """
+        Second pass: the features as a float32 DataFrame (one preallocated
+        matrix); sample_rows (boolean mask) limits the rows whose filled
+        values feed robust_scaler, e.g. to the training split
+        """
+        import pandas as pd
+
+        print("🌊 Streaming pass 2: encode and fill into float32...")
+        predictor = self.predictor
+        matrix = np.empty((len(self.y), len(self.columns)), dtype=np.float32, order='F')
+        codes = {col: {label: code for code, label in enumerate(vocabulary)}
+                 for col, vocabulary in predictor.category_encodings.items()}
+        self.scaler_samples = {col: ColumnSample(self.sample_size, self.rng) for col in self.columns}
+        start = 0
+
+        for df in self._chunks(csv_path):
+            stop = start + len(df)
+            block = matrix[start:stop]
+            in_sample = slice(None) if sample_rows is None else sample_rows[start:stop]
+            for j, col in enumerate(self.columns):
+                if col in codes:
+                    block[:, j] = category_labels(df[col]).map(codes[col]).to_numpy()
+                else:
+                    values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+                    block[:, j] = np.where(np.isnan(values), self.medians[col], values)
+                self.scaler_samples[col].update(block[in_sample, j].astype(np.float64))
+            start = stop
+
+        return pd.DataFrame(matrix, columns=self.columns, copy=False)
+
+    def robust_scaler(self, columns):
+        """A RobustScaler fitted from the transform pass samples of `columns`"""
+        quantiles = np.array([[self.scaler_samples[col].quantile(q) for q in (0.25, 0.5, 0.75)]
+                              for col in columns])
+        scale = quantiles[:, 2] - quantiles[:, 0]
+        scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0  # As RobustScaler handles zero spread
+        scaler = RobustScaler()
+        scaler.center_ = quantiles[:, 1]
+        scaler.scale_ = scale
+        scaler.n_features_in_ = len(columns)
+        return scaler
+
+
+def main():
+    """Prepare features both ways and report time, peak traced memory and agreement"""
+    from improved_flood_prediction_model import AdvancedFloodPredictor
+
+    parser = argparse.ArgumentParser(description="Compare streaming and in-memory preprocessing")
+    parser.add_argument('csv_path', nargs='?', default=DATASET_CSV)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    dataset_rows(args.csv_path)  # Build the dataset cache outside the timings
+
+    results = {}
+    tracemalloc.start()
+    for mode in ('streaming', 'in-memory'):
+        predictor = AdvancedFloodPredictor()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        if mode == 'streaming':
+            preprocessor = StreamingPreprocessor(predictor, chunk_rows=args.chunk_rows).fit(args.csv_path)
+            X, y = preprocessor.transform(args.csv_path), preprocessor.y
+        else:
+            df = predictor.advanced_feature_engineering(predictor.load_and_preprocess_data(args.csv_path))
+            X, y = predictor.prepare_features_and_target(df)
+            del df
+        seconds = time.perf_counter() - started
+        results[mode] = (X, y, seconds, (tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20)
+        del X, y
+
+    print("\n🌊 Preprocessing: streaming vs in-memory")
+    print("=" * 50)
+    for mode, (X, _, seconds, growth) in results.items():
+        print(f"  {mode:<10} {seconds:7.2f}s  peak {growth:8.1f} MB  {X.shape}  {X.values.dtype}")
+    X_stream, y_stream = results['streaming'][:2]
+    X_memory, y_memory = results['in-memory'][:2]
+    same = (list(X_stream.columns) == list(X_memory.columns) and np.array_equal(y_stream, y_memory)
+            and np.allclose(X_stream.values, X_memory.values.astype(np.float32), equal_nan=True))
+    print(f"  Same features and targets (float32): {same}")
+
+
+if __name__ == "__main__":
+    main()
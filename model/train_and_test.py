@@ -20,6 +20,7 @@ try:
     import seaborn as sns
     import joblib
     import warnings
+    from data_ingestion import load_dataset
     
     print("✅ All required libraries imported successfully!")
     
@@ -45,15 +46,12 @@ class SimpleFloodPredictor:
         print("📊 Loading dataset...")
         
         try:
-            df = pd.read_csv("final_flood_classification data.csv")
+            # Cached columns: names stripped, placeholders already NaN,
+            # unused ones never loaded
+            df = load_dataset("final_flood_classification data.csv",
+                              exclude=["Areas", "Nearest Station", "Drainage_line_id"])
             print(f"Dataset loaded: {df.shape}")
             
-            # Clean column names
-            df.columns = df.columns.str.strip()
-            
-            # Basic preprocessing
-            df = df.replace(["--", "", " ", "nan", "NaN"], np.nan)
-            
             return df
             
         except FileNotFoundError:
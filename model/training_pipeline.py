@@ -0,0 +1,335 @@
+"""
+Parallel Training Pipeline
+==========================
+Runs the AdvancedFloodPredictor training end to end with the expensive
+parts computed once and shared:
+
+- The train/test split and the stratified fold indices are computed once
+  and used by RFECV, cross-validation and reporting alike.
+- Per-fold RobustScaler matrices are built once and dumped to a temporary
+  folder; pool workers memory-map them read-only instead of each
+  re-scaling (or receiving a pickled copy of) the data.
+- Cross-validation fits every (member model, fold) pair as its own task
+  on a process pool and soft-votes the members' fold probabilities, which
+  is what cross_val_score on the VotingClassifier computes, without
+  refitting the whole ensemble per fold.
+- Pool processes x threads per model stay within one core budget
+  (--cores, default all cores).
+
+Wall-clock time per stage is printed at the end.
+
+--streaming prepares the features in row chunks into one float32 matrix
+(see streaming_preprocessing) instead of whole-dataset DataFrames, for
+multi-season data; the final scaler then comes from the same pass.
+
+--drainage first writes the CSV with its drain columns recomputed from
+the GeoJSON export (drainage_network.regenerate_drainage_csv) and trains
+on that copy, so the model learns from the drain distances serving
+computes; the dataset cache itself always mirrors the CSV it is given.
+
+--rainfall-history adds the rolling rainfall features (rainfall_features)
+from the daily rainfall matrix. They are off by default: a model with
+them only serves while its rainfall history is kept current to the day.
+
+--incremental NEW_CSV instead grows the saved model on the days after its
+training window (see AdvancedFloodPredictor.incremental_update) and
+publishes the result as a new bundle version, without refitting anything.
+
+Run: python training_pipeline.py [--cores 8] [--folds 5] [--selection ranked|rfecv] [--streaming]
+                                 [--drainage [GEOJSON]] [--rainfall-history [CSV]]
+     python training_pipeline.py --incremental new_days.csv [--new-trees 50] [--boosting-rounds 50]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import RobustScaler
+
+from drainage_network import DRAINAGE_GEOJSON, regenerate_drainage_csv
+from rainfall_features import RAINFALL_MATRIX_CSV
+from improved_flood_prediction_model import AdvancedFloodPredictor, training_window
+from flood_inference import set_model_threads
+from feature_store import AreaFeatureStore
+from streaming_preprocessing import StreamingPreprocessor, CHUNK_ROWS
+
+TRAINING_CSV = "final_flood_classification data.csv"
+
+
+class StageTimer:
+    """Wall-clock time per named pipeline stage"""
+
+    def __init__(self):
+        self.timings = {}
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def report(self):
+        total = sum(self.timings.values())
+        print("\n⏱️ Training stages (wall clock)")
+        print("=" * 50)
+        for name, seconds in self.timings.items():
+            print(f"  {name:<28} {seconds:8.2f}s  {100 * seconds / total:5.1f}%")
+        print(f"  {'total':<28} {total:8.2f}s")
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.timings[self.name] = time.perf_counter() - self.start
+
+
+def core_budget(n_tasks, cores):
+    """(processes, threads per model) for n_tasks parallel fits within `cores` cores"""
+    processes = max(1, min(n_tasks, cores))
+    return processes, max(1, cores // processes)
+
+
+class SharedFolds:
+    """
+    Fold indices plus scaled fold matrices, saved once and memory-mapped
+
+    folds[i] is (train_idx, val_idx); matrices(i) returns the fold's
+    (X_train, X_val) scaled with a RobustScaler fitted on its train part.
+    """
+
+    def __init__(self, folds, y, folder):
+        self.folds = folds
+        self.y = y
+        self.folder = folder
+
+    @classmethod
+    def build(cls, X, y, folds, folder):
+        """Scale every fold of X once and dump the matrices under folder"""
+        X = np.asarray(X, dtype=np.float64)
+        for i, (train_idx, val_idx) in enumerate(folds):
+            scaler = RobustScaler().fit(X[train_idx])
+            joblib.dump(scaler.transform(X[train_idx]), os.path.join(folder, f'fold{i}_train.joblib'))
+            joblib.dump(scaler.transform(X[val_idx]), os.path.join(folder, f'fold{i}_val.joblib'))
+        return cls(folds, np.asarray(y), folder)
+
+    def __len__(self):
+        return len(self.folds)
+
+    def matrices(self, i):
+        """Read-only memmaps of fold i's scaled train and validation matrices"""
+        return (joblib.load(os.path.join(self.folder, f'fold{i}_train.joblib'), mmap_mode='r'),
+                joblib.load(os.path.join(self.folder, f'fold{i}_val.joblib'), mmap_mode='r'))
+
+
+def _fit_member_fold(name, model, shared, fold, n_jobs):
+    """Pool task: fit one member on one fold, return its validation probabilities"""
+    X_train, X_val = shared.matrices(fold)
+    train_idx, _ = shared.folds[fold]
+    started = time.perf_counter()
+    model = set_model_threads(clone(model), n_jobs)
+    model.fit(X_train, shared.y[train_idx])
+    return name, fold, model.predict_proba(X_val), time.perf_counter() - started
+
+
+def cross_validate_members(ensemble, shared, cores):
+    """
+    Soft-voting cross-validation with one pool task per (member, fold)
+
+    Returns (ensemble F1 per fold, {member: mean F1}, {member: fit seconds}).
+    """
+    members = ensemble.estimators
+    tasks = [(name, model, fold) for fold in range(len(shared)) for name, model in members]
+    processes, threads = core_budget(len(tasks), cores)
+    print(f"🧮 Cross-validating {len(members)} members x {len(shared)} folds "
+          f"on {processes} processes x {threads} threads")
+
+    outputs = Parallel(n_jobs=processes, backend='loky')(
+        delayed(_fit_member_fold)(name, model, shared, fold, threads)
+        for name, model, fold in tasks
+    )
+
+    probabilities = {(name, fold): proba for name, fold, proba, _ in outputs}
+    fit_seconds = {}
+    for name, _, _, seconds in outputs:
+        fit_seconds[name] = fit_seconds.get(name, 0.0) + seconds
+
+    ensemble_scores = []
+    member_scores = {name: [] for name, _ in members}
+    for fold, (_, val_idx) in enumerate(shared.folds):
+        y_val = shared.y[val_idx]
+        fold_probas = [probabilities[(name, fold)] for name, _ in members]
+        ensemble_scores.append(f1_score(y_val, np.argmax(np.mean(fold_probas, axis=0), axis=1),
+                                        average='macro'))
+        for (name, _), proba in zip(members, fold_probas):
+            member_scores[name].append(f1_score(y_val, np.argmax(proba, axis=1), average='macro'))
+
+    return (np.array(ensemble_scores),
+            {name: float(np.mean(scores)) for name, scores in member_scores.items()},
+            fit_seconds)
+
+
+def run_pipeline(csv_path=TRAINING_CSV, model_dir="model_files", cores=None, n_folds=5,
+                 random_state=42, selection='ranked', streaming=False, chunk_rows=CHUNK_ROWS,
+                 rainfall_csv=None):
+    """
+    Train, cross-validate, evaluate and save the model; returns the
+    predictor. rainfall_csv (the daily rainfall matrix) adds the rolling
+    rainfall features.
+    """
+    cores = cores or os.cpu_count() or 1
+    timer = StageTimer()
+    predictor = AdvancedFloodPredictor(rainfall_csv)
+    shared_dir = tempfile.mkdtemp(prefix='flood_folds_')
+
+    try:
+        with timer.stage('load + engineer features'):
+            if streaming:
+                preprocessor = StreamingPreprocessor(predictor, chunk_rows=chunk_rows).fit(csv_path)
+                window, y = preprocessor.training_window, preprocessor.y
+            else:
+                df = predictor.load_and_preprocess_data(csv_path)
+                window = training_window(df)
+                df = predictor.advanced_feature_engineering(df)
+                X, y = predictor.prepare_features_and_target(df)
+                del df
+
+        with timer.stage('split + fold indices'):
+            # Split row indices (same rows as splitting X) so streaming can transform after
+            train_idx, test_idx = train_test_split(
+                np.arange(len(y)), test_size=0.2, random_state=random_state, stratify=y
+            )
+            y_train, y_test = y[train_idx], y[test_idx]
+            folds = list(StratifiedKFold(n_folds).split(train_idx, y_train))
+
+        if streaming:
+            with timer.stage('streaming transform'):
+                in_train = np.zeros(len(y), dtype=bool)
+                in_train[train_idx] = True
+                X = preprocessor.transform(csv_path, sample_rows=in_train)
+
+        X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+        del X
+        print(f"Training set: {X_train.shape}, test set: {X_test.shape}, {n_folds} shared folds")
+
+        with timer.stage(f'feature selection ({selection})'):
+            processes, threads = core_budget(n_folds, cores)
+            X_train_selected = predictor.feature_selection(X_train, y_train, cv=folds, n_jobs=processes,
+                                                           estimator_n_jobs=threads, strategy=selection)
+            X_test_selected = predictor.feature_selector.transform(X_test)
+
+        with timer.stage('scale folds (shared)'):
+            shared = SharedFolds.build(X_train_selected, y_train, folds, shared_dir)
+
+        with timer.stage('cross-validation'):
+            ensemble = predictor.build_ensemble_model()
+            cv_scores, member_scores, fit_seconds = cross_validate_members(ensemble, shared, cores)
+            print(f"Cross-validation F1 Score: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
+            for name, score in member_scores.items():
+                print(f"  {name:<4} F1 {score:.4f}  ({fit_seconds[name]:.1f}s fitting)")
+
+        with timer.stage('final ensemble fit'):
+            # Members fit in parallel, each with its share of the core budget
+            processes, threads = core_budget(len(ensemble.estimators), cores)
+            ensemble.set_params(n_jobs=processes)
+            for _, member in ensemble.estimators:
+                set_model_threads(member, threads)
+            scaler = preprocessor.robust_scaler(predictor.feature_names) if streaming else None
+            predictor.train_model(X_train_selected, y_train, cross_validate=False, scaler=scaler)
+
+        with timer.stage('evaluate'):
+            accuracy, f1 = predictor.evaluate_model(X_test_selected, y_test)
+
+        with timer.stage('compile + save bundle'):
+            predictor.save_model(model_dir, training_data=csv_path, training_window=window)
+            AreaFeatureStore.build(predictor, csv_path).save(model_dir)
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+    timer.report()
+    print("\n🎉 Model training completed successfully!")
+    print(f"Final Test Accuracy: {accuracy:.4f}")
+    print(f"Final F1 Score: {f1:.4f}")
+    return predictor
+
+
+def run_incremental(csv_path, model_dir="model_files", cores=None, new_trees=50, boosting_rounds=50,
+                    random_state=42):
+    """Grow the saved model on the new days in csv_path and save it as a new version"""
+    cores = cores or os.cpu_count() or 1
+    timer = StageTimer()
+    predictor = AdvancedFloodPredictor()
+
+    with timer.stage('load model'):
+        predictor.load_model(model_dir)
+        parent_version = predictor.model_manifest and predictor.model_manifest['model_version']
+
+    with timer.stage('load new days'):
+        df = predictor.load_and_preprocess_data(csv_path)
+
+    with timer.stage('grow ensemble'):
+        result = predictor.incremental_update(df, new_trees=new_trees, boosting_rounds=boosting_rounds,
+                                              random_state=random_state, n_jobs=cores)
+
+    with timer.stage('compile + save bundle'):
+        predictor.save_model(model_dir, training_data=csv_path,
+                             training_window=result['training_window'], parent_version=parent_version)
+
+    timer.report()
+    print(f"\n🎉 Incremental update of {parent_version} completed!")
+    print(f"Held-out F1 on new days: {result['f1_before']:.4f} -> {result['f1_after']:.4f}")
+    return predictor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the flood model with shared folds")
+    parser.add_argument('--cores', type=int, default=None, help="core budget (default: all cores)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--selection', choices=['ranked', 'rfecv'], default='ranked',
+                        help="feature selection strategy (see feature_ranking)")
+    parser.add_argument('--model-dir', default='model_files')
+    parser.add_argument('--streaming', action='store_true',
+                        help="prepare features in row chunks (see streaming_preprocessing)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--rainfall-history', nargs='?', const=RAINFALL_MATRIX_CSV, default=None, metavar='CSV',
+                        help="add rolling rainfall features from the daily rainfall matrix; serving them "
+                             "needs a history kept current to the day (rainfall_features.DailyRainfallFeed)")
+    parser.add_argument('--drainage', nargs='?', const=DRAINAGE_GEOJSON, default=None, metavar='GEOJSON',
+                        help="train on a copy of the CSV with drain columns recomputed from the export")
+    parser.add_argument('--incremental', metavar='NEW_CSV', default=None,
+                        help="grow the saved model on the new days in NEW_CSV instead of retraining")
+    parser.add_argument('--new-trees', type=int, default=50, help="trees added per forest member")
+    parser.add_argument('--boosting-rounds', type=int, default=50, help="rounds added per boosted member")
+    args = parser.parse_args()
+
+    csv_path = args.incremental or TRAINING_CSV
+    if args.drainage:
+        csv_path, change, _ = regenerate_drainage_csv(csv_path, geojson=args.drainage)
+        print(f"🗺️ Drain columns recomputed from {args.drainage} -> {csv_path} "
+              f"(median |Δ distance| {np.nanmedian(change):.0f} m)")
+
+    if args.incremental:
+        print("🌱 Starting incremental flood model update...")
+        run_incremental(csv_path, args.model_dir, cores=args.cores, new_trees=args.new_trees,
+                        boosting_rounds=args.boosting_rounds)
+        return
+
+    print("🚀 Starting Advanced Flood Prediction Model Training...")
+    run_pipeline(csv_path, args.model_dir, cores=args.cores, n_folds=args.folds,
+                 selection=args.selection, streaming=args.streaming, chunk_rows=args.chunk_rows,
+                 rainfall_csv=args.rainfall_history)
+
+
+if __name__ == "__main__":
+    main()
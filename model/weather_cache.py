@@ -0,0 +1,315 @@
+"""
+Live Weather Cache
+==================
+Grid-bucketed, TTL/LRU cache in front of the current-weather upstream.
+Nearby coordinates share one grid cell, concurrent misses for a cell
+share one upstream call, and recently expired entries are served while
+a background refresh runs (stale-while-revalidate).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+DEFAULT_WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+
+class WeatherUpstreamError(Exception):
+    """The weather upstream answered, but not with usable data"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_current_weather(data):
+    """Map an OpenWeatherMap current-weather response to our weather dict"""
+    try:
+        return {
+            'temperature': data['main']['temp'],
+            'humidity': data['main']['humidity'],
+            'pressure': data['main']['pressure'],
+            'wind_speed': data['wind'].get('speed', 0),
+            'precipitation': data.get('rain', {}).get('1h', 0),  # Rain in last 1h
+            'weather_condition': data['weather'][0]['main']
+        }
+    except (KeyError, IndexError, TypeError) as e:
+        raise WeatherUpstreamError(f"Malformed weather response: {e}")
+
+
+class OpenWeatherMapUpstream:
+    """
+    Current-weather upstream speaking the OpenWeatherMap API
+
+    base_url can point at any compatible server (e.g. a local stub during
+    tests); connections are pooled through one requests.Session.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_WEATHER_URL, timeout=10, session=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def fetch(self, lat, lon):
+        """Fetch current weather; raises WeatherUpstreamError on a bad response"""
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": "metric"
+        }
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+
+        if response.status_code != 200:
+            raise WeatherUpstreamError(f"Weather API Error: {response.status_code}",
+                                       status_code=response.status_code)
+
+        return parse_current_weather(response.json())
+
+
+class _CacheEntry:
+    """Cached weather for one grid cell"""
+
+    __slots__ = ('data', 'fetched_at')
+
+    def __init__(self, data, fetched_at):
+        self.data = data
+        self.fetched_at = fetched_at
+
+
+class _InflightFetch:
+    """An upstream call that concurrent misses for the same cell wait on"""
+
+    __slots__ = ('done', 'data', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+        self.error = None
+
+
+class _AsyncInflightFetch(_InflightFetch):
+    """In-flight upstream call awaited by coroutines on one event loop"""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__()
+        self.done = asyncio.Event()
+
+
+class WeatherCache:
+    """
+    Weather cache keyed by rounded lat/lon grid cell
+
+    - Fresh for `ttl` seconds, then served stale for up to `stale_ttl`
+      more seconds while one background refresh runs
+    - At most `max_entries` cells, least recently used evicted first
+    - Concurrent misses for a cell are coalesced into one upstream call
+    - If the upstream fails, any older entry for the cell is served
+      instead of failing the request
+    """
+
+    def __init__(self, upstream, grid_size=0.01, ttl=300, stale_ttl=900, max_entries=2048):
+        self.upstream = upstream
+        self.grid_size = grid_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'upstream_calls': 0,
+            'upstream_errors': 0,
+            'evictions': 0
+        }
+
+    @classmethod
+    def from_env(cls, api_key):
+        """Build a cache from WEATHER_* environment variables"""
+        upstream = OpenWeatherMapUpstream(
+            api_key=os.environ.get('OPENWEATHER_API_KEY', api_key),
+            base_url=os.environ.get('WEATHER_API_URL', DEFAULT_WEATHER_URL),
+            timeout=float(os.environ.get('WEATHER_API_TIMEOUT', 10))
+        )
+        return cls(
+            upstream,
+            grid_size=float(os.environ.get('WEATHER_CACHE_GRID', 0.01)),
+            ttl=float(os.environ.get('WEATHER_CACHE_TTL', 300)),
+            stale_ttl=float(os.environ.get('WEATHER_CACHE_STALE_TTL', 900)),
+            max_entries=int(os.environ.get('WEATHER_CACHE_MAX_ENTRIES', 2048))
+        )
+
+    def cell_key(self, lat, lon):
+        """Grid cell containing a coordinate"""
+        return (round(lat / self.grid_size), round(lon / self.grid_size))
+
+    def cell_center(self, key):
+        """Coordinate the upstream is queried with for a cell"""
+        return (round(key[0] * self.grid_size, 6), round(key[1] * self.grid_size, 6))
+
+    def get(self, lat, lon):
+        """Weather for the cell containing (lat, lon)"""
+        key = self.cell_key(lat, lon)
+        data, inflight, role = self._begin(key, _InflightFetch)
+
+        if role is None:
+            return data
+        if role == 'refresh':
+            threading.Thread(target=self._refresh, args=(key, inflight), daemon=True).start()
+            return data
+
+        if role == 'leader':
+            self._refresh(key, inflight)
+        else:
+            inflight.done.wait()
+        return self._result(key, inflight)
+
+    def _begin(self, key, inflight_type):
+        """
+        Classify a lookup under the lock
+
+        Returns (data, inflight, role): role is None for a fresh hit,
+        'refresh' for a stale hit that must start the background refresh,
+        'leader' when the caller fetches and 'wait' when it joins a fetch.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    self._stats['hits'] += 1
+                    self._entries.move_to_end(key)
+                    return entry.data, None, None
+                if age < self.ttl + self.stale_ttl:
+                    self._stats['stale_hits'] += 1
+                    self._entries.move_to_end(key)
+                    if key in self._inflight:
+                        return entry.data, None, None
+                    inflight = self._inflight[key] = inflight_type()
+                    return entry.data, inflight, 'refresh'
+
+            self._stats['misses'] += 1
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self._stats['coalesced'] += 1
+                return None, inflight, 'wait'
+            inflight = self._inflight[key] = inflight_type()
+            return None, inflight, 'leader'
+
+    def _refresh(self, key, inflight):
+        """Fetch one cell from the upstream and publish it to waiters"""
+        try:
+            data = self.upstream.fetch(*self.cell_center(key))
+        except Exception as e:
+            self._finish(key, inflight, None, e)
+        else:
+            self._finish(key, inflight, data, None)
+
+    def _finish(self, key, inflight, data, error):
+        """Record an upstream result, store it and wake the waiters"""
+        with self._lock:
+            self._stats['upstream_calls'] += 1
+            if error is None:
+                self._store(key, data)
+            else:
+                self._stats['upstream_errors'] += 1
+            del self._inflight[key]
+        inflight.data = data
+        inflight.error = error
+        inflight.done.set()
+
+    def _result(self, key, inflight):
+        """Data from a completed fetch, or whatever is cached if it failed"""
+        if inflight.error is None:
+            return inflight.data
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._stats['stale_hits'] += 1
+                return entry.data
+        raise inflight.error
+
+    def _store(self, key, data):
+        """Insert or replace a cell, evicting the least recently used (lock held)"""
+        self._entries[key] = _CacheEntry(data, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def invalidate(self, lat=None, lon=None):
+        """Drop one cell, or every cell when no coordinate is given"""
+        with self._lock:
+            if lat is None or lon is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self.cell_key(lat, lon), None)
+
+    def stats(self):
+        """Counters plus current size and hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class AsyncWeatherCache(WeatherCache):
+    """
+    WeatherCache for coroutines and an async upstream
+
+    Same keys, TTL, LRU and stale-while-revalidate rules; the upstream's
+    fetch(lat, lon) is awaited and background refreshes run as tasks on
+    the calling event loop.
+    """
+
+    def __init__(self, upstream, **options):
+        super().__init__(upstream, **options)
+        self._tasks = set()
+
+    async def get(self, lat, lon):
+        """Weather for the cell containing (lat, lon)"""
+        key = self.cell_key(lat, lon)
+        data, inflight, role = self._begin(key, _AsyncInflightFetch)
+
+        if role is None:
+            return data
+        if role == 'refresh':
+            task = asyncio.ensure_future(self._refresh_async(key, inflight))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return data
+
+        if role == 'leader':
+            await self._refresh_async(key, inflight)
+        else:
+            await inflight.done.wait()
+        return self._result(key, inflight)
+
+    async def _refresh_async(self, key, inflight):
+        """
+        Await one upstream fetch and publish it to waiters; a cancelled
+        fetch still releases the cell, its waiters see it as failed
+        """
+        data, error = None, WeatherUpstreamError("Weather fetch was cancelled")
+        try:
+            data = await self.upstream.fetch(*self.cell_center(key))
+            error = None
+        except Exception as e:
+            error = e
+        finally:
+            self._finish(key, inflight, data, error)